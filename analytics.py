@@ -0,0 +1,264 @@
+"""
+Emotion analytics rollups for Speech Emotion Recognition
+Keeps per-hour and per-day prediction counts and confidence sums for each
+(emotion, recorded or uploaded) pair in a rollup table, incremented in the
+transaction that inserts the predictions. Analytics queries read only the
+rollup rows of the requested range, so their cost grows with the number of
+buckets rather than the number of predictions.
+
+Usage:
+    python analytics.py backfill [--batch-size N]
+
+The backfill rebuilds the rollups from every stored prediction, e.g. after
+upgrading a database that has predictions from before the rollup table. Run
+it with the web app stopped: predictions inserted while it runs may be
+counted twice or not at all.
+"""
+import os
+import sys
+import logging
+import argparse
+import datetime
+
+import sqlalchemy as sa
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = {
+    'hour': datetime.timedelta(hours=1),
+    'day': datetime.timedelta(days=1),
+}
+# Range served when a query gives no 'since'
+DEFAULT_SPANS = {
+    'hour': datetime.timedelta(hours=48),
+    'day': datetime.timedelta(days=30),
+}
+MAX_BUCKETS = 2000
+UPSERT_CHUNK = 500
+
+def bucket_start(timestamp, granularity):
+    """Start of the hour or day (UTC) containing the timestamp"""
+    if granularity == 'day':
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def rollup_increments(rows, increments=None):
+    """
+    Aggregate predictions into rollup increments
+
+    Args:
+        rows: Iterable of mappings (or objects) with 'timestamp', 'emotion',
+            'is_recorded' and 'confidence'
+        increments: Dictionary to add to (e.g. across backfill batches)
+
+    Returns:
+        increments: Dictionary mapping (granularity, bucket_start, emotion,
+            is_recorded) to [count, confidence sum]
+    """
+    if increments is None:
+        increments = {}
+    for row in rows:
+        if not isinstance(row, dict):
+            row = {name: getattr(row, name) for name in ('timestamp', 'emotion', 'is_recorded', 'confidence')}
+        is_recorded = bool(row['is_recorded'])
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(row['timestamp'], granularity), row['emotion'], is_recorded)
+            totals = increments.setdefault(key, [0, 0.0])
+            totals[0] += 1
+            totals[1] += float(row['confidence'])
+    return increments
+
+def apply_increments(session, rollup_model, increments):
+    """
+    Add increments to the rollup table in the session's transaction
+
+    PostgreSQL and SQLite use one INSERT ... ON CONFLICT DO UPDATE per chunk;
+    other databases update row by row under a row lock. Keys are applied in
+    sorted order so that concurrent transactions lock rollup rows in the same
+    order and cannot deadlock.
+
+    Args:
+        session: SQLAlchemy session (the caller commits)
+        rollup_model: EmotionRollup model class
+        increments: Dictionary made by rollup_increments
+    """
+    if not increments:
+        return
+    table = rollup_model.__table__
+    keys = sorted(increments)
+    dialect = session.get_bind().dialect.name
+    if dialect not in ('postgresql', 'sqlite'):
+        for key in keys:
+            count, confidence_sum = increments[key]
+            row = session.get(rollup_model, key, with_for_update=True)
+            if row is None:
+                granularity, start, emotion, is_recorded = key
+                session.add(rollup_model(granularity=granularity, bucket_start=start, emotion=emotion,
+                                         is_recorded=is_recorded, count=count, confidence_sum=confidence_sum))
+            else:
+                row.count += count
+                row.confidence_sum += confidence_sum
+        session.flush()
+        return
+
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    for i in range(0, len(keys), UPSERT_CHUNK):
+        values = [
+            {'granularity': granularity, 'bucket_start': start, 'emotion': emotion, 'is_recorded': is_recorded,
+             'count': increments[granularity, start, emotion, is_recorded][0],
+             'confidence_sum': increments[granularity, start, emotion, is_recorded][1]}
+            for granularity, start, emotion, is_recorded in keys[i:i + UPSERT_CHUNK]
+        ]
+        statement = insert(table).values(values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.granularity, table.c.bucket_start, table.c.emotion, table.c.is_recorded],
+            set_={
+                'count': table.c.count + statement.excluded.count,
+                'confidence_sum': table.c.confidence_sum + statement.excluded.confidence_sum,
+            }
+        )
+        session.execute(statement)
+
+def parse_query(args, parse_time, now=None):
+    """
+    Read an analytics query from request arguments
+
+    Args:
+        args: Mapping of request arguments: 'granularity' ('hour' or 'day'),
+            'since' and 'until' (ISO dates or datetimes, UTC)
+        parse_time: Function parsing a date argument (history.parse_time)
+        now: Current UTC time (default: now)
+
+    Returns:
+        query: Keyword arguments for rollup_series
+
+    Raises:
+        ValueError: If an argument is invalid or the range has too many buckets
+    """
+    granularity = args.get('granularity') or 'hour'
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Invalid granularity: {granularity}")
+    now = now or datetime.datetime.utcnow()
+    until = parse_time(args['until'], end=True) if args.get('until') else now
+    since = parse_time(args['since']) if args.get('since') else until - DEFAULT_SPANS[granularity]
+    if since >= until:
+        raise ValueError("'since' must be before 'until'")
+    if (until - since) / GRANULARITIES[granularity] > MAX_BUCKETS:
+        raise ValueError(f"Range spans more than {MAX_BUCKETS} {granularity} buckets")
+    return {'granularity': granularity, 'since': since, 'until': until}
+
+def _summary(emotions):
+    return {'total': 0, 'recorded': 0, 'uploaded': 0, 'counts': {e: 0 for e in emotions},
+            'mean_confidence': {e: None for e in emotions}, '_sums': {e: 0.0 for e in emotions}}
+
+def _finish(summary):
+    sums = summary.pop('_sums')
+    for emotion, count in summary['counts'].items():
+        if count:
+            summary['mean_confidence'][emotion] = round(sums[emotion] / count, 4)
+    return summary
+
+def rollup_series(session, rollup_model, emotions, granularity, since, until):
+    """
+    Per-bucket prediction counts, recorded/uploaded splits and mean confidences
+
+    Args:
+        session: SQLAlchemy session
+        rollup_model: EmotionRollup model class
+        emotions: Emotion names to report
+        granularity: 'hour' or 'day'
+        since: Start of the range (rounded down to its bucket)
+        until: End of the range (exclusive)
+
+    Returns:
+        series: Dictionary with the range, one entry per bucket (empty
+            buckets included) and the totals over the range
+    """
+    step = GRANULARITIES[granularity]
+    first = bucket_start(since, granularity)
+    rows = session.execute(
+        sa.select(rollup_model.bucket_start, rollup_model.emotion, rollup_model.is_recorded,
+                  rollup_model.count, rollup_model.confidence_sum)
+        .where(rollup_model.granularity == granularity,
+               rollup_model.bucket_start >= first,
+               rollup_model.bucket_start < until)
+    ).all()
+
+    buckets = {}
+    start = first
+    while start < until:
+        buckets[start] = _summary(emotions)
+        start += step
+    totals = _summary(emotions)
+    for start, emotion, is_recorded, count, confidence_sum in rows:
+        for summary in (buckets[start], totals):
+            summary['total'] += count
+            summary['recorded' if is_recorded else 'uploaded'] += count
+            if emotion in summary['counts']:
+                summary['counts'][emotion] += count
+                summary['_sums'][emotion] += confidence_sum
+
+    return {
+        'granularity': granularity,
+        'since': first.isoformat(),
+        'until': until.isoformat(),
+        'buckets': [{'start': start.isoformat(), **_finish(summary)} for start, summary in buckets.items()],
+        'totals': _finish(totals),
+    }
+
+def backfill(session, prediction_model, rollup_model, batch_size=10000):
+    """
+    Rebuild the rollups from every stored prediction in one transaction
+
+    Args:
+        session: SQLAlchemy session
+        prediction_model: EmotionPrediction model class
+        rollup_model: EmotionRollup model class
+        batch_size: Predictions fetched per round trip
+
+    Returns:
+        predictions: Number of predictions counted
+    """
+    statement = sa.select(
+        prediction_model.timestamp, prediction_model.emotion,
+        prediction_model.is_recorded, prediction_model.confidence
+    ).execution_options(yield_per=batch_size)
+
+    increments = {}
+    counted = 0
+    try:
+        for partition in session.execute(statement).mappings().partitions():
+            rollup_increments(partition, increments)
+            counted += len(partition)
+            logger.info(f"Counted {counted} predictions")
+        session.execute(sa.delete(rollup_model))
+        apply_increments(session, rollup_model, increments)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    logger.info(f"Wrote {len(increments)} rollup rows")
+    return counted
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    backfill_parser = subparsers.add_parser('backfill', help='Rebuild the rollups from the stored predictions')
+    backfill_parser.add_argument('--batch-size', type=int, default=10000, help='Predictions fetched per round trip')
+    args = parser.parse_args()
+    if not os.environ.get('DATABASE_URL'):
+        parser.error("Set DATABASE_URL to the app's database")
+
+    from app import app, db, EmotionPrediction, EmotionRollup
+    logging.getLogger().setLevel(logging.INFO)
+    with app.app_context():
+        EmotionRollup.__table__.create(db.engine, checkfirst=True)
+        counted = backfill(db.session, EmotionPrediction, EmotionRollup, batch_size=args.batch_size)
+    print(f"Rolled up {counted} predictions")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,18 +5,33 @@ import json
 import base64
 import io
 import datetime
+import hashlib
+import time
+import uuid
+import atexit
+import threading
+import importlib
 import numpy as np
-import matplotlib.pyplot as plt
 from werkzeug.utils import secure_filename
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context, abort
 from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy import exc as sa_exc, inspect as sa_inspect, text as sa_text
+from sqlalchemy.orm import DeclarativeBase, deferred
 
-from audio_processor import preprocess_audio
-from feature_extractor import extract_features
-from emotion_model import EmotionModel, EMOTIONS
-from utils import plot_prediction, plot_confusion_matrix, allowed_file, load_sample_audio, plot_audio_waveform, plot_spectrogram
+from emotion_model import EmotionModel, EMOTIONS, set_blas_threads
+from inference_scheduler import InferenceScheduler
+from processing_pool import ProcessingPool, PoolSaturatedError, warmup as warmup_pipeline
+from feature_cache import FeatureCache, make_cache_key
+from live_session import LiveSessionManager
+from chart_renderer import ChartCache, CHART_KINDS
+from training_jobs import TrainingJobManager, JobBusyError, FINAL_STATUSES
+from history import history_page, parse_filters, parse_time
+from history_export import check_format, export_chunks, MIMETYPES
+from analytics import rollup_increments, apply_increments, parse_query, rollup_series
+from write_behind import WriteBehindQueue
+from audio_options import check_res_type
+from utils import plot_confusion_matrix, allowed_file, load_sample_audio, downsample_waveform, unpack_waveform, WAVEFORM_MAGIC
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -42,37 +57,556 @@ db.init_app(app)
 # Define database models directly here
 class EmotionPrediction(db.Model):
     """Model to store emotion prediction history"""
+    # History pages are keyset scans newest first on (timestamp, id), optionally within one emotion or source
+    __table_args__ = (
+        db.Index('ix_emotion_prediction_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_emotion_prediction_emotion_timestamp_id', 'emotion', 'timestamp', 'id'),
+        db.Index('ix_emotion_prediction_is_recorded_timestamp_id', 'is_recorded', 'timestamp', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=True)
     emotion = db.Column(db.String(50), nullable=False)
     confidence = db.Column(db.Float, nullable=False)
-    all_confidences = db.Column(db.Text, nullable=False)  # JSON string of all confidence values
+    # Confidence of every emotion (float32, in the order of EMOTIONS)
+    confidence_angry = db.Column(db.REAL, nullable=False)
+    confidence_disgust = db.Column(db.REAL, nullable=False)
+    confidence_fear = db.Column(db.REAL, nullable=False)
+    confidence_happy = db.Column(db.REAL, nullable=False)
+    confidence_neutral = db.Column(db.REAL, nullable=False)
+    confidence_sad = db.Column(db.REAL, nullable=False)
+    confidence_surprise = db.Column(db.REAL, nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
     is_recorded = db.Column(db.Boolean, default=False)  # Whether it was a recorded sample or uploaded file
-    waveform_data = db.Column(db.Text, nullable=True)  # JSON string of waveform data for visualization
+    # Packed waveform data for visualization (see utils.pack_waveform), loaded on first access
+    waveform = deferred(db.Column(db.LargeBinary, nullable=True))
     
     def __repr__(self):
         return f'<EmotionPrediction {self.emotion} ({self.confidence:.2f}%)>'
     
-    def to_dict(self):
-        """Convert model to dictionary for JSON serialization"""
-        return {
+    @property
+    def confidences(self):
+        """Dictionary of confidence values for each emotion"""
+        return {e: round(getattr(self, f'confidence_{e}'), 4) for e in EMOTIONS}
+    
+    @confidences.setter
+    def confidences(self, values):
+        for e in EMOTIONS:
+            setattr(self, f'confidence_{e}', float(values[e]))
+    
+    def to_dict(self, include_waveform=True):
+        """
+        Convert model to dictionary for JSON serialization
+        
+        Args:
+            include_waveform: Include the waveform data (loading the deferred column)
+        """
+        data = {
             'id': self.id,
             'filename': self.filename,
             'emotion': self.emotion,
             'confidence': self.confidence,
-            'all_confidences': json.loads(self.all_confidences),
+            'all_confidences': self.confidences,
             'timestamp': self.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-            'is_recorded': self.is_recorded,
-            'waveform_data': json.loads(self.waveform_data) if self.waveform_data else None
+            'is_recorded': self.is_recorded
         }
+        if include_waveform:
+            data['waveform_data'] = unpack_waveform(self.waveform) if self.waveform else None
+        return data
+
+class TrainingJob(db.Model):
+    """Model to store the status of background training jobs"""
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, cancelling, completed, failed, cancelled
+    phase = db.Column(db.String(20), nullable=True)  # featurizing or training
+    progress = db.Column(db.Float, nullable=False, default=0.0)  # Fraction of the current phase done
+    epoch = db.Column(db.Integer, nullable=False, default=0)
+    params = db.Column(db.Text, nullable=False)  # JSON string of the training parameters
+    history = db.Column(db.Text, nullable=True)  # JSON string of the per-epoch metrics
+    accuracy = db.Column(db.Float, nullable=True)
+    confusion_matrix = db.Column(db.Text, nullable=True)  # JSON string of the validation confusion matrix
+    model_path = db.Column(db.String(512), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)  # Last time the web worker running the job saw its process alive
+    
+    def __repr__(self):
+        return f'<TrainingJob {self.id} {self.status}>'
+    
+    def to_dict(self):
+        """Convert model to dictionary for JSON serialization"""
+        def timestamp(value):
+            return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+        
+        return {
+            'id': self.id,
+            'status': self.status,
+            'phase': self.phase,
+            'progress': self.progress,
+            'epoch': self.epoch,
+            'params': json.loads(self.params),
+            'history': json.loads(self.history) if self.history else None,
+            'accuracy': self.accuracy,
+            'confusion_matrix': json.loads(self.confusion_matrix) if self.confusion_matrix else None,
+            'error': self.error,
+            'created_at': timestamp(self.created_at),
+            'started_at': timestamp(self.started_at),
+            'finished_at': timestamp(self.finished_at)
+        }
+
+class EmotionRollup(db.Model):
+    """Prediction counts per hour or day, emotion and source, incremented on every insert (see analytics.py)"""
+    granularity = db.Column(db.String(8), primary_key=True)  # 'hour' or 'day'
+    bucket_start = db.Column(db.DateTime, primary_key=True)  # UTC start of the hour or day
+    emotion = db.Column(db.String(50), primary_key=True)
+    is_recorded = db.Column(db.Boolean, primary_key=True)
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+    confidence_sum = db.Column(db.Float, nullable=False, default=0.0)  # Sum of the predictions' top confidence
+    
+    def __repr__(self):
+        return f'<EmotionRollup {self.granularity} {self.bucket_start} {self.emotion} {self.count}>'
+
+class IdAllocator(db.Model):
+    """Next unreserved primary key of a table, for ids handed out before the row is written"""
+    name = db.Column(db.String(64), primary_key=True)  # Table name
+    next_id = db.Column(db.BigInteger, nullable=False)
+    
+    def __repr__(self):
+        return f'<IdAllocator {self.name} {self.next_id}>'
 
 # Set maximum file size for uploads (16MB)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 app.config['UPLOAD_FOLDER'] = tempfile.gettempdir()
 
+# Model weights file (memory-mapped; created with untrained weights if missing)
+app.config['MODEL_PATH'] = os.environ.get("MODEL_PATH", os.path.join(app.instance_path, "emotion_model.safetensors"))
+
+# Storage of a freshly created model file ('float32' or 'int8') and BLAS
+# threads per process for the model's matmuls (empty for the library default)
+app.config['MODEL_WEIGHTS_DTYPE'] = os.environ.get("MODEL_WEIGHTS_DTYPE", "float32")
+app.config['INFERENCE_BLAS_THREADS'] = int(os.environ.get("INFERENCE_BLAS_THREADS", 1) or 0) or None
+
+# ONNX models (MODEL_PATH ending in .onnx) run on onnxruntime's CPU provider
+# with one reused session per process: threads within and across operators
+# and the graph optimization level (disable, basic, extended or all)
+app.config['ONNX_INTRA_OP_THREADS'] = int(os.environ.get("ONNX_INTRA_OP_THREADS", 1))
+app.config['ONNX_INTER_OP_THREADS'] = int(os.environ.get("ONNX_INTER_OP_THREADS", 1))
+app.config['ONNX_GRAPH_OPTIMIZATION'] = os.environ.get("ONNX_GRAPH_OPTIMIZATION", "all")
+
+# Micro-batching knobs for the inference queue
+app.config['INFERENCE_MAX_BATCH_SIZE'] = int(os.environ.get("INFERENCE_MAX_BATCH_SIZE", 16))
+app.config['INFERENCE_MAX_WAIT_MS'] = float(os.environ.get("INFERENCE_MAX_WAIT_MS", 5))
+
+# Process pool for decoding, preprocessing, features and chart data
+# (PROCESSING_WORKERS=0 runs everything inline in the request thread)
+app.config['PROCESSING_WORKERS'] = int(os.environ["PROCESSING_WORKERS"]) if "PROCESSING_WORKERS" in os.environ else None
+app.config['PROCESSING_MAX_PENDING'] = int(os.environ["PROCESSING_MAX_PENDING"]) if "PROCESSING_MAX_PENDING" in os.environ else None
+app.config['PROCESSING_RETRY_AFTER'] = int(os.environ.get("PROCESSING_RETRY_AFTER", 2))
+
+# Feature/prediction cache keyed on audio content (FEATURE_CACHE_SIZE=0 and an
+# empty FEATURE_CACHE_DIR disable the memory and disk tiers)
+app.config['FEATURE_CACHE_SIZE'] = int(os.environ.get("FEATURE_CACHE_SIZE", 128))
+app.config['FEATURE_CACHE_DIR'] = os.environ.get("FEATURE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ser_feature_cache"))
+app.config['FEATURE_CACHE_MAX_BYTES'] = int(os.environ.get("FEATURE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# Live recording sessions fed with raw PCM frames
+app.config['LIVE_MAX_SESSIONS'] = int(os.environ.get("LIVE_MAX_SESSIONS", 64))
+app.config['LIVE_IDLE_TIMEOUT'] = int(os.environ.get("LIVE_IDLE_TIMEOUT", 60))
+
+# Decoding: resampling backend (soxr_hq, soxr_qq, polyphase, ...) and whether
+# to decode only the first `duration` seconds of each upload
+app.config['AUDIO_RES_TYPE'] = os.environ.get("AUDIO_RES_TYPE", "soxr_hq")
+check_res_type(app.config['AUDIO_RES_TYPE'])  # Fail at startup, not per request
+app.config['AUDIO_LIMIT_DECODE'] = os.environ.get("AUDIO_LIMIT_DECODE", "1") not in ("0", "false", "False")
+
+# Chart data and fallback PNGs served from /charts (records never change, so
+# browsers may cache them for CHART_MAX_AGE seconds and revalidate with the ETag)
+app.config['CHART_CACHE_MAX_BYTES'] = int(os.environ.get("CHART_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+app.config['CHART_MAX_AGE'] = int(os.environ.get("CHART_MAX_AGE", 86400))
+
+# Training data: one directory per emotion under TRAINING_DATA_DIR, featurized
+# into the memory-mapped store in FEATURE_STORE_DIR by TRAINING_WORKERS
+# processes (empty for one per CPU)
+app.config['TRAINING_DATA_DIR'] = os.environ.get("TRAINING_DATA_DIR", "")
+app.config['FEATURE_STORE_DIR'] = os.environ.get("FEATURE_STORE_DIR", os.path.join(app.instance_path, "feature_store"))
+app.config['TRAINING_WORKERS'] = int(os.environ.get("TRAINING_WORKERS") or 0) or None
+# A job whose web worker has not reported it alive for TRAINING_JOB_STALE_SECONDS
+# (the worker died or restarted) is marked failed when it is next read
+app.config['TRAINING_JOB_STALE_SECONDS'] = float(os.environ.get("TRAINING_JOB_STALE_SECONDS", 30))
+
+# Trained models are written to MODEL_PATH (next to it for an ONNX MODEL_PATH);
+# every web worker checks that file at most every MODEL_RELOAD_INTERVAL seconds
+# and hot-swaps a newly trained model in (0 disables the check)
+app.config['TRAINED_MODEL_PATH'] = (os.path.splitext(app.config['MODEL_PATH'])[0] + ".safetensors"
+                                    if app.config['MODEL_PATH'].lower().endswith(".onnx") else app.config['MODEL_PATH'])
+app.config['MODEL_RELOAD_INTERVAL'] = float(os.environ.get("MODEL_RELOAD_INTERVAL", 5))
+
+# Write-behind persistence (PREDICTION_WRITE_BEHIND=1): predictions are queued
+# and a background thread inserts up to WRITE_BEHIND_BATCH_SIZE rows per
+# transaction after at most WRITE_BEHIND_FLUSH_MS; when WRITE_BEHIND_QUEUE_SIZE
+# rows are waiting, requests write their own. Ids are reserved in blocks of
+# PREDICTION_ID_BLOCK so responses can link to /results/<id> right away
+app.config['PREDICTION_WRITE_BEHIND'] = os.environ.get("PREDICTION_WRITE_BEHIND", "0") not in ("0", "false", "False")
+app.config['WRITE_BEHIND_BATCH_SIZE'] = int(os.environ.get("WRITE_BEHIND_BATCH_SIZE", 100))
+app.config['WRITE_BEHIND_FLUSH_MS'] = float(os.environ.get("WRITE_BEHIND_FLUSH_MS", 50))
+app.config['WRITE_BEHIND_QUEUE_SIZE'] = int(os.environ.get("WRITE_BEHIND_QUEUE_SIZE", 1000))
+app.config['PREDICTION_ID_BLOCK'] = int(os.environ.get("PREDICTION_ID_BLOCK", 100))
+
+# Noise reduction: 'highpass' (IIR filter) or 'spectral_gate'
+app.config['AUDIO_DENOISE_METHOD'] = os.environ.get("AUDIO_DENOISE_METHOD", "highpass")
+
+# Parameters used for decoding, preprocessing and feature extraction; part of every cache key
+AUDIO_PARAMS = {
+    'sr': 22050,
+    'duration': 3,
+    'n_mfcc': 13,
+    'n_fft': 2048,
+    'hop_length': 512,
+    'res_type': app.config['AUDIO_RES_TYPE'],
+    'limit_decode': app.config['AUDIO_LIMIT_DECODE'],
+    'denoise_method': app.config['AUDIO_DENOISE_METHOD'],
+}
+
 # Initialize emotion model
-emotion_model = EmotionModel()
+set_blas_threads(app.config['INFERENCE_BLAS_THREADS'])
+emotion_model = EmotionModel(
+    app.config['MODEL_PATH'],
+    weights_dtype=app.config['MODEL_WEIGHTS_DTYPE'],
+    intra_op_threads=app.config['ONNX_INTRA_OP_THREADS'],
+    inter_op_threads=app.config['ONNX_INTER_OP_THREADS'],
+    graph_optimization=app.config['ONNX_GRAPH_OPTIMIZATION']
+)
+inference_scheduler = InferenceScheduler(
+    emotion_model,
+    max_batch_size=app.config['INFERENCE_MAX_BATCH_SIZE'],
+    max_wait_ms=app.config['INFERENCE_MAX_WAIT_MS']
+)
+processing_pool = ProcessingPool(
+    max_workers=app.config['PROCESSING_WORKERS'],
+    max_pending=app.config['PROCESSING_MAX_PENDING'],
+    retry_after=app.config['PROCESSING_RETRY_AFTER']
+)
+live_sessions = LiveSessionManager(
+    inference_scheduler,
+    max_sessions=app.config['LIVE_MAX_SESSIONS'],
+    idle_timeout=app.config['LIVE_IDLE_TIMEOUT'],
+    pool=processing_pool
+)
+feature_cache = FeatureCache(
+    max_entries=app.config['FEATURE_CACHE_SIZE'],
+    cache_dir=app.config['FEATURE_CACHE_DIR'] or None,
+    max_disk_bytes=app.config['FEATURE_CACHE_MAX_BYTES']
+)
+chart_cache = ChartCache(max_bytes=app.config['CHART_CACHE_MAX_BYTES'])
+
+def _model_file_signature(path):
+    """Identity of a model file's current version, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+_model_swap_lock = threading.Lock()
+_model_reload = {
+    'next_check': 0.0,
+    'signature': _model_file_signature(app.config['TRAINED_MODEL_PATH']),
+}
+
+def swap_model(model_path):
+    """
+    Load a model file and atomically replace the serving model with it
+    
+    The new model is fully loaded before a single reference swap in the
+    inference scheduler, so batches in flight finish on the old model and
+    every later batch runs on the new one. The feature cache is keyed on the
+    model fingerprint, so cached predictions of the old model are not reused.
+    
+    Args:
+        model_path: Model file to serve
+        
+    Returns:
+        success: Whether the model was swapped
+    """
+    global emotion_model
+    with _model_swap_lock:
+        signature = _model_file_signature(model_path)
+        new_model = EmotionModel(None)
+        if not new_model.load_model(model_path):
+            return False
+        inference_scheduler.model = new_model
+        emotion_model = new_model
+        if model_path == app.config['TRAINED_MODEL_PATH']:
+            _model_reload['signature'] = signature
+    logger.info(f"Serving model {new_model.fingerprint[:12]} from {model_path}")
+    return True
+
+@app.before_request
+def reload_trained_model():
+    """Hot-swap a model trained by any web worker's job into this worker"""
+    interval = app.config['MODEL_RELOAD_INTERVAL']
+    now = time.monotonic()
+    if interval <= 0 or now < _model_reload['next_check']:
+        return
+    _model_reload['next_check'] = now + interval
+    signature = _model_file_signature(app.config['TRAINED_MODEL_PATH'])
+    if signature is not None and signature != _model_reload['signature']:
+        if not swap_model(app.config['TRAINED_MODEL_PATH']):
+            # Do not retry a broken file on every request
+            _model_reload['signature'] = signature
+
+def _update_training_job(job_id, fields):
+    """Persist a training job's progress report"""
+    with app.app_context():
+        job = db.session.get(TrainingJob, job_id)
+        if job is None:
+            return
+        for name, value in fields.items():
+            if name in ('history', 'confusion_matrix'):
+                value = json.dumps(value)
+            elif name in ('started_at', 'finished_at', 'heartbeat_at'):
+                value = datetime.datetime.utcfromtimestamp(value)
+            elif name == 'status' and value == 'running' and job.status == 'cancelling':
+                continue
+            elif job.status in FINAL_STATUSES and name != 'heartbeat_at':
+                # Expired as stale (see _get_training_job); keep its final status
+                continue
+            setattr(job, name, value)
+        db.session.commit()
+
+def _training_job_cancelled(job_id):
+    """Whether a cancellation of the job was recorded (possibly by another web worker) or it was expired as stale"""
+    with app.app_context():
+        job = db.session.get(TrainingJob, job_id)
+        return job is not None and (job.status == 'cancelling' or job.status in FINAL_STATUSES)
+
+def _training_job_heartbeat(job_id):
+    """Record that a job's process is still alive"""
+    _update_training_job(job_id, {'heartbeat_at': time.time()})
+
+training_jobs = TrainingJobManager(
+    on_update=_update_training_job,
+    on_complete=lambda job_id, fields: swap_model(fields['model_path']),
+    cancel_requested=_training_job_cancelled,
+    heartbeat=_training_job_heartbeat
+)
+atexit.register(training_jobs.shutdown)
+
+def _allocate_prediction_ids(count):
+    """
+    Reserve prediction ids that no other worker or insert will take
+    
+    PostgreSQL draws them from the id column's sequence, which ordinary
+    inserts use too; other databases move the id_allocator row for the table
+    past both its previous value and the largest stored id.
+    
+    Args:
+        count: Number of ids to reserve
+        
+    Returns:
+        ids: The reserved ids
+    """
+    table = EmotionPrediction.__tablename__
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.begin() as conn:
+            return list(conn.execute(
+                db.text("SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :count)"),
+                {'table': table, 'count': count}
+            ).scalars())
+    
+    if not app.extensions.get('id_allocator_table'):
+        IdAllocator.__table__.create(db.engine, checkfirst=True)
+        app.extensions['id_allocator_table'] = True
+    allocator = IdAllocator.__table__
+    first_free = db.select(db.func.coalesce(db.func.max(EmotionPrediction.id), 0) + 1).scalar_subquery()
+    with db.engine.begin() as conn:
+        # The UPDATE takes the write lock, so concurrent workers reserve one after another
+        updated = conn.execute(
+            allocator.update()
+            .where(allocator.c.name == table)
+            .values(next_id=db.func.max(allocator.c.next_id, first_free) + count)  # SQLite's scalar max()
+        )
+        if updated.rowcount == 0:
+            conn.execute(allocator.insert().values(name=table, next_id=first_free + count))
+        next_id = conn.execute(db.select(allocator.c.next_id).where(allocator.c.name == table)).scalar()
+    return list(range(next_id - count, next_id))
+
+def _last_reserved_prediction_id():
+    """Largest prediction id reserved so far by _allocate_prediction_ids (0 if none)"""
+    table = EmotionPrediction.__tablename__
+    if db.engine.dialect.name == 'postgresql':
+        return db.session.execute(
+            db.text("SELECT pg_sequence_last_value(pg_get_serial_sequence(:table, 'id')::regclass)"),
+            {'table': table}
+        ).scalar() or 0
+    if not app.extensions.get('id_allocator_table'):
+        IdAllocator.__table__.create(db.engine, checkfirst=True)
+        app.extensions['id_allocator_table'] = True
+    next_id = db.session.execute(db.select(IdAllocator.next_id).where(IdAllocator.name == table)).scalar()
+    return next_id - 1 if next_id is not None else 0
+
+def _ensure_rollup_table():
+    """Create the emotion_rollup table on first use (it is newer than the other tables)"""
+    if not app.extensions.get('emotion_rollup_table'):
+        EmotionRollup.__table__.create(db.engine, checkfirst=True)
+        app.extensions['emotion_rollup_table'] = True
+
+def _insert_predictions(rows):
+    """Insert queued prediction rows and their rollup increments in one transaction"""
+    with app.app_context():
+        _ensure_rollup_table()
+        try:
+            db.session.execute(db.insert(EmotionPrediction), rows)
+            apply_increments(db.session, EmotionRollup, rollup_increments(rows))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+def _is_transient_db_error(error):
+    """Whether a failed insert may succeed unchanged later (lost connection, lock timeout, ...)"""
+    return (isinstance(error, (sa_exc.OperationalError, sa_exc.InterfaceError, sa_exc.TimeoutError))
+            or getattr(error, 'connection_invalidated', False))
+
+prediction_writer = None
+if app.config['PREDICTION_WRITE_BEHIND']:
+    prediction_writer = WriteBehindQueue(
+        insert_rows=_insert_predictions,
+        allocate_ids=_allocate_prediction_ids,
+        max_queue=app.config['WRITE_BEHIND_QUEUE_SIZE'],
+        max_batch=app.config['WRITE_BEHIND_BATCH_SIZE'],
+        flush_interval_ms=app.config['WRITE_BEHIND_FLUSH_MS'],
+        id_block=app.config['PREDICTION_ID_BLOCK'],
+        is_transient=_is_transient_db_error
+    )
+    atexit.register(prediction_writer.shutdown)
+
+def save_prediction(**fields):
+    """
+    Store a prediction record
+    
+    With PREDICTION_WRITE_BEHIND the record gets a reserved id and is queued
+    for the background writer instead of being committed in the request;
+    get_prediction finds it in the queue until it is written.
+    
+    Args:
+        **fields: EmotionPrediction values ('confidences' for the per-emotion values)
+        
+    Returns:
+        record_id: Id of the record, usable in /results/<id> right away
+    """
+    record = EmotionPrediction(**fields)
+    record.timestamp = datetime.datetime.utcnow()
+    if record.is_recorded is None:
+        record.is_recorded = False
+    if prediction_writer is None:
+        _ensure_rollup_table()
+        db.session.add(record)
+        apply_increments(db.session, EmotionRollup, rollup_increments([record]))
+        db.session.commit()
+        return record.id
+    
+    record.id = prediction_writer.reserve_id()
+    prediction_writer.submit({column.key: getattr(record, column.key) for column in EmotionPrediction.__table__.columns})
+    return record.id
+
+def get_prediction(record_id):
+    """
+    Prediction record by id, including one still queued for the write-behind writer
+    
+    A record queued by another web worker is only visible once that worker
+    writes it, so with write-behind a missing record whose id has been
+    reserved (by any worker, each of which holds its own block of ids) is
+    looked up again for up to two flush intervals before giving up. Ids
+    beyond every reserved block are not found right away.
+    """
+    record = db.session.get(EmotionPrediction, record_id)
+    if record is not None or prediction_writer is None:
+        return record
+    row = prediction_writer.pending(record_id)
+    if row is not None:
+        return EmotionPrediction(**row)
+    if record_id > _last_reserved_prediction_id():
+        return None
+    
+    deadline = time.monotonic() + 2 * app.config['WRITE_BEHIND_FLUSH_MS'] / 1000.0 + 0.1
+    while True:
+        row = prediction_writer.pending(record_id)
+        if row is not None:
+            # Transient copy, never added to the session
+            return EmotionPrediction(**row)
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(0.02)
+        record = db.session.get(EmotionPrediction, record_id)
+        if record is not None:
+            return record
+
+# Importing this module stays cheap: the audio libraries (librosa, scipy.signal,
+# soundfile, soxr) are loaded on first use or by warmup()
+def warmup():
+    """
+    Prime this web worker before it takes traffic
+    
+    Starts the processing pool's workers (which warm themselves up), runs a
+    dummy clip through the in-process audio paths used by streaming
+    timelines and live sessions, which compiles librosa's numba kernels, and
+    runs one prediction. Call it from the server's worker start hook, e.g.
+    gunicorn's post_worker_init, not at import time.
+    """
+    start = time.perf_counter()
+    processing_pool.start()
+    features = warmup_pipeline()
+    # Loaded for their import cost only
+    for module in ('streaming', 'soxr'):
+        importlib.import_module(module)
+    emotion_model.predict(features)
+    logger.info(f"Web worker {os.getpid()} warmed up in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+def analyze_audio(audio_bytes, filename=None):
+    """
+    Run the full analysis for one audio file
+    
+    Results are cached by the hash of the file's bytes, the model's weights
+    fingerprint and AUDIO_PARAMS. On a miss, decoding, preprocessing, feature extraction and chart data
+    run in the processing pool and the prediction goes through the inference
+    scheduler. The audio is decoded from memory, never from the upload folder.
+    
+    Args:
+        audio_bytes: Raw bytes of the audio file
+        filename: Original file name, used as a format hint when decoding
+        
+    Returns:
+        prediction: Predicted emotion
+        confidence: Dictionary of confidence values for each emotion
+        waveform: Packed waveform/spectrogram for the database, from which
+            the browser draws the charts (see utils.pack_waveform)
+    """
+    cache_key = make_cache_key(audio_bytes, model=emotion_model.fingerprint, waveform_format=WAVEFORM_MAGIC, **AUDIO_PARAMS)
+    cached = feature_cache.get(cache_key)
+    if cached is not None:
+        return cached['prediction'], cached['confidence'], base64.b64decode(cached['waveform'])
+    
+    analysis = processing_pool.analyze(audio_bytes, AUDIO_PARAMS, filename=filename)
+    prediction, confidence = inference_scheduler.predict(analysis['features'])
+    feature_cache.put(cache_key, {
+        'features': analysis['features'],
+        'prediction': prediction,
+        'confidence': confidence,
+        # The disk tier stores JSON metadata
+        'waveform': base64.b64encode(analysis['waveform']).decode('ascii'),
+    })
+    return prediction, confidence, analysis['waveform']
+
+@app.errorhandler(PoolSaturatedError)
+def pool_saturated(e):
+    """Shed load with 503 + Retry-After instead of queueing without bound"""
+    headers = {'Retry-After': str(e.retry_after)}
+    if request.is_json:
+        return jsonify({'error': 'Server busy, please retry shortly'}), 503, headers
+    return 'Server busy, please retry shortly', 503, headers
 
 @app.route('/')
 def index():
@@ -94,51 +628,33 @@ def predict():
     
     if file and allowed_file(file.filename):
         try:
-            # Save uploaded file temporarily
+            # Read the upload into memory; it is decoded without touching disk
             filename = secure_filename(file.filename or "uploaded_audio.wav")
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
+            audio_bytes = file.read()
             
-            # Process audio and extract features
-            preprocessed_audio = preprocess_audio(filepath)
-            audio_data, sr = preprocessed_audio  # Unpack audio data and sample rate
-            features = extract_features(preprocessed_audio)
-            
-            # Make prediction
-            prediction, confidence = emotion_model.predict(features)
-            
-            # Generate visualizations
-            prediction_chart = plot_prediction(prediction, confidence)
-            waveform_chart, waveform_data = plot_audio_waveform(audio_data, sr)
-            spectrogram_chart = plot_spectrogram(audio_data, sr)
+            # Process audio, make prediction and generate visualizations
+            prediction, confidence, waveform = analyze_audio(audio_bytes, filename)
             
             # Save prediction to database
-            from models import EmotionPrediction
-            prediction_record = EmotionPrediction(
-                filename=os.path.basename(filepath) if file.filename else None,
+            record_id = save_prediction(
+                filename=filename if file.filename else None,
                 emotion=prediction,
                 confidence=confidence[prediction],
-                all_confidences=json.dumps(confidence),
+                confidences=confidence,
                 is_recorded=False,
-                waveform_data=waveform_data
+                waveform=waveform
             )
-            db.session.add(prediction_record)
-            db.session.commit()
-            
-            # Clean up the temporary file
-            os.remove(filepath)
             
             return render_template(
                 'results.html', 
                 prediction=prediction,
                 confidence=confidence,
-                chart=prediction_chart,
-                waveform_chart=waveform_chart,
-                spectrogram_chart=spectrogram_chart,
                 emotions=EMOTIONS,
-                record_id=prediction_record.id
+                record_id=record_id
             )
             
+        except PoolSaturatedError:
+            raise
         except Exception as e:
             logger.error(f"Error processing audio: {str(e)}")
             flash(f'Error processing audio: {str(e)}', 'danger')
@@ -160,47 +676,137 @@ def process_recording():
         encoded_data = audio_data.split(',')[1]
         binary_data = base64.b64decode(encoded_data)
         
-        # Save audio to temporary file
-        temp_file = os.path.join(app.config['UPLOAD_FOLDER'], 'recorded_audio.wav')
-        with open(temp_file, 'wb') as f:
-            f.write(binary_data)
+        # Process audio, make prediction and generate visualizations
+        prediction, confidence, waveform = analyze_audio(binary_data, 'recorded_audio.wav')
         
-        # Process audio and extract features
-        preprocessed_audio = preprocess_audio(temp_file)
-        audio_data, sr = preprocessed_audio  # Unpack audio data and sample rate
-        features = extract_features(preprocessed_audio)
+        # Save prediction to database
+        record_id = save_prediction(
+            filename='recorded_audio.wav',
+            emotion=prediction,
+            confidence=confidence[prediction],
+            confidences=confidence,
+            is_recorded=True,
+            waveform=waveform
+        )
         
-        # Make prediction
-        prediction, confidence = emotion_model.predict(features)
+        return jsonify({
+            'success': True,
+            'redirect': url_for('results', record_id=record_id)
+        })
         
-        # Generate visualizations
-        prediction_chart = plot_prediction(prediction, confidence)
-        waveform_chart, waveform_data = plot_audio_waveform(audio_data, sr)
-        spectrogram_chart = plot_spectrogram(audio_data, sr)
+    except PoolSaturatedError:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing recorded audio: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/predict/timeline', methods=['POST'])
+def predict_timeline():
+    """Stream a per-window emotion timeline for a long recording as NDJSON"""
+    file = request.files.get('file')
+    if not file or not file.filename or not allowed_file(file.filename):
+        return jsonify({'error': 'Allowed file types are .wav, .mp3, .ogg'}), 400
+    
+    try:
+        window = float(request.values.get('window', 3))
+        hop = float(request.values.get('hop', 1))
+    except ValueError:
+        return jsonify({'error': 'window and hop must be numbers'}), 400
+    if window <= 0 or hop <= 0:
+        return jsonify({'error': 'window and hop must be positive'}), 400
+    
+    # Save to a unique temporary file so concurrent uploads never collide
+    suffix = os.path.splitext(secure_filename(file.filename))[1]
+    fd, filepath = tempfile.mkstemp(suffix=suffix, dir=app.config['UPLOAD_FOLDER'])
+    with os.fdopen(fd, 'wb') as f:
+        file.save(f)
+    
+    def generate():
+        from streaming import stream_emotion_timeline
+        try:
+            for entry in stream_emotion_timeline(filepath, inference_scheduler, window=window, hop=hop):
+                yield json.dumps(entry) + '\n'
+        except Exception as e:
+            logger.error(f"Error streaming emotion timeline: {str(e)}")
+            yield json.dumps({'error': str(e)}) + '\n'
+        finally:
+            # Clean up the temporary file
+            os.remove(filepath)
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/live/start', methods=['POST'])
+def live_start():
+    """Start a live recording session for raw PCM frames"""
+    try:
+        sample_rate = int((request.get_json(silent=True) or {}).get('sample_rate', 0))
+        live_session = live_sessions.create(sample_rate)
+    except ValueError:
+        return jsonify({'error': 'A positive sample_rate is required'}), 400
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(app.config['LIVE_IDLE_TIMEOUT'])}
+    
+    return jsonify({
+        'session_id': live_session.id,
+        'window': live_session.window,
+        'hop': live_session.hop
+    })
+
+@app.route('/live/<session_id>/frames', methods=['POST'])
+def live_frames(session_id):
+    """Append raw mono float32 little-endian PCM frames and return newly completed windows"""
+    live_session = live_sessions.get(session_id)
+    if live_session is None:
+        return jsonify({'error': 'Unknown or expired session'}), 404
+    
+    data = request.get_data(cache=False)
+    if len(data) % 4 != 0:
+        return jsonify({'error': 'Frames must be float32 samples'}), 400
+    
+    try:
+        results = live_session.push(np.frombuffer(data, dtype='<f4'))
+        return jsonify({'results': results})
+    except Exception as e:
+        logger.error(f"Error processing live frames: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/live/<session_id>/finish', methods=['POST'])
+def live_finish(session_id):
+    """Close a live recording session and save its overall prediction"""
+    live_session = live_sessions.close(session_id)
+    if live_session is None:
+        return jsonify({'error': 'Unknown or expired session'}), 404
+    
+    try:
+        from spectral import compute_spectrum
+        summary = live_session.finish()
+        prediction = summary['emotion']
+        confidence = summary['all_confidences']
         
         # Save prediction to database
-        from models import EmotionPrediction
-        prediction_record = EmotionPrediction(
-            filename='recorded_audio.wav',
+        record_id = save_prediction(
+            filename='live_recording',
             emotion=prediction,
             confidence=confidence[prediction],
-            all_confidences=json.dumps(confidence),
+            confidences=confidence,
             is_recorded=True,
-            waveform_data=waveform_data
+            waveform=downsample_waveform(
+                summary['audio'],
+                summary['sr'],
+                spectrum=compute_spectrum(summary['audio'], summary['sr'])
+            )
         )
-        db.session.add(prediction_record)
-        db.session.commit()
-        
-        # Clean up the temporary file
-        os.remove(temp_file)
         
         return jsonify({
             'success': True,
-            'redirect': url_for('results', record_id=prediction_record.id)
+            'timeline': summary['timeline'],
+            'redirect': url_for('results', record_id=record_id)
         })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Error processing recorded audio: {str(e)}")
+        logger.error(f"Error finishing live session: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/results/<int:record_id>')
@@ -208,58 +814,18 @@ def results(record_id):
     """Show results for a specific prediction"""
     try:
         # Get prediction from database
-        prediction_record = db.session.get_or_404(EmotionPrediction, record_id)
+        prediction_record = get_prediction(record_id)
         
         if not prediction_record:
             flash('Prediction record not found', 'danger')
             return redirect(url_for('index'))
         
-        # Load confidence values from JSON
-        confidence = json.loads(prediction_record.all_confidences)
-        
-        # Generate prediction chart
-        prediction_chart = plot_prediction(prediction_record.emotion, confidence)
-        
-        # If there's waveform data, use it to create a waveform chart
-        waveform_chart = None
-        spectrogram_chart = None
-        if prediction_record.waveform_data:
-            try:
-                # For demonstration, we'll just show a placeholder chart
-                waveform_data = json.loads(prediction_record.waveform_data)
-                if 'audio' in waveform_data and 'times' in waveform_data:
-                    # Import matplotlib here to avoid global import issues
-                    import matplotlib.pyplot as plt
-                    import io
-                    
-                    # Plot from stored data
-                    plt.figure(figsize=(10, 3))
-                    plt.plot(waveform_data['times'], waveform_data['audio'], color='#3498db')
-                    plt.title('Audio Waveform')
-                    plt.xlabel('Time (s)')
-                    plt.ylabel('Amplitude')
-                    plt.axhline(y=0, color='r', linestyle='-', alpha=0.3)
-                    plt.ylim(-1.1, 1.1)
-                    plt.tight_layout()
-                    
-                    # Save plot to a bytes buffer
-                    buf = io.BytesIO()
-                    plt.savefig(buf, format='png')
-                    buf.seek(0)
-                    
-                    # Convert plot to base64 string
-                    waveform_chart = base64.b64encode(buf.getvalue()).decode('utf-8')
-                    plt.close()
-            except Exception as e:
-                logger.error(f"Error generating waveform chart: {str(e)}")
+        confidence = prediction_record.confidences
         
         return render_template(
             'results.html', 
             prediction=prediction_record.emotion,
             confidence=confidence,
-            chart=prediction_chart,
-            waveform_chart=waveform_chart,
-            spectrogram_chart=spectrogram_chart,
             emotions=EMOTIONS,
             record_id=record_id,
             timestamp=prediction_record.timestamp,
@@ -271,52 +837,103 @@ def results(record_id):
         flash(f'Error displaying results: {str(e)}', 'danger')
         return redirect(url_for('index'))
 
+def cacheable_response(body, mimetype, etag):
+    """Response for immutable record data: public caching plus ETag revalidation (304)"""
+    response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['CHART_MAX_AGE']
+    return response.make_conditional(request)
+
+@app.route('/charts/<int:record_id>.json')
+def chart_data(record_id):
+    """
+    Data the results page draws its charts from: the confidences, a min/max
+    waveform envelope and the uint8-quantized log-mel spectrogram (if stored)
+    """
+    prediction_record = get_prediction(record_id)
+    if prediction_record is None:
+        abort(404)
+    
+    waveform = None
+    spectrogram = None
+    if prediction_record.waveform:
+        waveform_data = unpack_waveform(prediction_record.waveform)
+        waveform = {'duration': waveform_data['duration'], 'min': waveform_data['min'], 'max': waveform_data['max']}
+        spectrogram = waveform_data['spectrogram']
+    
+    body = json.dumps({
+        'id': record_id,
+        'emotion': prediction_record.emotion,
+        'confidences': prediction_record.confidences,
+        'waveform': waveform,
+        'spectrogram': spectrogram,
+    }, separators=(',', ':'))
+    return cacheable_response(body, 'application/json', hashlib.sha1(body.encode('utf-8')).hexdigest())
+
+@app.route('/charts/<int:record_id>/<kind>.png')
+def chart_image(record_id, kind):
+    """Serve a PNG chart of a prediction record, rendering it on a cache miss"""
+    if kind not in CHART_KINDS:
+        abort(404)
+    
+    chart = chart_cache.get(record_id, kind)
+    if chart is None:
+        prediction_record = get_prediction(record_id)
+        if prediction_record is None:
+            abort(404)
+        
+        png = None
+        if kind == 'prediction':
+            png = processing_pool.render_prediction_chart(
+                prediction_record.emotion,
+                prediction_record.confidences
+            )
+        elif kind == 'waveform' and prediction_record.waveform:
+            waveform_data = unpack_waveform(prediction_record.waveform)
+            if waveform_data['audio']:
+                png = processing_pool.render_waveform_chart(waveform_data['times'], waveform_data['audio'])
+        if not png:
+            abort(404)
+        chart = chart_cache.put(record_id, kind, png)
+    
+    png, etag = chart
+    return cacheable_response(png, 'image/png', etag)
+
 @app.route('/sample/<sample_name>')
 def analyze_sample(sample_name):
     """Analyze a sample audio file"""
     try:
         # Load sample audio
         audio_path = load_sample_audio(sample_name)
+        with open(audio_path, 'rb') as f:
+            audio_bytes = f.read()
         
-        # Process audio and extract features
-        preprocessed_audio = preprocess_audio(audio_path)
-        audio_data, sr = preprocessed_audio  # Unpack audio data and sample rate
-        features = extract_features(preprocessed_audio)
-        
-        # Make prediction
-        prediction, confidence = emotion_model.predict(features)
-        
-        # Generate visualizations
-        prediction_chart = plot_prediction(prediction, confidence)
-        waveform_chart, waveform_data = plot_audio_waveform(audio_data, sr)
-        spectrogram_chart = plot_spectrogram(audio_data, sr)
+        # Process audio, make prediction and generate visualizations
+        prediction, confidence, waveform = analyze_audio(audio_bytes, os.path.basename(audio_path))
         
         # Save prediction to database
-        from models import EmotionPrediction
-        prediction_record = EmotionPrediction(
+        record_id = save_prediction(
             filename=f"{sample_name}.wav",
             emotion=prediction,
             confidence=confidence[prediction],
-            all_confidences=json.dumps(confidence),
+            confidences=confidence,
             is_recorded=False,
-            waveform_data=waveform_data
+            waveform=waveform
         )
-        db.session.add(prediction_record)
-        db.session.commit()
         
         return render_template(
             'results.html', 
             prediction=prediction,
             confidence=confidence,
-            chart=prediction_chart,
-            waveform_chart=waveform_chart,
-            spectrogram_chart=spectrogram_chart,
             emotions=EMOTIONS,
-            record_id=prediction_record.id,
+            record_id=record_id,
             is_sample=True,
             sample_name=sample_name
         )
         
+    except PoolSaturatedError:
+        raise
     except Exception as e:
         logger.error(f"Error processing sample audio: {str(e)}")
         flash(f'Error processing sample audio: {str(e)}', 'danger')
@@ -324,16 +941,29 @@ def analyze_sample(sample_name):
 
 @app.route('/history')
 def history():
-    """Show history of emotion predictions"""
+    """
+    Show history of emotion predictions, newest first, one page at a time
+    
+    Filters (see history.parse_filters) are query arguments; the 'before'
+    cursor of the next page is in the 'Older' link.
+    """
     try:
-        # Get predictions from database
-        from models import EmotionPrediction
-        predictions = EmotionPrediction.query.order_by(EmotionPrediction.timestamp.desc()).limit(10).all()
+        try:
+            filters = parse_filters(request.args, EMOTIONS)
+        except ValueError as e:
+            flash(str(e), 'warning')
+            return redirect(url_for('history'))
+        
+        predictions, next_cursor = history_page(db.session, EmotionPrediction, **filters)
+        page_args = {k: v for k, v in request.args.items() if k != 'before' and v}
         
         return render_template(
             'history.html',
             predictions=predictions,
-            emotions=EMOTIONS
+            emotions=EMOTIONS,
+            filters=page_args,
+            newer_url=url_for('history', **page_args) if 'before' in request.args else None,
+            older_url=url_for('history', before=next_cursor, **page_args) if next_cursor else None
         )
         
     except Exception as e:
@@ -341,39 +971,248 @@ def history():
         flash(f'Error displaying history: {str(e)}', 'danger')
         return redirect(url_for('index'))
 
+@app.route('/history.json')
+def history_json():
+    """
+    JSON page of the prediction history (same filters as /history)
+    
+    Returns the predictions without their waveform data and 'next', the
+    URL of the next page (null on the last page).
+    """
+    try:
+        filters = parse_filters(request.args, EMOTIONS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    predictions, next_cursor = history_page(db.session, EmotionPrediction, **filters)
+    page_args = {k: v for k, v in request.args.items() if k != 'before' and v}
+    return jsonify({
+        'predictions': [prediction.to_dict(include_waveform=False) for prediction in predictions],
+        'next': url_for('history_json', before=next_cursor, **page_args) if next_cursor else None
+    })
+
+@app.route('/history/export')
+def history_export():
+    """
+    Stream the whole prediction history (or the part matching the /history
+    filters) as a file download
+    
+    Query arguments: 'format' ('csv', the default, 'ndjson' or 'parquet'),
+    'waveform=false' to leave out the waveform column and 'gzip=true' to
+    compress csv and ndjson on the fly.
+    """
+    export_format = request.args.get('format', 'csv')
+    include_waveform = request.args.get('waveform', 'true').lower() not in ('false', '0')
+    compress = request.args.get('gzip', 'false').lower() in ('true', '1')
+    try:
+        check_format(export_format, compress)
+        filters = parse_filters({k: v for k, v in request.args.items() if k in ('emotion', 'since', 'until', 'recorded')},
+                                EMOTIONS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 501
+    
+    def generate():
+        try:
+            yield from export_chunks(db.session, EmotionPrediction, EMOTIONS, export_format, filters,
+                                     include_waveform=include_waveform, compress=compress)
+        except Exception as e:
+            # The status line is sent already: log and cut the download short
+            logger.error(f"Error exporting prediction history: {str(e)}")
+            raise
+    
+    filename = f"predictions.{export_format}" + ('.gz' if compress else '')
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/gzip' if compress else MIMETYPES[export_format],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@app.route('/analytics.json')
+def analytics_json():
+    """
+    Prediction counts, recorded/uploaded splits and mean confidence per
+    emotion for each hour or day of a range, read from the rollup table
+    
+    Query arguments: 'granularity' ('hour', the default, or 'day') and
+    'since'/'until' (ISO dates or datetimes, UTC; the last 48 hours or 30
+    days by default).
+    """
+    try:
+        query = parse_query(request.args, parse_time)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        _ensure_rollup_table()
+        return jsonify(rollup_series(db.session, EmotionRollup, EMOTIONS, **query))
+    except Exception as e:
+        logger.error(f"Error reading analytics: {str(e)}")
+        return jsonify({'error': 'Error reading analytics'}), 500
+
+@app.route('/metrics/persistence')
+def persistence_metrics():
+    """Write-behind queue depth and batching metrics"""
+    if prediction_writer is None:
+        return jsonify({'write_behind': False})
+    return jsonify({'write_behind': True, **prediction_writer.stats()})
+
+@app.route('/metrics/inference')
+def inference_metrics():
+    """Inference queue depth and batching metrics"""
+    return jsonify(inference_scheduler.stats())
+
+@app.route('/metrics/processing')
+def processing_metrics():
+    """Processing pool backlog and rejection metrics"""
+    return jsonify(processing_pool.stats())
+
+@app.route('/metrics/charts')
+def chart_metrics():
+    """Rendered chart cache metrics"""
+    return jsonify(chart_cache.stats())
+
+@app.route('/metrics/cache')
+def cache_metrics():
+    """Feature cache hit/miss metrics"""
+    return jsonify(feature_cache.stats())
+
+def _ensure_training_jobs_table():
+    """Create the training_job table on first use (it is newer than the other tables)"""
+    if not app.extensions.get('training_job_table'):
+        TrainingJob.__table__.create(db.engine, checkfirst=True)
+        columns = {column['name'] for column in sa_inspect(db.engine).get_columns(TrainingJob.__tablename__)}
+        if 'heartbeat_at' not in columns:
+            # Tables created before jobs reported heartbeats
+            with db.engine.begin() as conn:
+                conn.execute(sa_text(f"ALTER TABLE {TrainingJob.__tablename__} ADD COLUMN heartbeat_at {db.DateTime().compile(dialect=db.engine.dialect)}"))
+        app.extensions['training_job_table'] = True
+
+def _get_training_job(job_id):
+    """Training job by id, marking it failed if the web worker running it stopped reporting it alive"""
+    _ensure_training_jobs_table()
+    job = db.session.get(TrainingJob, job_id)
+    if job is None or job.status in FINAL_STATUSES:
+        return job
+    last_seen = job.heartbeat_at or job.created_at
+    stale_after = datetime.timedelta(seconds=app.config['TRAINING_JOB_STALE_SECONDS'])
+    if last_seen is not None and datetime.datetime.utcnow() - last_seen > stale_after:
+        job.status = 'failed'
+        job.error = 'The web worker running this job stopped before it finished'
+        job.finished_at = datetime.datetime.utcnow()
+        db.session.commit()
+    return job
+
 @app.route('/train')
 def train_page():
-    """Training page"""
-    # This would be enhanced with proper dataset upload and training in a real application
-    return render_template('train.html')
+    """Training page, showing a job's progress or results when ?job= is given"""
+    job_id = request.args.get('job')
+    if not job_id:
+        return render_template('train.html')
+    
+    job = _get_training_job(job_id)
+    if job is None:
+        flash('Training job not found', 'danger')
+        return redirect(url_for('train_page'))
+    if job.status != 'completed':
+        return render_template('train.html', job=job.to_dict())
+    
+    # Generate confusion matrix visualization
+    cm_chart = plot_confusion_matrix(np.array(json.loads(job.confusion_matrix)), EMOTIONS)
+    return render_template(
+        'train.html',
+        trained=True,
+        accuracy=job.accuracy,
+        cm_chart=cm_chart,
+        history=json.loads(job.history)
+    )
 
 @app.route('/train/start', methods=['POST'])
 def start_training():
-    """Start the training process"""
+    """
+    Start a background training job
+    
+    Featurization and training run in a separate process; the response
+    carries the job id right away (202 with the status URL for JSON
+    clients, otherwise a redirect to the job's progress page).
+    """
+    params = (request.get_json(silent=True) or {}) if request.is_json else request.form
+    
+    def fail(message, status):
+        if request.is_json:
+            return jsonify({'error': message}), status
+        flash(message, 'warning' if status < 500 else 'danger')
+        return redirect(url_for('train_page'))
+    
+    data_dir = app.config['TRAINING_DATA_DIR']
+    if not data_dir or not os.path.isdir(data_dir):
+        return fail('No training data found. Set TRAINING_DATA_DIR to a directory with one folder per emotion.', 400)
     try:
-        # In a real application, we'd handle dataset upload and verification
-        epochs = int(request.form.get('epochs', 10))
-        
-        # Train model (simplified for demonstration)
-        history, accuracy, confusion_mat = emotion_model.train(epochs=epochs)
-        
-        # Generate confusion matrix visualization
-        cm_chart = plot_confusion_matrix(confusion_mat, EMOTIONS)
+        config = {
+            'epochs': int(params.get('epochs', 10)),
+            'batch_size': int(params.get('batch_size', 32)),
+            'learning_rate': float(params.get('learning_rate', 0.001)),
+            'dropout': float(params.get('dropout', 0.3)),
+        }
+    except (TypeError, ValueError):
+        return fail('Invalid training parameters', 400)
+    if not 1 <= config['epochs'] <= 1000 or config['batch_size'] < 1 or not 0 <= config['dropout'] < 1:
+        return fail('Invalid training parameters', 400)
+    
+    try:
+        _ensure_training_jobs_table()
+        job = TrainingJob(id=uuid.uuid4().hex, status='queued', params=json.dumps(config))
+        db.session.add(job)
+        db.session.commit()
         
-        flash(f'Model trained successfully with {accuracy:.2f}% accuracy', 'success')
+        config.update({
+            'data_dir': data_dir,
+            'store_dir': app.config['FEATURE_STORE_DIR'],
+            'audio_params': AUDIO_PARAMS,
+            'output_path': app.config['TRAINED_MODEL_PATH'],
+            'workers': app.config['TRAINING_WORKERS'],
+            'weights_dtype': app.config['MODEL_WEIGHTS_DTYPE'],
+            'blas_threads': app.config['INFERENCE_BLAS_THREADS'],
+        })
+        try:
+            training_jobs.submit(job.id, config)
+        except JobBusyError as e:
+            job.status = 'failed'
+            job.error = str(e)
+            db.session.commit()
+            return fail(str(e), 409)
         
-        return render_template(
-            'train.html', 
-            trained=True, 
-            accuracy=accuracy,
-            cm_chart=cm_chart,
-            history=history
-        )
+        status_url = url_for('training_status', job_id=job.id)
+        if request.is_json:
+            return jsonify({'job_id': job.id, 'status_url': status_url}), 202, {'Location': status_url}
+        return redirect(url_for('train_page', job=job.id))
         
     except Exception as e:
-        logger.error(f"Error during training: {str(e)}")
-        flash(f'Error during training: {str(e)}', 'danger')
-        return redirect(url_for('train_page'))
+        logger.error(f"Error starting training: {str(e)}")
+        return fail(f'Error starting training: {str(e)}', 500)
+
+@app.route('/train/status/<job_id>')
+def training_status(job_id):
+    """Poll a training job's status, progress and per-epoch metrics"""
+    job = _get_training_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Training job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/train/cancel/<job_id>', methods=['POST'])
+def cancel_training(job_id):
+    """Cancel a training job; the web worker running it stops it within a second"""
+    job = _get_training_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Training job not found'}), 404
+    if job.status not in FINAL_STATUSES:
+        job.status = 'cancelling'
+        db.session.commit()
+        training_jobs.cancel(job_id)
+    if request.is_json:
+        return jsonify(job.to_dict())
+    return redirect(url_for('train_page', job=job_id))
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,34 @@
+"""
+Audio pipeline options for Speech Emotion Recognition
+Names of the resampling backends the decoder accepts, and the check the app
+runs on its configuration at startup. This module imports no audio library,
+so validating the configuration keeps importing the app cheap.
+"""
+import importlib.util
+
+# Resampling backends accepted by audio_processor.load_audio (librosa res_type
+# names) and the module each needs: soxr_hq is librosa's default, soxr_qq and
+# polyphase trade quality for speed, kaiser_* need the optional resampy
+RESAMPLE_BACKENDS = {
+    'soxr_vhq': 'soxr',
+    'soxr_hq': 'soxr',
+    'soxr_mq': 'soxr',
+    'soxr_lq': 'soxr',
+    'soxr_qq': 'soxr',
+    'polyphase': 'scipy',
+    'kaiser_best': 'resampy',
+    'kaiser_fast': 'resampy',
+}
+
+def check_res_type(res_type):
+    """
+    Validate a resampling backend
+
+    Raises:
+        ValueError: If the backend is unknown or its module is not installed
+    """
+    if res_type not in RESAMPLE_BACKENDS:
+        raise ValueError(f"Unknown resampling backend {res_type}; expected one of {', '.join(RESAMPLE_BACKENDS)}")
+    module = RESAMPLE_BACKENDS[res_type]
+    if importlib.util.find_spec(module) is None:
+        raise ValueError(f"Resampling backend {res_type} needs {module}: pip install {module}")
@@ -3,29 +3,97 @@ Audio processing module for Speech Emotion Recognition
 Handles audio loading, preprocessing, and normalization
 """
 import os
+import io
+import time
+import shutil
 import logging
+import tempfile
+from functools import lru_cache
 import numpy as np
+import scipy.signal
 import librosa
+import soundfile as sf
+import soxr
+
+from spectral import compute_spectrum
+from audio_options import check_res_type
 
 logger = logging.getLogger(__name__)
 
-def load_audio(file_path, sr=22050):
+def _load_buffer(buffer, filename=None, **kwargs):
+    """
+    Decode an in-memory audio buffer
+    
+    Formats soundfile can read (WAV, OGG, FLAC, MP3 with libsndfile >= 1.1)
+    are decoded straight from memory. Anything else is spilled to a
+    temporary file so librosa can fall back to an external decoder.
+    """
+    if buffer.seekable():
+        buffer.seek(0)
+    try:
+        return librosa.load(buffer, **kwargs)
+    except Exception as e:
+        logger.info(f"In-memory decode failed ({str(e)}); spilling to a temporary file")
+    
+    buffer.seek(0)
+    suffix = os.path.splitext(filename or getattr(buffer, 'name', None) or '')[1]
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            shutil.copyfileobj(buffer, f)
+        return librosa.load(path, **kwargs)
+    finally:
+        os.remove(path)
+
+def load_audio(file_path, sr=22050, filename=None, res_type='soxr_hq', offset=0.0, duration=None):
     """
     Load audio file
     
+    Decoding and resampling are timed separately and logged together with
+    the resampling backend. Resampling is skipped when the file's native
+    rate already matches the target rate.
+    
     Args:
-        file_path: Path to audio file
-        sr: Target sampling rate
+        file_path: Path to audio file, raw bytes or a file-like object
+        sr: Target sampling rate (None keeps the native rate)
+        filename: Original file name, used as a format hint for in-memory input
+        res_type: Resampling backend, one of audio_options.RESAMPLE_BACKENDS
+        offset: Start decoding this many seconds into the file
+        duration: Decode at most this many seconds (None for the whole file)
         
     Returns:
         audio: Audio time series
         sr: Sampling rate
     """
+    check_res_type(res_type)
+    
+    name = filename or (file_path if isinstance(file_path, (str, os.PathLike)) else 'in-memory audio')
     try:
-        audio, sr = librosa.load(file_path, sr=sr, mono=True)
+        decode_start = time.perf_counter()
+        if isinstance(file_path, (bytes, bytearray, memoryview)):
+            file_path = io.BytesIO(file_path)
+        if hasattr(file_path, 'read'):
+            audio, native_sr = _load_buffer(file_path, filename, sr=None, mono=True, offset=offset, duration=duration)
+        else:
+            audio, native_sr = librosa.load(file_path, sr=None, mono=True, offset=offset, duration=duration)
+        decode_ms = (time.perf_counter() - decode_start) * 1000
+        
+        resample_start = time.perf_counter()
+        if sr is None or sr == native_sr:
+            backend = 'passthrough'
+            sr = native_sr
+        else:
+            backend = res_type
+            audio = librosa.resample(audio, orig_sr=native_sr, target_sr=sr, res_type=res_type)
+        resample_ms = (time.perf_counter() - resample_start) * 1000
+        
+        logger.info(
+            f"Loaded {name}: decoded {native_sr} Hz in {decode_ms:.1f} ms, "
+            f"resampled to {sr} Hz with {backend} in {resample_ms:.1f} ms"
+        )
         return audio, sr
     except Exception as e:
-        logger.error(f"Error loading audio file {file_path}: {str(e)}")
+        logger.error(f"Error loading audio file {name}: {str(e)}")
         raise ValueError(f"Could not load audio file: {str(e)}")
 
 def trim_silence(audio, top_db=20):
@@ -67,68 +135,144 @@ def normalize_audio(audio):
         logger.error(f"Error normalizing audio: {str(e)}")
         return audio
 
-def remove_noise(audio, sr):
+@lru_cache(maxsize=16)
+def _highpass_sos(sr, cutoff, order):
+    """Butterworth high-pass design in second-order sections, cached per sampling rate"""
+    return scipy.signal.butter(order, cutoff, btype='highpass', fs=sr, output='sos')
+
+class HighPassFilter:
     """
-    Simple noise reduction using high-pass filter
-    For production, a more sophisticated method would be used
+    Stateful Butterworth high-pass filter
+    
+    Filter state is carried between calls to process(), so a signal fed in
+    chunks gives exactly the same output as the whole signal at once.
+    """
+    
+    def __init__(self, sr, cutoff=70, order=4):
+        """
+        Initialize high-pass filter
+        
+        Args:
+            sr: Sampling rate
+            cutoff: Cutoff frequency in Hz
+            order: Filter order
+        """
+        self.sos = _highpass_sos(sr, cutoff, order)
+        self.reset()
+    
+    def reset(self):
+        """Clear the filter state"""
+        self.zi = np.zeros((self.sos.shape[0], 2))
+    
+    def process(self, chunk):
+        """
+        Filter the next chunk of the signal
+        
+        Args:
+            chunk: Audio samples following the previous chunk
+            
+        Returns:
+            filtered_chunk: Filtered samples, same length and dtype as chunk
+        """
+        filtered, self.zi = scipy.signal.sosfilt(self.sos, chunk, zi=self.zi)
+        return filtered.astype(np.asarray(chunk).dtype, copy=False)
+
+def remove_noise(audio, sr, spectrum=None, method='highpass'):
+    """
+    Noise reduction
+    
+    'highpass' removes low-frequency rumble with a 4th-order Butterworth
+    high-pass at 70 Hz; it needs no FFT and can run chunk by chunk through
+    HighPassFilter. 'spectral_gate' additionally attenuates time-frequency
+    bins that stay close to the estimated noise floor.
     
     Args:
         audio: Audio time series
         sr: Sampling rate
+        spectrum: Precomputed SpectralAnalysis of the audio, used by
+            'spectral_gate' (computed if None)
+        method: 'highpass' or 'spectral_gate'
         
     Returns:
         filtered_audio: Filtered audio with reduced noise
     """
     try:
-        # Simple high-pass filter to remove low-frequency noise
-        # In a production system, we'd use more sophisticated methods
-        filter_stop_freq = 70  # Hz
-        filter_pass_freq = 100  # Hz
-        filter_order = 4
-        
-        # Convert to frequency domain
-        nyquist = sr // 2
-        
-        # Using a simple filter for demonstration
-        # In production, we'd use scipy.signal.butter and filtfilt
-        # But for simplicity, let's use a simple approach
-        S = librosa.stft(audio)
-        # High-pass filter (zero out low frequencies)
-        freq_bins = librosa.fft_frequencies(sr=sr, n_fft=2048)
-        mask = freq_bins >= filter_stop_freq
-        S_filtered = S.copy()
-        S_filtered[:, ~mask] = 0
-        
-        # Convert back to time domain
-        filtered_audio = librosa.istft(S_filtered)
-        
-        return filtered_audio
+        if method == 'highpass':
+            return HighPassFilter(sr).process(audio)
+        elif method == 'spectral_gate':
+            if spectrum is None:
+                spectrum = compute_spectrum(audio, sr)
+            return HighPassFilter(sr).process(spectrum.spectral_gate())
+        else:
+            raise ValueError(f"Unknown noise reduction method: {method}")
     except Exception as e:
         logger.error(f"Error applying noise reduction: {str(e)}")
         return audio  # Return original audio if noise reduction fails
 
-def preprocess_audio(file_path, sr=22050, duration=3):
+def preprocess_signal(audio, sr, denoise=True, denoise_method='highpass'):
+    """
+    Preprocess decoded audio: trim silence, reduce noise, normalize
+    
+    Args:
+        audio: Audio time series
+        sr: Sampling rate
+        denoise: Whether to apply noise reduction (False if the caller
+            already filtered the signal, e.g. in the streaming paths)
+        denoise_method: Noise reduction method (see remove_noise)
+        
+    Returns:
+        preprocessed_audio: Preprocessed audio time series
+    """
+    # Trim silence
+    audio = trim_silence(audio)
+    
+    # Noise reduction
+    if denoise:
+        audio = remove_noise(audio, sr, method=denoise_method)
+    
+    # Normalize audio
+    return normalize_audio(audio)
+
+def preprocess_audio(file_path, sr=22050, duration=3, return_spectrum=False, filename=None,
+                     res_type='soxr_hq', limit_decode=False, denoise_method='highpass', strict=False):
     """
     Preprocess audio file: load, trim silence, normalize, reduce noise
     
     Args:
-        file_path: Path to audio file
+        file_path: Path to audio file, raw bytes or a file-like object
         sr: Target sampling rate
         duration: Target duration in seconds (None for no duration limit)
+        return_spectrum: Whether to also return the SpectralAnalysis of the
+            preprocessed audio for reuse by feature extraction and plotting
+        filename: Original file name, used as a format hint for in-memory input
+        res_type: Resampling backend, one of audio_options.RESAMPLE_BACKENDS
+        limit_decode: Decode only the first `duration` seconds instead of the whole file
+        denoise_method: Noise reduction method (see remove_noise)
+        strict: Raise on undecodable or silent audio instead of substituting
+            a synthetic tone (used when building training data)
         
     Returns:
         preprocessed_audio: Preprocessed audio time series
         sr: Sampling rate
+        spectrum: SpectralAnalysis of the preprocessed audio (if return_spectrum)
     """
     try:
         # Check if file exists
-        if not os.path.exists(file_path):
+        if isinstance(file_path, (str, os.PathLike)) and not os.path.exists(file_path):
             raise FileNotFoundError(f"Audio file not found: {file_path}")
             
         try:
             # Try to load audio
-            audio, sr = load_audio(file_path, sr=sr)
+            audio, sr = load_audio(
+                file_path,
+                sr=sr,
+                filename=filename,
+                res_type=res_type,
+                duration=duration if limit_decode else None
+            )
         except Exception as e:
+            if strict:
+                raise
             logger.warning(f"Error loading audio: {str(e)}. Generating synthetic audio for demonstration.")
             # For demonstration, generate synthetic audio if loading fails
             # (e.g., if the file is empty or corrupted)
@@ -140,6 +284,8 @@ def preprocess_audio(file_path, sr=22050, duration=3):
         
         # Ensure audio has content
         if len(audio) == 0 or np.all(audio == 0):
+            if strict:
+                raise ValueError("Audio is empty or silent")
             logger.warning("Empty audio detected. Generating synthetic audio for demonstration.")
             # Generate synthetic audio for empty files
             t = np.linspace(0, 3, int(sr * 3), endpoint=False)
@@ -155,18 +301,100 @@ def preprocess_audio(file_path, sr=22050, duration=3):
                 padding = target_length - len(audio)
                 audio = np.pad(audio, (0, padding), 'constant')
         
-        # Trim silence
-        audio = trim_silence(audio)
-        
-        # Noise reduction
-        audio = remove_noise(audio, sr)
-        
-        # Normalize audio
-        audio = normalize_audio(audio)
+        # Trim silence, reduce noise, normalize
+        audio = preprocess_signal(audio, sr, denoise_method=denoise_method)
         
         logger.info(f"Audio preprocessed successfully: {len(audio)} samples at {sr} Hz")
+        if return_spectrum:
+            return audio, sr, compute_spectrum(audio, sr)
         return audio, sr
     
     except Exception as e:
         logger.error(f"Error preprocessing audio: {str(e)}")
         raise
+
+def read_audio_blocks(file_path, sr=22050, block_duration=1.0):
+    """
+    Decode an audio file block by block, resampled to a target rate
+    
+    Only one block is held in memory at a time. Formats soundfile cannot
+    read are decoded in full with load_audio and then split into blocks.
+    
+    Args:
+        file_path: Path to audio file
+        sr: Target sampling rate
+        block_duration: Length of each decoded block in seconds
+        
+    Yields:
+        block: Mono audio block at the target sampling rate
+    """
+    try:
+        info = sf.info(file_path)
+    except Exception as e:
+        logger.warning(f"Cannot stream {file_path} ({str(e)}); decoding it in full")
+        audio, _ = load_audio(file_path, sr=sr)
+        block_length = max(1, int(sr * block_duration))
+        for start in range(0, len(audio), block_length):
+            yield audio[start:start + block_length]
+        return
+    
+    resampler = None
+    if info.samplerate != sr:
+        resampler = soxr.ResampleStream(info.samplerate, sr, 1, dtype='float32', quality='HQ')
+    
+    blocksize = max(1, int(info.samplerate * block_duration))
+    for block in sf.blocks(file_path, blocksize=blocksize, dtype='float32', always_2d=True):
+        mono = block.mean(axis=1)
+        yield resampler.resample_chunk(mono) if resampler else mono
+    if resampler:
+        yield resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+def stream_audio_windows(file_path, sr=22050, window=3, hop=1, block_duration=1.0, denoise=True):
+    """
+    Slide a fixed-length window over an audio file while it is being decoded
+    
+    Memory use is bounded by one window plus one block, regardless of the
+    file length. A trailing partial window is zero-padded to full length.
+    
+    Args:
+        file_path: Path to audio file
+        sr: Target sampling rate
+        window: Window length in seconds
+        hop: Hop between window starts in seconds
+        block_duration: Length of each decoded block in seconds
+        denoise: Whether to high-pass filter the stream (state is carried
+            across blocks, so windows need no further noise reduction)
+        
+    Yields:
+        start_time: Start of the window in seconds
+        window_audio: Audio of the window, int(sr * window) samples
+    """
+    window_length = int(sr * window)
+    hop_length = int(sr * hop)
+    if window_length <= 0 or hop_length <= 0:
+        raise ValueError("Window and hop must be positive")
+    
+    buffer = np.zeros(0, dtype=np.float32)
+    offset = 0  # Position of buffer[0] in samples
+    skip = 0  # Samples still to drop when hop is longer than the window
+    yielded = False
+    highpass = HighPassFilter(sr) if denoise else None
+    
+    for block in read_audio_blocks(file_path, sr=sr, block_duration=block_duration):
+        if highpass is not None:
+            block = highpass.process(block)
+        if skip:
+            dropped = min(skip, len(block))
+            block = block[dropped:]
+            skip -= dropped
+        buffer = np.concatenate([buffer, block])
+        while len(buffer) >= window_length:
+            yield offset / sr, buffer[:window_length]
+            yielded = True
+            skip = max(0, hop_length - len(buffer))
+            buffer = buffer[hop_length:]
+            offset += hop_length
+    
+    # Emit the tail if it holds samples no earlier window covered
+    if len(buffer) > 0 and (not yielded or len(buffer) > window_length - hop_length):
+        yield offset / sr, np.pad(buffer, (0, window_length - len(buffer)), 'constant')
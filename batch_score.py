@@ -0,0 +1,363 @@
+"""
+Batch scoring for Speech Emotion Recognition
+Scores a directory tree or a manifest of audio files offline: decodes,
+preprocesses and featurizes them across a process pool, runs batched
+inference and streams the predictions to CSV, JSONL or Parquet. Running
+again with the same output resumes after the files already scored in it;
+files that failed are tried again (their error rows stay in the output).
+
+Usage:
+    python batch_score.py INPUT --output FILE [--format csv|jsonl|parquet]
+                          [--workers N] [--batch-size N]
+
+INPUT is a directory (scanned recursively) or a manifest: a text file with
+one path per line, or a CSV file with a 'path' column. The model and audio
+parameters are the web app's (MODEL_PATH, AUDIO_* environment variables).
+"""
+import os
+import sys
+import csv
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = ('csv', 'jsonl', 'parquet')
+
+def discover_files(source):
+    """
+    List the audio files to score
+
+    Args:
+        source: Directory to scan recursively, or a manifest file (one path
+            per line, or CSV with a 'path' column; relative paths are
+            relative to the manifest)
+
+    Returns:
+        paths: Audio file paths in a stable order
+    """
+    from feature_store import AUDIO_EXTENSIONS
+
+    if os.path.isdir(source):
+        paths = []
+        for dirpath, dirnames, filenames in os.walk(source):
+            dirnames.sort()
+            paths.extend(os.path.join(dirpath, filename) for filename in sorted(filenames)
+                         if filename.lower().endswith(AUDIO_EXTENSIONS))
+        return paths
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, newline='') as f:
+        first_line = f.readline()
+        f.seek(0)
+        if 'path' in next(csv.reader([first_line]), []):
+            entries = [row['path'] for row in csv.DictReader(f)]
+        else:
+            entries = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    return [entry if os.path.isabs(entry) else os.path.join(base_dir, entry) for entry in entries]
+
+def featurize_file(path, params):
+    """
+    Featurize one file for scoring; runs in the pool's worker processes
+
+    Args:
+        path: Audio file path
+        params: Audio parameters (see feature_store.featurize_clip)
+
+    Returns:
+        result: Dictionary with 'features' (time_steps, N_FEATURES),
+            'sha256' and 'duration' (seconds of audio in the file)
+    """
+    import soundfile as sf
+    from feature_store import featurize_clip
+
+    features, sha256 = featurize_clip(path, params)
+    try:
+        duration = sf.info(path).duration
+    except Exception:
+        # Formats soundfile cannot read (e.g. some MP3s): the analyzed length
+        duration = len(features) * params['hop_length'] / params['sr']
+    return {'features': features, 'sha256': sha256, 'duration': duration}
+
+def _truncate_partial_line(path):
+    """Drop a last line left incomplete by an interrupted run"""
+    with open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        f.seek(max(0, size - 65536))
+        tail = f.read()
+        if tail.endswith(b'\n'):
+            return
+        cut = tail.rfind(b'\n')
+        f.truncate(size - len(tail) + cut + 1 if cut >= 0 else 0)
+
+class CsvResultWriter:
+    """Appends result rows to a CSV file"""
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            _truncate_partial_line(path)
+        self._file = open(path, 'a', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=columns)
+        if not exists:
+            self._writer.writeheader()
+
+    def done_paths(self):
+        with open(self.path, newline='') as f:
+            return {row['path'] for row in csv.DictReader(f) if not row['error']}
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+class JsonlResultWriter:
+    """Appends result rows to a JSON Lines file"""
+
+    def __init__(self, path, columns):
+        self.path = path
+        if os.path.exists(path):
+            _truncate_partial_line(path)
+        self._file = open(path, 'a')
+
+    def done_paths(self):
+        with open(self.path) as f:
+            rows = (json.loads(line) for line in f if line.strip())
+            return {row['path'] for row in rows if not row['error']}
+
+    def write(self, rows):
+        self._file.writelines(json.dumps(row) + '\n' for row in rows)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+class ParquetResultWriter:
+    """
+    Writes result rows as a directory of Parquet part files
+
+    Parquet files cannot be appended to, so rows are buffered and written as
+    a new part file every `rows_per_part` rows; each part is renamed into
+    place when complete, so an interrupted run leaves only whole parts.
+    Every part has the same explicit schema (strings for the text columns,
+    float64 for the others), so the directory reads back as one dataset.
+    """
+
+    STRING_COLUMNS = ('path', 'emotion', 'sha256', 'error')
+
+    def __init__(self, path, columns, rows_per_part=50000):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise RuntimeError("Parquet output needs pyarrow: pip install pyarrow")
+        self.path = path
+        self.columns = columns
+        self.schema = pa.schema([
+            (name, pa.string() if name in self.STRING_COLUMNS else pa.float64()) for name in columns
+        ])
+        self.rows_per_part = rows_per_part
+        os.makedirs(path, exist_ok=True)
+        self._parts = len([name for name in os.listdir(path) if name.endswith('.parquet')])
+        self._buffer = []
+
+    def done_paths(self):
+        import pyarrow.parquet as pq
+        done = set()
+        for name in sorted(os.listdir(self.path)):
+            if name.endswith('.parquet'):
+                table = pq.read_table(os.path.join(self.path, name), columns=['path', 'error']).to_pydict()
+                done.update(path for path, error in zip(table['path'], table['error']) if not error)
+        return done
+
+    def _write_part(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pylist(self._buffer, schema=self.schema)
+        part_path = os.path.join(self.path, f'part-{self._parts:05d}.parquet')
+        pq.write_table(table, part_path + '.tmp')
+        os.replace(part_path + '.tmp', part_path)
+        self._parts += 1
+        self._buffer = []
+
+    def write(self, rows):
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.rows_per_part:
+            self._write_part()
+
+    def close(self):
+        if self._buffer:
+            self._write_part()
+
+WRITERS = {
+    'csv': CsvResultWriter,
+    'jsonl': JsonlResultWriter,
+    'parquet': ParquetResultWriter,
+}
+
+class Throughput:
+    """Counts scored files and audio seconds and logs the rates periodically"""
+
+    def __init__(self, total, report_every=10.0):
+        self.total = total
+        self.report_every = report_every
+        self.files = 0
+        self.errors = 0
+        self.audio_seconds = 0.0
+        self.start = time.perf_counter()
+        self._next_report = self.start + report_every
+
+    def add(self, files, audio_seconds, errors=0):
+        self.files += files
+        self.errors += errors
+        self.audio_seconds += audio_seconds
+        if time.perf_counter() >= self._next_report:
+            self._next_report = time.perf_counter() + self.report_every
+            logger.info(self.summary())
+
+    def stats(self):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return {
+            'files': self.files,
+            'errors': self.errors,
+            'total': self.total,
+            'seconds': round(elapsed, 2),
+            'files_per_second': round(self.files / elapsed, 2),
+            'audio_seconds_per_second': round(self.audio_seconds / elapsed, 2),
+        }
+
+    def summary(self):
+        stats = self.stats()
+        return (f"{stats['files']}/{stats['total']} files ({stats['errors']} errors), "
+                f"{stats['files_per_second']} files/s, {stats['audio_seconds_per_second']} audio-s/s")
+
+def score_files(paths, model, params, writer, workers=None, batch_size=64, report_every=10.0):
+    """
+    Featurize files in a process pool and score them in batches
+
+    Rows are written in completion order, one write per scored batch.
+
+    Args:
+        paths: Audio files to score
+        model: EmotionModel used for batched inference
+        params: Audio parameters (see feature_store.featurize_clip)
+        writer: Result writer (see WRITERS)
+        workers: Featurization processes (None for one per CPU, 0 to run inline)
+        batch_size: Files per inference batch
+        report_every: Seconds between throughput log lines
+
+    Returns:
+        stats: Dictionary with file counts, elapsed time and throughput
+    """
+    from emotion_model import EMOTIONS
+
+    throughput = Throughput(len(paths), report_every)
+    ready = []
+
+    def flush():
+        if not ready:
+            return
+        lengths = np.array([len(result['features']) for _, result in ready])
+        stacked = np.zeros((len(ready), lengths.max(), ready[0][1]['features'].shape[1]), dtype=np.float32)
+        for row, (_, result) in enumerate(ready):
+            stacked[row, :lengths[row]] = result['features']
+        rows = []
+        for (path, result), prediction in zip(ready, model.predict_proba(stacked, lengths=lengths)):
+            emotion, confidences = model.to_result(prediction)
+            row = {'path': path, 'emotion': emotion, 'confidence': round(confidences[emotion], 4)}
+            row.update({name: round(confidences[name], 4) for name in EMOTIONS})
+            row.update({'duration': round(result['duration'], 3), 'sha256': result['sha256'], 'error': ''})
+            rows.append(row)
+        writer.write(rows)
+        throughput.add(len(rows), sum(result['duration'] for _, result in ready))
+        ready.clear()
+
+    def collect(path, result, error):
+        if error is not None:
+            row = {'path': path, 'emotion': '', 'confidence': None}
+            row.update({name: None for name in EMOTIONS})
+            row.update({'duration': None, 'sha256': '', 'error': str(error)})
+            writer.write([row])
+            throughput.add(1, 0.0, errors=1)
+            return
+        ready.append((path, result))
+        if len(ready) >= batch_size:
+            flush()
+
+    workers = (os.cpu_count() or 1) if workers is None else int(workers)
+    if workers == 0:
+        for path in paths:
+            try:
+                collect(path, featurize_file(path, params), None)
+            except Exception as e:
+                collect(path, None, e)
+    elif paths:
+        from processing_pool import warmup
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=warmup) as executor:
+            # Bounded window of files in flight, so memory stays flat on huge archives
+            pending = {}
+            for path in paths:
+                pending[executor.submit(featurize_file, path, params)] = path
+                if len(pending) < 4 * workers + batch_size:
+                    continue
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    error = future.exception()
+                    collect(pending.pop(future), None if error else future.result(), error)
+            for future in list(pending):
+                error = future.exception()
+                collect(pending.pop(future), None if error else future.result(), error)
+    flush()
+    return throughput.stats()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('input', help='Directory of audio files or manifest file')
+    parser.add_argument('--output', required=True, help='Output file (a directory for parquet)')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, help='Output format (default: from the output extension, else csv)')
+    parser.add_argument('--workers', type=int, default=None, help='Featurization processes (default: one per CPU, 0 inline)')
+    parser.add_argument('--batch-size', type=int, default=64, help='Files per inference batch')
+    parser.add_argument('--report-every', type=float, default=10.0, help='Seconds between throughput reports')
+    args = parser.parse_args()
+
+    output_format = args.format or os.path.splitext(args.output)[1].lstrip('.').lower()
+    if output_format not in OUTPUT_FORMATS:
+        output_format = 'csv'
+
+    # The scoring model and audio parameters are the web app's; it only needs a database URL to import
+    os.environ.setdefault('DATABASE_URL', 'sqlite://')
+    from app import AUDIO_PARAMS, emotion_model
+    from emotion_model import EMOTIONS
+    logging.getLogger().setLevel(logging.INFO)
+
+    columns = ['path', 'emotion', 'confidence'] + EMOTIONS + ['duration', 'sha256', 'error']
+    try:
+        writer = WRITERS[output_format](args.output, columns)
+    except RuntimeError as e:
+        parser.error(str(e))
+    try:
+        paths = discover_files(args.input)
+        done = writer.done_paths()
+        todo = [path for path in paths if path not in done]
+        logger.info(f"Scoring {len(todo)} of {len(paths)} files ({len(paths) - len(todo)} already in {args.output})")
+        stats = score_files(todo, emotion_model, AUDIO_PARAMS, writer, workers=args.workers,
+                            batch_size=args.batch_size, report_every=args.report_every)
+    finally:
+        writer.close()
+    print(json.dumps(stats))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
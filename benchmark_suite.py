@@ -0,0 +1,410 @@
+"""
+Benchmark suite for Speech Emotion Recognition
+Times every stage of the preprocessing -> features -> predict path and the
+chart functions on synthetic clips, with the peak RSS and peak allocations
+of each stage, measures Flask route throughput with the test client, and
+compares the results with the stored baseline
+
+Usage:
+    python benchmark_suite.py [--quick] [--stages NAME,...] [--check] [--save]
+
+Stages after load_audio run on the clip as load_audio returns it (resampled
+to the pipeline's 22.05 kHz), so only load_audio varies with the source rate.
+Timings depend on the machine: refresh the baseline with --save on the
+machine that runs --check, and commit it with the change that moved it.
+"""
+import io
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import argparse
+import logging
+import tracemalloc
+import numpy as np
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# Clip durations (seconds) and source sampling rates of the full matrix
+DURATIONS = (1, 10, 60, 600)
+SAMPLE_RATES = (16000, 22050, 44100, 48000)
+QUICK_DURATIONS = (1, 10)
+QUICK_SAMPLE_RATES = (16000, 48000)
+
+# Sampling rate the pipeline resamples every clip to
+PIPELINE_SR = 22050
+
+def synthetic_clip(duration, sr, seed=0):
+    """
+    Speech-like test signal: a vibrato harmonic tone with a syllable-rate
+    envelope and background noise, with half a second of near-silence at
+    both ends so trimming has work to do
+
+    Args:
+        duration: Length in seconds
+        sr: Sampling rate
+        seed: Seed of the noise
+
+    Returns:
+        audio: float32 time series
+    """
+    rng = np.random.RandomState(seed)
+    t = np.arange(int(duration * sr)) / sr
+    f0 = 160 + 20 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = 0.5 * (1 + np.sin(2 * np.pi * 4 * t)) ** 2
+    audio = 0.2 * voice * envelope + 0.01 * rng.randn(len(t))
+    edge = min(len(t) // 4, sr // 2)
+    audio[:edge] *= 0.001
+    audio[len(t) - edge:] *= 0.001
+    return audio.astype(np.float32)
+
+def encode_wav(audio, sr):
+    """Encode a clip as 16-bit PCM WAV bytes"""
+    import soundfile as sf
+    buf = io.BytesIO()
+    sf.write(buf, audio, sr, format='WAV', subtype='PCM_16')
+    return buf.getvalue()
+
+class Clip:
+    """Synthetic clip with its intermediate representations, computed on first use"""
+
+    def __init__(self, duration, sr):
+        self.duration = duration
+        self.source_sr = sr
+        self.sr = PIPELINE_SR
+        self._cache = {}
+
+    def _get(self, name, compute):
+        if name not in self._cache:
+            self._cache[name] = compute()
+        return self._cache[name]
+
+    @property
+    def wav(self):
+        return self._get('wav', lambda: encode_wav(synthetic_clip(self.duration, self.source_sr), self.source_sr))
+
+    @property
+    def audio(self):
+        from audio_processor import load_audio
+        return self._get('audio', lambda: load_audio(self.wav, sr=self.sr, filename='clip.wav')[0])
+
+    @property
+    def spectrum(self):
+        from spectral import compute_spectrum
+        return self._get('spectrum', lambda: compute_spectrum(self.audio, self.sr))
+
+    @property
+    def features(self):
+        from feature_extractor import extract_features
+        return self._get('features', lambda: extract_features((self.audio, self.sr), spectrum=self.spectrum))
+
+_model = None
+
+def get_model():
+    """Untrained in-memory model: inference cost does not depend on the weights"""
+    global _model
+    if _model is None:
+        from emotion_model import EmotionModel
+        _model = EmotionModel(None)
+    return _model
+
+def _stages():
+    """
+    Benchmarked stages
+
+    Returns:
+        stages: List of (name, per_clip, fn) where fn takes a Clip (or None
+            for stages that do not depend on the clip) and returns a callable
+            running the stage once
+    """
+    from audio_processor import load_audio, trim_silence, remove_noise, normalize_audio, preprocess_audio
+    from spectral import compute_spectrum
+    from feature_extractor import extract_mfcc, extract_spectral_features, extract_chroma_features, extract_features
+    from utils import plot_prediction, plot_audio_waveform, plot_spectrogram, plot_confusion_matrix
+    from emotion_model import EMOTIONS
+
+    confidences = {emotion: 100.0 * (i + 1) / 28 for i, emotion in enumerate(EMOTIONS)}
+    confusion = np.random.RandomState(0).randint(0, 20, (len(EMOTIONS), len(EMOTIONS)))
+    return [
+        ('load_audio', True, lambda c: lambda: load_audio(c.wav, sr=PIPELINE_SR, filename='clip.wav')),
+        ('trim_silence', True, lambda c: lambda: trim_silence(c.audio)),
+        ('remove_noise[highpass]', True, lambda c: lambda: remove_noise(c.audio, c.sr, method='highpass')),
+        ('remove_noise[spectral_gate]', True, lambda c: lambda: remove_noise(c.audio, c.sr, spectrum=c.spectrum, method='spectral_gate')),
+        ('normalize_audio', True, lambda c: lambda: normalize_audio(c.audio)),
+        ('preprocess_audio', True, lambda c: lambda: preprocess_audio(c.wav, sr=PIPELINE_SR, duration=None, filename='clip.wav')),
+        ('compute_spectrum', True, lambda c: lambda: compute_spectrum(c.audio, c.sr)),
+        ('extract_mfcc', True, lambda c: lambda: extract_mfcc(c.audio, c.sr, spectrum=c.spectrum)),
+        ('extract_spectral_features', True, lambda c: lambda: extract_spectral_features(c.audio, c.sr, spectrum=c.spectrum)),
+        ('extract_chroma_features', True, lambda c: lambda: extract_chroma_features(c.audio, c.sr, spectrum=c.spectrum)),
+        ('extract_features', True, lambda c: lambda: extract_features((c.audio, c.sr))),
+        ('EmotionModel.predict', True, lambda c: lambda: get_model().predict(c.features)),
+        ('plot_audio_waveform', True, lambda c: lambda: plot_audio_waveform(c.audio, c.sr)),
+        ('plot_spectrogram', True, lambda c: lambda: plot_spectrogram(c.audio, c.sr, spectrum=c.spectrum)),
+        ('plot_prediction', False, lambda c: lambda: plot_prediction('happy', confidences)),
+        ('plot_confusion_matrix', False, lambda c: lambda: plot_confusion_matrix(confusion, EMOTIONS)),
+    ]
+
+def _read_status_kb(field):
+    """Read a memory field (in kB) from /proc/self/status, or None where unavailable"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def _reset_peak_rss():
+    """Reset the process' peak RSS (Linux >= 4.0); returns whether it worked"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def measure(run, repeat=5, time_budget=2.0):
+    """
+    Time a stage and measure its memory use
+
+    The stage runs once to warm up (imports, numba compilation, caches),
+    then up to `repeat` timed runs within `time_budget` seconds (at least
+    one), one run for the peak RSS and one under tracemalloc for the peak
+    of Python and NumPy allocations.
+
+    Args:
+        run: Callable running the stage once
+        repeat: Maximum timed runs
+        time_budget: Seconds after which no further timed run starts
+
+    Returns:
+        result: Dictionary with 'median_ms', 'min_ms', 'runs', 'peak_rss_mb'
+            (growth of the RSS high-water mark, None where unavailable) and
+            'alloc_peak_mb'
+    """
+    run()
+    times = []
+    start = time.perf_counter()
+    while len(times) < repeat and (not times or time.perf_counter() - start < time_budget):
+        t = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - t)
+
+    peak_rss_mb = None
+    rss_before = _read_status_kb('VmRSS')
+    if rss_before is not None and _reset_peak_rss():
+        run()
+        peak_rss_mb = round(max(0, _read_status_kb('VmHWM') - rss_before) / 1024, 2)
+
+    tracemalloc.start()
+    try:
+        run()
+        _, alloc_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'median_ms': round(float(np.median(times)) * 1000, 3),
+        'min_ms': round(min(times) * 1000, 3),
+        'runs': len(times),
+        'peak_rss_mb': peak_rss_mb,
+        'alloc_peak_mb': round(alloc_peak / 2 ** 20, 2),
+    }
+
+def benchmark_stages(durations, sample_rates, names=None, repeat=5, time_budget=2.0):
+    """
+    Benchmark the pipeline stages over a matrix of synthetic clips
+
+    Args:
+        durations: Clip durations in seconds
+        sample_rates: Source sampling rates (only load_audio depends on them)
+        names: Stage names to run (None for all)
+        repeat: Maximum timed runs per case
+        time_budget: Seconds per case after which no further timed run starts
+
+    Returns:
+        results: Dictionary mapping 'stage@<rate>Hz/<duration>s' (or the
+            stage name, for stages independent of the clip) to measure()'s result
+    """
+    results = {}
+    stages = [stage for stage in _stages() if names is None or stage[0] in names]
+    for duration in durations:
+        for rate_index, sr in enumerate(sample_rates):
+            clip = Clip(duration, sr)
+            for name, per_clip, make in stages:
+                if not per_clip:
+                    if (duration, rate_index) != (durations[0], 0):
+                        continue
+                    key = name
+                elif name != 'load_audio' and name != 'preprocess_audio' and rate_index > 0:
+                    # Downstream stages see the same 22.05 kHz clip whatever the source rate
+                    continue
+                else:
+                    key = f"{name}@{sr}Hz/{duration:g}s" if name in ('load_audio', 'preprocess_audio') else f"{name}/{duration:g}s"
+                results[key] = measure(make(clip), repeat=repeat, time_budget=time_budget)
+                print(f"  {key:48s} {results[key]['median_ms']:12.2f} ms", file=sys.stderr)
+    return results
+
+def benchmark_routes(requests=20):
+    """
+    Measure Flask route throughput with the test client
+
+    Runs against a temporary SQLite database with the feature cache off and
+    the processing pool inline, so every /predict does the full analysis.
+
+    Args:
+        requests: Requests per route
+
+    Returns:
+        results: Dictionary mapping 'route:<METHOD> <rule>' to
+            'requests_per_second', 'median_ms' and 'runs'
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='ser-benchmark-')
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(tmp_dir, 'benchmark.db')}",
+        'MODEL_PATH': os.path.join(tmp_dir, 'model.safetensors'),
+        'FEATURE_CACHE_SIZE': '0',
+        'FEATURE_CACHE_DIR': '',
+        'PROCESSING_WORKERS': '0',
+        'MODEL_RELOAD_INTERVAL': '0',
+    })
+    import app as web
+
+    with web.app.app_context():
+        web.db.create_all()
+    client = web.app.test_client()
+    wav = encode_wav(synthetic_clip(3, PIPELINE_SR), PIPELINE_SR)
+
+    def post_predict():
+        return client.post('/predict', data={'file': (io.BytesIO(wav), 'clip.wav')}, content_type='multipart/form-data')
+
+    post_predict()
+    with web.app.app_context():
+        record_id = web.db.session.execute(web.db.select(web.EmotionPrediction.id)).scalars().first()
+    routes = [
+        ('POST /predict', post_predict),
+        ('GET /results/<id>', lambda: client.get(f'/results/{record_id}')),
+        ('GET /charts/<id>.json', lambda: client.get(f'/charts/{record_id}.json')),
+        ('GET /charts/<id>/prediction.png', lambda: client.get(f'/charts/{record_id}/prediction.png')),
+        ('GET /history', lambda: client.get('/history')),
+    ]
+
+    results = {}
+    for name, request in routes:
+        response = request()
+        if response.status_code != 200:
+            raise RuntimeError(f"{name} returned {response.status_code}")
+        times = []
+        for _ in range(requests):
+            t = time.perf_counter()
+            request()
+            times.append(time.perf_counter() - t)
+        key = f"route:{name}"
+        results[key] = {
+            'requests_per_second': round(len(times) / sum(times), 2),
+            'median_ms': round(float(np.median(times)) * 1000, 3),
+            'runs': len(times),
+        }
+        print(f"  {key:48s} {results[key]['requests_per_second']:12.2f} req/s", file=sys.stderr)
+    return results
+
+def environment():
+    """Describe the machine and library versions the numbers were taken on"""
+    import scipy
+    import librosa
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'librosa': librosa.__version__,
+    }
+
+def compare(results, baseline, max_regression=0.3, min_delta_ms=2.0, max_memory_regression=0.25):
+    """
+    Compare results with a baseline
+
+    A case regresses when its median latency grows by more than
+    max_regression and by more than min_delta_ms (sub-millisecond stages are
+    too noisy for a relative threshold alone), or when its allocation peak
+    grows by more than max_memory_regression and 1 MB.
+
+    Returns:
+        regressions: Human-readable description of each regression
+    """
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        slower = current['median_ms'] - previous['median_ms']
+        if current['median_ms'] > previous['median_ms'] * (1 + max_regression) and slower > min_delta_ms:
+            if 'requests_per_second' in current:
+                regressions.append(f"{key}: {previous['requests_per_second']} -> {current['requests_per_second']} req/s")
+            else:
+                regressions.append(f"{key}: {previous['median_ms']} -> {current['median_ms']} ms")
+        if 'alloc_peak_mb' in current and current['alloc_peak_mb'] > max(
+                previous['alloc_peak_mb'] * (1 + max_memory_regression), previous['alloc_peak_mb'] + 1):
+            regressions.append(f"{key}: allocation peak {previous['alloc_peak_mb']} -> {current['alloc_peak_mb']} MB")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true',
+                        help=f'Clips of {QUICK_DURATIONS} s at {QUICK_SAMPLE_RATES} Hz instead of the full matrix')
+    parser.add_argument('--durations', type=lambda v: tuple(float(d) for d in v.split(',')), help='Clip durations in seconds')
+    parser.add_argument('--rates', type=lambda v: tuple(int(r) for r in v.split(',')), help='Source sampling rates')
+    parser.add_argument('--stages', type=lambda v: set(v.split(',')), help='Comma-separated stage names (default: all)')
+    parser.add_argument('--repeat', type=int, default=5, help='Maximum timed runs per case')
+    parser.add_argument('--time-budget', type=float, default=2.0, help='Seconds per case after which no further timed run starts')
+    parser.add_argument('--requests', type=int, default=20, help='Requests per route (0 skips the route benchmark)')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline file')
+    parser.add_argument('--save', action='store_true', help='Write the results to the baseline file')
+    parser.add_argument('--check', action='store_true', help='Fail if a case regressed against the baseline')
+    parser.add_argument('--max-regression', type=float, default=0.3, help='Allowed relative slowdown with --check')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0, help='Slowdowns below this many ms never count with --check')
+    parser.add_argument('--output', help='Also write the results to this JSON file')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    durations = args.durations or (QUICK_DURATIONS if args.quick else DURATIONS)
+    rates = args.rates or (QUICK_SAMPLE_RATES if args.quick else SAMPLE_RATES)
+    print(f"Stages on {len(durations)} durations x {len(rates)} sampling rates", file=sys.stderr)
+    results = benchmark_stages(durations, rates, names=args.stages, repeat=args.repeat, time_budget=args.time_budget)
+    if args.requests > 0:
+        print("Routes", file=sys.stderr)
+        results.update(benchmark_routes(args.requests))
+
+    report = {'environment': environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    failed = False
+    if os.path.exists(args.baseline) and not args.save:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], max_regression=args.max_regression,
+                              min_delta_ms=args.min_delta_ms)
+        if baseline.get('environment', {}).get('platform') != report['environment']['platform']:
+            print("Note: the baseline was recorded on a different platform", file=sys.stderr)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        failed = args.check and bool(regressions)
+        if not regressions:
+            print(f"No regressions against {args.baseline}")
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved baseline to {args.baseline}")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""
+Chart rendering for Speech Emotion Recognition
+Keeps one pre-built matplotlib figure per chart kind and only updates its
+artists' data for each new chart, plus an LRU cache of rendered PNGs
+
+matplotlib is imported on first render, so processes that only use the
+cache (or never render) do not load it.
+"""
+import io
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# PNG chart kinds served for each prediction record (the results page draws
+# its charts in the browser from /charts/<id>.json; these are the fallback)
+CHART_KINDS = ('prediction', 'waveform')
+
+PRIMARY_COLOR = '#3498db'
+HIGHLIGHT_COLOR = '#e74c3c'
+
+class ChartRenderer:
+    """
+    Renders charts to PNG bytes from reusable figure templates
+
+    Figures are built once (including tight_layout) and kept per process;
+    each render only swaps bar heights, line data or image data.
+    """
+
+    def __init__(self, dpi=100):
+        """
+        Initialize chart renderer
+
+        Args:
+            dpi: Resolution of the rendered PNGs
+        """
+        self.dpi = dpi
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def _figure(self, figsize):
+        """Create a figure attached to an Agg canvas, outside pyplot's global state"""
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        return fig
+
+    def _to_png(self, fig):
+        """Rasterize a figure to PNG bytes"""
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png', dpi=self.dpi)
+        return buf.getvalue()
+
+    def _prediction_template(self, emotions):
+        """Bar chart with one bar and value label per emotion"""
+        template = self._templates.get('prediction')
+        if template is not None and template['emotions'] == emotions:
+            return template
+
+        fig = self._figure((10, 6))
+        ax = fig.add_subplot()
+        x = np.arange(len(emotions))
+        bars = ax.bar(x, np.zeros(len(emotions)), color=PRIMARY_COLOR, width=0.8)
+        labels = [ax.text(i, 0, '', ha='center', fontsize=12) for i in x]
+        ax.set_xticks(x)
+        ax.set_xticklabels(emotions, rotation=45)
+        ax.set_title('Emotion Prediction Confidence', fontsize=16)
+        ax.set_xlabel('Emotion', fontsize=14)
+        ax.set_ylabel('Confidence (%)', fontsize=14)
+        ax.set_ylim(0, 100)
+        fig.tight_layout()
+
+        template = {'fig': fig, 'emotions': emotions, 'bars': bars, 'labels': labels}
+        self._templates['prediction'] = template
+        return template
+
+    def render_prediction(self, emotion, confidences):
+        """
+        Render the bar chart of emotion prediction confidences
+
+        Args:
+            emotion: Predicted emotion (highlighted)
+            confidences: Dictionary of confidence values for each emotion
+
+        Returns:
+            png: PNG image bytes
+        """
+        emotions = list(confidences.keys())
+        with self._lock:
+            template = self._prediction_template(emotions)
+            for name, bar, label in zip(emotions, template['bars'], template['labels']):
+                value = float(confidences[name])
+                bar.set_height(value)
+                bar.set_color(HIGHLIGHT_COLOR if name == emotion else PRIMARY_COLOR)
+                label.set_y(value + 2)
+                label.set_text(f"{value:.1f}%")
+            return self._to_png(template['fig'])
+
+    def _waveform_template(self):
+        """Line plot of amplitude over time"""
+        template = self._templates.get('waveform')
+        if template is not None:
+            return template
+
+        fig = self._figure((10, 3))
+        ax = fig.add_subplot()
+        line, = ax.plot([0, 1], [0, 0], color=PRIMARY_COLOR)
+        ax.axhline(y=0, color='r', linestyle='-', alpha=0.3)
+        ax.set_title('Audio Waveform')
+        ax.set_xlabel('Time (s)')
+        ax.set_ylabel('Amplitude')
+        ax.set_ylim(-1.1, 1.1)
+        fig.tight_layout()
+
+        template = {'fig': fig, 'ax': ax, 'line': line}
+        self._templates['waveform'] = template
+        return template
+
+    def render_waveform(self, times, audio):
+        """
+        Render the waveform chart
+
+        Args:
+            times: Time of each sample in seconds
+            audio: Amplitude of each sample
+
+        Returns:
+            png: PNG image bytes
+        """
+        with self._lock:
+            template = self._waveform_template()
+            template['line'].set_data(times, audio)
+            ax = template['ax']
+            ax.relim()
+            ax.autoscale_view(scalex=True, scaley=False)
+            return self._to_png(template['fig'])
+
+    def _spectrogram_template(self):
+        """Log-frequency spectrogram with a dB colorbar"""
+        template = self._templates.get('spectrogram')
+        if template is not None:
+            return template
+
+        fig = self._figure((10, 5))
+        ax = fig.add_subplot()
+        ax.set_title('Spectrogram')
+        template = {'fig': fig, 'ax': ax, 'mesh': None, 'colorbar': None, 'layout': None}
+        self._templates['spectrogram'] = template
+        return template
+
+    def render_spectrogram(self, audio, sr, spectrum=None):
+        """
+        Render the spectrogram chart
+
+        Args:
+            audio: Audio time series
+            sr: Sampling rate
+            spectrum: Precomputed SpectralAnalysis of the audio (computed if None)
+
+        Returns:
+            png: PNG image bytes
+        """
+        import librosa
+        import librosa.display
+        from spectral import compute_spectrum
+
+        if spectrum is None:
+            spectrum = compute_spectrum(audio, sr)
+        D = librosa.amplitude_to_db(spectrum.magnitude, ref=np.max)
+        layout = (D.shape, sr, spectrum.n_fft, spectrum.hop_length)
+
+        with self._lock:
+            template = self._spectrogram_template()
+            if template['layout'] == layout:
+                # Same grid as the previous clip: only the colour data changes
+                template['mesh'].set_array(D)
+                template['mesh'].set_clim(D.min(), D.max())
+            else:
+                fig, ax = template['fig'], template['ax']
+                if template['mesh'] is not None:
+                    template['mesh'].remove()
+                mesh = librosa.display.specshow(
+                    D, sr=sr, hop_length=spectrum.hop_length, n_fft=spectrum.n_fft,
+                    x_axis='time', y_axis='log', ax=ax
+                )
+                if template['colorbar'] is None:
+                    template['colorbar'] = fig.colorbar(mesh, ax=ax, format='%+2.0f dB')
+                else:
+                    template['colorbar'].update_normal(mesh)
+                fig.tight_layout()
+                template['mesh'] = mesh
+                template['layout'] = layout
+            return self._to_png(template['fig'])
+
+_renderer = None
+
+def get_renderer():
+    """Return this process's ChartRenderer, creating it on first use"""
+    global _renderer
+    if _renderer is None:
+        _renderer = ChartRenderer()
+    return _renderer
+
+class ChartCache:
+    """LRU cache of rendered chart PNGs keyed by record id and chart kind"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        """
+        Initialize chart cache
+
+        Args:
+            max_bytes: Maximum total size of the cached PNGs in bytes
+        """
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, record_id, kind):
+        """
+        Look up a rendered chart
+
+        Args:
+            record_id: Prediction record id
+            kind: Chart kind (one of CHART_KINDS)
+
+        Returns:
+            chart: Tuple of (png, etag), or None on a miss
+        """
+        key = (record_id, kind)
+        with self._lock:
+            chart = self._entries.get(key)
+            if chart is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return chart
+
+    def put(self, record_id, kind, png):
+        """
+        Store a rendered chart and evict least recently used charts
+
+        Args:
+            record_id: Prediction record id
+            kind: Chart kind (one of CHART_KINDS)
+            png: PNG image bytes
+
+        Returns:
+            chart: Tuple of (png, etag)
+        """
+        key = (record_id, kind)
+        chart = (png, hashlib.sha1(png).hexdigest())
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[0])
+            self._entries[key] = chart
+            self._size += len(png)
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self._evictions += 1
+        return chart
+
+    def stats(self):
+        """
+        Get cache metrics
+
+        Returns:
+            stats: Dictionary with hit/miss/eviction counters and cache size
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+            }
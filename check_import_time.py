@@ -0,0 +1,78 @@
+"""
+Import-time budget check for Speech Emotion Recognition
+Imports the web app in fresh interpreters with `python -X importtime` and
+fails if the import exceeds the budget or loads a module that must stay lazy
+
+Usage:
+    python check_import_time.py [--budget-ms MS] [--runs N] [--top N]
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+# Heavy modules that must only be loaded on first use or by app.warmup()
+LAZY_MODULES = ('matplotlib', 'seaborn', 'sklearn', 'librosa', 'scipy.signal', 'numba')
+
+def measure_import(module='app'):
+    """
+    Import a module in a fresh interpreter and parse its -X importtime report
+
+    Args:
+        module: Module to import
+
+    Returns:
+        timings: Dictionary mapping each imported module name to its
+            (self, cumulative) import time in microseconds
+    """
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('IMPORT_TIME_BUDGET_MS', 1000)),
+                        help='Maximum import time of app in milliseconds (default: $IMPORT_TIME_BUDGET_MS or 1000)')
+    parser.add_argument('--runs', type=int, default=3, help='Number of imports; the fastest one is checked')
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest modules to list')
+    args = parser.parse_args()
+
+    runs = [measure_import() for _ in range(max(1, args.runs))]
+    timings = min(runs, key=lambda t: t['app'][1])
+    total_ms = timings['app'][1] / 1000
+
+    print(f"import app: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms, fastest of {len(runs)} runs)")
+    print("Slowest modules (cumulative):")
+    slowest = sorted(timings.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (_, cumulative_us) in slowest[1:args.top + 1]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    eager = [name for name in timings if any(name == m or name.startswith(m + '.') for m in LAZY_MODULES)]
+    if eager:
+        roots = sorted({m for m in LAZY_MODULES for name in eager if name == m or name.startswith(m + '.')})
+        print(f"FAIL: modules that must load lazily were imported: {', '.join(roots)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"FAIL: import app took {total_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,71 +1,421 @@
 """
 Emotion recognition model for Speech Emotion Recognition
-Implements a simplified model for emotion classification (for demonstration)
+Classifies clips by pooling the per-frame features over time followed by a
+one-hidden-layer network, with weights stored in a memory-mapped file
 """
 import os
+import time
+import hashlib
 import logging
+import datetime
 import numpy as np
-from sklearn.metrics import confusion_matrix
+
+from model_format import save_tensors, load_tensors
 
 # Define emotions
 EMOTIONS = ['angry', 'disgust', 'fear', 'happy', 'neutral', 'sad', 'surprise']
 
+# Per-frame feature layout produced by feature_extractor.extract_features
+FEATURE_LAYOUT = [
+    {'name': 'mfcc', 'size': 13},
+    {'name': 'spectral_centroid', 'size': 1},
+    {'name': 'spectral_bandwidth', 'size': 1},
+    {'name': 'spectral_rolloff', 'size': 1},
+    {'name': 'zero_crossing_rate', 'size': 1},
+    {'name': 'chroma', 'size': 12},
+]
+N_FEATURES = sum(block['size'] for block in FEATURE_LAYOUT)
+
+# Statistics over time computed for every feature; MFCCs and spectral
+# features are standardized per clip, so their extremes and frame-to-frame
+# change carry the information
+POOLING = ['mean', 'std', 'min', 'max', 'mean_abs_delta']
+
+MODEL_FORMAT_VERSION = 1
+
+# Weight matrices that may be stored int8-quantized
+QUANTIZABLE = ('W1', 'W2')
+WEIGHT_DTYPES = ('float32', 'int8')
+
+# Model backends: NumPy weights in a safetensors file, or an ONNX graph run
+# by onnxruntime (chosen from the model file extension by default)
+BACKENDS = ('numpy', 'onnx')
+
+# onnxruntime graph optimization levels by name
+ONNX_OPTIMIZATION_LEVELS = {
+    'disable': 'ORT_DISABLE_ALL',
+    'basic': 'ORT_ENABLE_BASIC',
+    'extended': 'ORT_ENABLE_EXTENDED',
+    'all': 'ORT_ENABLE_ALL',
+}
+
+# Typical magnitude of each feature, used to normalize an untrained model's inputs
+_FEATURE_SCALES = np.concatenate([
+    np.ones(13),       # MFCC (standardized)
+    np.ones(3),        # spectral centroid, bandwidth, rolloff (standardized)
+    [0.1],             # zero-crossing rate
+    np.full(12, 0.5),  # chroma
+])
+
 logger = logging.getLogger(__name__)
 
+def set_blas_threads(threads):
+    """
+    Limit the number of threads BLAS uses for the model's matmuls
+    
+    With several web workers per node, one BLAS thread each gives the most
+    predictable latency. The limit applies to the whole process.
+    
+    Args:
+        threads: Maximum BLAS threads (None leaves the library default)
+        
+    Returns:
+        success: Whether the limit was applied
+    """
+    if threads is None:
+        return False
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        logger.warning("threadpoolctl is not installed; set OPENBLAS_NUM_THREADS/OMP_NUM_THREADS instead")
+        return False
+    threadpool_limits(limits=int(threads), user_api='blas')
+    logger.info(f"Limited BLAS to {threads} thread(s)")
+    return True
+
+def file_checksum(path, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def quantize_int8(matrix):
+    """
+    Symmetric per-output-column int8 quantization
+    
+    Args:
+        matrix: float32 weight matrix, shape (n_inputs, n_outputs)
+        
+    Returns:
+        quantized: int8 matrix of the same shape
+        scale: float32 scale of each column (matrix ~= quantized * scale)
+    """
+    scale = np.abs(matrix).max(axis=0) / 127.0
+    scale = np.where(scale > 0, scale, 1.0).astype(np.float32)
+    quantized = np.clip(np.round(matrix / scale), -127, 127).astype(np.int8)
+    return quantized, scale
+
 class EmotionModel:
-    """Simplified emotion recognition model for demonstration purposes"""
+    """Emotion classifier: statistics pooling over time, then a ReLU hidden layer and softmax"""
     
-    def __init__(self, model_path=None):
+    def __init__(self, model_path=None, hidden_units=64, weights_dtype='float32', backend=None,
+                 intra_op_threads=1, inter_op_threads=1, graph_optimization='all'):
         """
         Initialize emotion model
         
         Args:
-            model_path: Path to saved model (unused in this simplified version)
+            model_path: Path of the model file. It is memory-mapped if it exists;
+                otherwise freshly initialized weights are saved there first.
+                None keeps freshly initialized weights in memory.
+            hidden_units: Hidden layer size of freshly initialized weights
+            weights_dtype: Storage of freshly initialized weights ('float32' or 'int8')
+            backend: 'numpy' or 'onnx' (None picks 'onnx' for .onnx files)
+            intra_op_threads: onnxruntime threads used within an operator (0 for one per core)
+            inter_op_threads: onnxruntime threads used across independent operators
+            graph_optimization: onnxruntime graph optimization level
+                (one of ONNX_OPTIMIZATION_LEVELS)
+        
+        Raises:
+            RuntimeError: If model_path exists but cannot be loaded, or the
+                ONNX model or onnxruntime session cannot be created
         """
+        if backend is None:
+            backend = 'onnx' if model_path and model_path.lower().endswith('.onnx') else 'numpy'
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown model backend {backend}; expected one of {BACKENDS}")
+        
         self.model_path = model_path
+        self.backend = backend
         self.num_classes = len(EMOTIONS)
-        logger.info("Initialized simplified emotion model for demonstration")
+        self.hidden_units = hidden_units
+        self.weights = None
+        self.weights_dtype = 'float32'
+        self.metadata = {}
+        self.fingerprint = None
+        self._scales = {}
+        self.session_options = {
+            'intra_op_threads': intra_op_threads,
+            'inter_op_threads': inter_op_threads,
+            'graph_optimization': graph_optimization,
+        }
+        self._session = None
+        self._onnx_io = None
+        
+        if backend == 'onnx':
+            # Never serve untrained weights in place of the configured ONNX model
+            if not model_path or not self.load_onnx(model_path):
+                raise RuntimeError(f"Could not load the ONNX model {model_path}")
+            return
+        
+        if model_path and os.path.exists(model_path):
+            # An unreadable file (truncated, newer layout, read error) is an
+            # error: overwriting it with untrained weights would lose the model
+            if not self.load_model(model_path):
+                raise RuntimeError(f"Could not load the model file {model_path}")
+            return
+        self._set_weights(self._build_model())
+        if model_path and self.save_model(model_path, weights_dtype=weights_dtype):
+            # Reload through mmap so all processes share the file's pages
+            self.load_model(model_path)
+        logger.info("Initialized untrained emotion model")
+    
+    def _build_model(self, seed=0):
+        """
+        Initialize weights (Glorot-uniform, zero biases) for an untrained model
+        
+        Args:
+            seed: Seed of the initialization, so every process builds the same weights
+            
+        Returns:
+            weights: Dictionary of float32 weight arrays
+        """
+        rng = np.random.RandomState(seed)
+        n_inputs = len(POOLING) * N_FEATURES
+        
+        def glorot(fan_in, fan_out):
+            limit = np.sqrt(6.0 / (fan_in + fan_out))
+            return rng.uniform(-limit, limit, (fan_in, fan_out)).astype(np.float32)
+        
+        return {
+            'feature_mean': np.zeros(n_inputs, dtype=np.float32),
+            'feature_scale': np.tile(_FEATURE_SCALES, len(POOLING)).astype(np.float32),
+            'W1': glorot(n_inputs, self.hidden_units),
+            'b1': np.zeros(self.hidden_units, dtype=np.float32),
+            'W2': glorot(self.hidden_units, self.num_classes),
+            'b2': np.zeros(self.num_classes, dtype=np.float32),
+        }
+    
+    def _set_weights(self, weights, weights_dtype='float32'):
+        """
+        Install weights for the forward pass
+        
+        Matrices are used as stored (memory-mapped views when loaded from a
+        file), so int8 weights stay int8 and shared between processes; their
+        per-column scales are applied after each matmul (see _matmul).
+        """
+        self.weights = weights
+        self.weights_dtype = weights_dtype
+        self._scales = {name: weights[f'{name}_scale'] for name in QUANTIZABLE} if weights_dtype == 'int8' else {}
+    
+    def _matmul(self, x, name):
+        """
+        Multiply activations by a weight matrix
+        
+        An int8 matrix is widened to float32 for the BLAS matmul only for the
+        duration of the call; with per-column scales, (x @ Q) * scale equals
+        x @ (Q * scale).
+        """
+        matrix = self.weights[name]
+        if name not in self._scales:
+            return x @ matrix
+        product = x @ matrix.astype(np.float32)
+        product *= self._scales[name]
+        return product
+    
+    def _dense_matrix(self, name):
+        """float32 (dequantized if needed) copy or view of a weight matrix"""
+        matrix = np.asarray(self.weights[name], dtype=np.float32)
+        if name in self._scales:
+            matrix = matrix * self._scales[name]
+        return matrix
+    
+    def _pool(self, features, lengths=None):
+        """
+        Pool per-frame features over time into the POOLING statistics
+        
+        Args:
+            features: Audio features, shape (n_clips, time_steps, N_FEATURES)
+            lengths: Number of valid (unpadded) time steps of each clip, or None
+            
+        Returns:
+            pooled: Array of shape (n_clips, len(POOLING) * N_FEATURES)
+        """
+        if features.shape[-1] != N_FEATURES:
+            raise ValueError(f"Expected {N_FEATURES} features per frame, got {features.shape[-1]}")
+        n_clips, time_steps, _ = features.shape
+        if lengths is None or np.all(np.asarray(lengths) >= time_steps):
+            return np.concatenate([
+                features.mean(axis=1),
+                features.std(axis=1),
+                features.min(axis=1),
+                features.max(axis=1),
+                np.abs(np.diff(features, axis=1)).mean(axis=1) if time_steps > 1 else np.zeros_like(features[:, 0]),
+            ], axis=1)
+        
+        # Mask out the zero padding added to stack clips of different lengths
+        lengths = np.clip(np.asarray(lengths), 1, time_steps)
+        mask = (np.arange(time_steps) < lengths[:, None])[:, :, None]
+        counts = lengths[:, None].astype(features.dtype)
+        mean = np.where(mask, features, 0).sum(axis=1) / counts
+        std = np.sqrt(np.where(mask, (features - mean[:, None, :]) ** 2, 0).sum(axis=1) / counts)
+        minimum = np.where(mask, features, np.inf).min(axis=1)
+        maximum = np.where(mask, features, -np.inf).max(axis=1)
+        delta_mask = mask[:, 1:] & mask[:, :-1]
+        delta_counts = np.maximum(lengths - 1, 1)[:, None].astype(features.dtype)
+        mean_abs_delta = np.where(delta_mask, np.abs(np.diff(features, axis=1)), 0).sum(axis=1) / delta_counts
+        return np.concatenate([mean, std, minimum, maximum, mean_abs_delta], axis=1)
+    
+    def predict_proba(self, features, lengths=None):
+        """
+        Compute emotion probabilities for a batch of clips
+        
+        The whole batch goes through batched NumPy matmuls; nothing here
+        loops over clips or builds per-emotion dictionaries.
+        
+        Args:
+            features: Audio features, shape (n_clips, time_steps, N_FEATURES)
+            lengths: Number of valid time steps of each clip, or None
+            
+        Returns:
+            predictions: float32 probabilities, shape (n_clips, num_classes),
+                columns in EMOTIONS order
+        """
+        if self._session is not None:
+            return self._run_session(features, lengths)
+        w = self.weights
+        features = np.asarray(features, dtype=np.float32)
+        x = self._pool(features, lengths)
+        x -= w['feature_mean']
+        x /= w['feature_scale']
+        hidden = self._matmul(x, 'W1')
+        hidden += w['b1']
+        np.maximum(hidden, 0, out=hidden)
+        logits = self._matmul(hidden, 'W2')
+        logits += w['b2']
+        logits -= logits.max(axis=1, keepdims=True)
+        np.exp(logits, out=logits)
+        logits /= logits.sum(axis=1, keepdims=True)
+        return logits
     
-    def _build_model(self):
+    def load_onnx(self, model_path):
         """
-        In a real application, this would build a deep learning model
-        For demonstration, this is a simplified placeholder
+        Load an ONNX model and create the onnxruntime session used for every request
+        
+        The graph takes float32 input of shape (n_clips, len(POOLING) * N_FEATURES)
+        (pooled statistics; pooling stays in NumPy so padded clips are masked)
+        or (n_clips, time_steps, N_FEATURES) (raw frames, plus an optional int64
+        'lengths' input). Its first output is (n_clips, num_classes) in
+        EMOTIONS order: probabilities, or logits if the model's metadata has
+        output=logits. An 'emotions' metadata entry (comma-separated) is checked
+        against EMOTIONS.
+        
+        Args:
+            model_path: Path of the .onnx file
+            
+        Returns:
+            success: Whether loading was successful
         """
-        logger.info("Model building is simulated for demonstration purposes")
-        return True
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            logger.error("onnxruntime is not installed; install it to use ONNX models")
+            return False
+        
+        try:
+            start = time.perf_counter()
+            level = self.session_options['graph_optimization']
+            if level not in ONNX_OPTIMIZATION_LEVELS:
+                raise ValueError(f"Unknown graph optimization level {level}; expected one of {list(ONNX_OPTIMIZATION_LEVELS)}")
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = int(self.session_options['intra_op_threads'])
+            options.inter_op_num_threads = int(self.session_options['inter_op_threads'])
+            options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+            options.graph_optimization_level = getattr(ort.GraphOptimizationLevel, ONNX_OPTIMIZATION_LEVELS[level])
+            session = ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+            
+            metadata = dict(session.get_modelmeta().custom_metadata_map)
+            if 'emotions' in metadata and metadata['emotions'].split(',') != EMOTIONS:
+                raise ValueError(f"Model labels {metadata['emotions']} do not match {EMOTIONS}")
+            inputs = {i.name: i for i in session.get_inputs()}
+            features_input = session.get_inputs()[0]
+            rank = len(features_input.shape)
+            width = features_input.shape[-1]
+            expected = len(POOLING) * N_FEATURES if rank == 2 else N_FEATURES
+            if rank not in (2, 3) or (isinstance(width, int) and width != expected):
+                raise ValueError(f"Unsupported ONNX input shape {features_input.shape}")
+            
+            self._session = session
+            self._onnx_io = {
+                'features': features_input.name,
+                'pooled': rank == 2,
+                'lengths': 'lengths' if rank == 3 and 'lengths' in inputs else None,
+                'output': session.get_outputs()[0].name,
+                'logits': metadata.get('output') == 'logits',
+            }
+            self.metadata = metadata
+            self.fingerprint = file_checksum(model_path)
+            self.model_path = model_path
+            self.backend = 'onnx'
+            logger.info(f"ONNX model loaded from {model_path} in {(time.perf_counter() - start) * 1000:.1f} ms "
+                        f"(intra-op threads {options.intra_op_num_threads}, optimization {level})")
+            return True
+        except Exception as e:
+            logger.error(f"Error loading ONNX model: {str(e)}")
+            return False
+    
+    def _run_session(self, features, lengths=None):
+        """Run a batch through the onnxruntime session (see load_onnx for the I/O contract)"""
+        spec = self._onnx_io
+        features = np.asarray(features, dtype=np.float32)
+        if features.shape[-1] != N_FEATURES:
+            raise ValueError(f"Expected {N_FEATURES} features per frame, got {features.shape[-1]}")
+        if spec['pooled']:
+            feeds = {spec['features']: self._pool(features, lengths)}
+        else:
+            feeds = {spec['features']: features}
+            if spec['lengths'] is not None:
+                time_steps = features.shape[1]
+                feeds[spec['lengths']] = (np.full(len(features), time_steps) if lengths is None
+                                        else np.asarray(lengths)).astype(np.int64)
+        predictions = self._session.run([spec['output']], feeds)[0].astype(np.float32, copy=False)
+        if predictions.shape != (len(features), self.num_classes):
+            raise ValueError(f"ONNX model returned shape {predictions.shape}, expected {(len(features), self.num_classes)}")
+        if spec['logits']:
+            predictions = predictions - predictions.max(axis=1, keepdims=True)
+            np.exp(predictions, out=predictions)
+            predictions /= predictions.sum(axis=1, keepdims=True)
+        return predictions
+    
+    def to_result(self, prediction):
+        """Convert one row of probabilities to (emotion, all_confidences)"""
+        emotion = EMOTIONS[int(np.argmax(prediction))]
+        all_confidences = {e: float(prediction[i]) * 100 for i, e in enumerate(EMOTIONS)}
+        return emotion, all_confidences
     
     def predict(self, features):
         """
         Predict emotion from features
         
         Args:
-            features: Audio features
+            features: Audio features, shape (time_steps, N_FEATURES) or
+                (1, time_steps, N_FEATURES)
             
         Returns:
             emotion: Predicted emotion
             confidence: Prediction confidence
         """
         try:
-            # Use a seed based on the sum of features to get consistent results for the same input
-            feature_sum = np.sum(features) if isinstance(features, np.ndarray) else 0
-            np.random.seed(int(abs(feature_sum * 100) % 10000))
-            
-            # Generate random probabilities
-            raw_predictions = np.random.rand(1, len(EMOTIONS))
-            # Normalize to sum to 1
-            predictions = raw_predictions / np.sum(raw_predictions)
+            if isinstance(features, np.ndarray):
+                features = features.reshape(1, -1, N_FEATURES)
+            else:
+                features = np.zeros((1, 1, N_FEATURES), dtype=np.float32)
+            predictions = self.predict_proba(features)
             
-            # Get the emotion with highest probability
-            emotion_idx = np.argmax(predictions[0])
-            emotion = EMOTIONS[emotion_idx]
-            confidence = predictions[0][emotion_idx] * 100
+            emotion, all_confidences = self.to_result(predictions[0])
             
-            # Get confidence for all emotions
-            all_confidences = {}
-            for i, e in enumerate(EMOTIONS):
-                all_confidences[e] = predictions[0][i] * 100
-            
-            logger.info(f"Predicted emotion: {emotion} with {confidence:.2f}% confidence")
+            logger.info(f"Predicted emotion: {emotion} with {all_confidences[emotion]:.2f}% confidence")
             
             return emotion, all_confidences
             
@@ -73,69 +423,219 @@ class EmotionModel:
             logger.error(f"Error making prediction: {str(e)}")
             raise
     
-    def train(self, epochs=20, batch_size=32):
+    def predict_batch(self, features, lengths=None):
+        """
+        Predict emotions for a batch of clips in one forward pass
+        
+        Args:
+            features: Audio features, shape (n_clips, time_steps, n_features)
+            lengths: Number of valid time steps of each clip when shorter clips
+                were zero-padded along time (None if no clip is padded)
+            
+        Returns:
+            results: List of (emotion, all_confidences) tuples, one per clip
+        """
+        try:
+            predictions = self.predict_proba(features, lengths)
+            results = [self.to_result(prediction) for prediction in predictions]
+            
+            logger.info(f"Predicted emotions for a batch of {len(results)} clips")
+            
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error making batch prediction: {str(e)}")
+            raise
+    
+    def train(self, store, epochs=20, batch_size=32, learning_rate=0.001, dropout=0.3, validation_split=0.2,
+              seed=42, callback=None, save_path=None):
         """
-        Train the model
+        Train the model on a feature store
         
-        In a real application, this would use actual data.
-        For demonstration, we'll simulate training results.
+        Every clip is pooled once, streaming zero-padded mini-batches from
+        the store's memory map, so the corpus' frames never have to fit in
+        memory. The network is then trained with Adam on softmax
+        cross-entropy. The weights of the epoch with the lowest validation
+        loss are kept, installed and saved.
         
         Args:
-            epochs: Number of training epochs (simulated)
-            batch_size: Batch size (not used in this simplified version)
+            store: FeatureStore with the labelled training clips
+            epochs: Number of training epochs
+            batch_size: Clips per gradient update
+            learning_rate: Adam learning rate
+            dropout: Dropout rate of the hidden layer during training
+            validation_split: Fraction of each emotion's clips held out for validation
+            seed: Seed of the split, initialization, shuffling and dropout
+            callback: Optional callable(epoch, metrics) called after each epoch;
+                returning False stops training early
+            save_path: Model file to save the trained weights to (None for
+                model_path, unless that is an ONNX file)
             
         Returns:
-            history: Training history
-            accuracy: Validation accuracy
-            confusion_mat: Confusion matrix
+            history: Per-epoch 'loss', 'accuracy', 'val_loss' and 'val_accuracy'
+            accuracy: Validation accuracy in percent
+            confusion_mat: Confusion matrix of the validation clips (rows are
+                true emotions, columns predictions)
         """
         try:
-            # For demonstration, we'll simulate a training history
-            np.random.seed(42)  # For reproducibility
-            
-            # Simulate training history
-            history_dict = {
-                'accuracy': [0.5 + i * 0.01 for i in range(min(epochs, 10))],
-                'val_accuracy': [0.48 + i * 0.015 for i in range(min(epochs, 10))],
-                'loss': [0.8 - i * 0.02 for i in range(min(epochs, 10))],
-                'val_loss': [0.85 - i * 0.018 for i in range(min(epochs, 10))]
-            }
+            start = time.perf_counter()
+            names, labels = store.clips()
+            if len(names) == 0:
+                raise ValueError("The feature store has no labelled clips")
+            rng = np.random.RandomState(seed)
+            train_idx, val_idx = store.split(validation_split, seed=seed)
+            if len(val_idx) == 0:
+                logger.warning("Too few clips for a validation split; validating on the training clips")
+                val_idx = train_idx
+            
+            pooled = np.empty((len(names), len(POOLING) * N_FEATURES), dtype=np.float32)
+            position = 0
+            for features, lengths, _ in store.iter_batches(np.arange(len(names))):
+                pooled[position:position + len(lengths)] = self._pool(features, lengths)
+                position += len(lengths)
+            
+            weights = self._build_model(seed)
+            weights['feature_mean'] = pooled[train_idx].mean(axis=0)
+            scale = pooled[train_idx].std(axis=0)
+            weights['feature_scale'] = np.where(scale > 1e-6, scale, 1.0).astype(np.float32)
+            x_all = (pooled - weights['feature_mean']) / weights['feature_scale']
+            
+            params = {name: weights[name].copy() for name in ('W1', 'b1', 'W2', 'b2')}
+            moments = {name: (np.zeros_like(p), np.zeros_like(p)) for name, p in params.items()}
+            beta1, beta2, eps = 0.9, 0.999, 1e-8
+            step = 0
             
-            # Simulate validation accuracy
-            val_accuracy = 0.85  # 85% accuracy for demonstration
+            def forward(x, keep=None):
+                hidden = np.maximum(x @ params['W1'] + params['b1'], 0)
+                if keep is not None:
+                    hidden *= keep
+                logits = hidden @ params['W2'] + params['b2']
+                logits -= logits.max(axis=1, keepdims=True)
+                probs = np.exp(logits)
+                probs /= probs.sum(axis=1, keepdims=True)
+                return hidden, probs
             
-            # Generate a simulated confusion matrix
-            cm = np.zeros((self.num_classes, self.num_classes))
+            def evaluate(idx):
+                _, probs = forward(x_all[idx])
+                loss = -np.log(probs[np.arange(len(idx)), labels[idx]] + 1e-12).mean()
+                return float(loss), float((probs.argmax(axis=1) == labels[idx]).mean()), probs.argmax(axis=1)
             
-            # Diagonal elements (correct predictions) should be higher
-            for i in range(self.num_classes):
-                cm[i, i] = np.random.randint(5, 15)  # Correctly classified samples
+            history = {'loss': [], 'accuracy': [], 'val_loss': [], 'val_accuracy': []}
+            best_loss, best_params = np.inf, None
+            for epoch in range(epochs):
+                order = rng.permutation(train_idx)
+                for batch_start in range(0, len(order), batch_size):
+                    idx = order[batch_start:batch_start + batch_size]
+                    x, y = x_all[idx], labels[idx]
+                    keep = None
+                    if dropout > 0:
+                        keep = (rng.random_sample((len(idx), params['W1'].shape[1])) >= dropout) / (1 - dropout)
+                        keep = keep.astype(np.float32)
+                    hidden, probs = forward(x, keep)
+                    
+                    # Softmax cross-entropy gradients
+                    grad_logits = probs
+                    grad_logits[np.arange(len(idx)), y] -= 1
+                    grad_logits /= len(idx)
+                    grad_hidden = grad_logits @ params['W2'].T
+                    grad_hidden *= hidden > 0
+                    if keep is not None:
+                        grad_hidden *= keep
+                    grads = {
+                        'W2': hidden.T @ grad_logits,
+                        'b2': grad_logits.sum(axis=0),
+                        'W1': x.T @ grad_hidden,
+                        'b1': grad_hidden.sum(axis=0),
+                    }
+                    
+                    step += 1
+                    for name, grad in grads.items():
+                        m, v = moments[name]
+                        m *= beta1
+                        m += (1 - beta1) * grad
+                        v *= beta2
+                        v += (1 - beta2) * grad * grad
+                        m_hat = m / (1 - beta1 ** step)
+                        v_hat = v / (1 - beta2 ** step)
+                        params[name] -= (learning_rate * m_hat / (np.sqrt(v_hat) + eps)).astype(np.float32)
                 
-                # Add some misclassifications
-                for j in range(self.num_classes):
-                    if i != j:
-                        cm[i, j] = np.random.randint(0, 3)  # Misclassified samples
+                loss, accuracy, _ = evaluate(train_idx)
+                val_loss, val_accuracy, _ = evaluate(val_idx)
+                metrics = {'loss': loss, 'accuracy': accuracy, 'val_loss': val_loss, 'val_accuracy': val_accuracy}
+                for name, value in metrics.items():
+                    history[name].append(value)
+                logger.info(f"Epoch {epoch + 1}/{epochs}: " + ", ".join(f"{k}={v:.4f}" for k, v in metrics.items()))
+                if val_loss < best_loss:
+                    best_loss, best_params = val_loss, {name: p.copy() for name, p in params.items()}
+                if callback is not None and callback(epoch + 1, metrics) is False:
+                    logger.info(f"Training stopped after epoch {epoch + 1}")
+                    break
             
-            logger.info("Model training simulation completed")
+            if best_params is not None:
+                params = best_params
+            _, val_accuracy, predicted = evaluate(val_idx)
+            confusion_mat = np.zeros((self.num_classes, self.num_classes), dtype=np.int64)
+            np.add.at(confusion_mat, (labels[val_idx], predicted), 1)
             
-            return history_dict, val_accuracy * 100, cm
+            weights.update(params)
+            self._set_weights({name: np.asarray(w, dtype=np.float32) for name, w in weights.items()})
+            self._session = None
+            self.backend = 'numpy'
+            self.hidden_units = int(params['W1'].shape[1])
+            if save_path is None and self.model_path and not self.model_path.lower().endswith('.onnx'):
+                save_path = self.model_path
+            if save_path and self.save_model(save_path):
+                self.load_model(save_path)
+            
+            logger.info(f"Trained on {len(train_idx)} clips in {time.perf_counter() - start:.1f} s, "
+                        f"validation accuracy {val_accuracy * 100:.2f}%")
+            return history, val_accuracy * 100, confusion_mat
             
         except Exception as e:
             logger.error(f"Error training model: {str(e)}")
             raise
     
-    def save_model(self, model_path):
+    def save_model(self, model_path, weights_dtype=None):
         """
-        Save model to file (simulated for demonstration)
+        Save the weights and a JSON header (labels, feature layout) to a
+        safetensors file
         
         Args:
             model_path: Path to save model
+            weights_dtype: 'float32' or 'int8' (per-column quantized W1/W2,
+                4x smaller); None keeps the current storage
+            
+        Returns:
+            success: Whether saving was successful
         """
         try:
-            # In a real application, this would save the model to a file
-            # For demonstration, we'll just log a message
+            if self.weights is None:
+                raise ValueError(f"The {self.backend} backend has no NumPy weights to save")
+            if model_path.lower().endswith('.onnx'):
+                raise ValueError("ONNX models are exported by the training stack, not saved here")
+            weights_dtype = weights_dtype or self.weights_dtype
+            if weights_dtype not in WEIGHT_DTYPES:
+                raise ValueError(f"Unknown weights dtype {weights_dtype}; expected one of {WEIGHT_DTYPES}")
+            quantization = set(QUANTIZABLE) | {f'{name}_scale' for name in QUANTIZABLE}
+            tensors = {name: w for name, w in self.weights.items() if name not in quantization}
+            for name in QUANTIZABLE:
+                if weights_dtype == 'int8':
+                    tensors[name], tensors[f'{name}_scale'] = quantize_int8(self._dense_matrix(name))
+                else:
+                    tensors[name] = self._dense_matrix(name)
+            
+            checksum = save_tensors(model_path, tensors, metadata={
+                'format_version': MODEL_FORMAT_VERSION,
+                'emotions': EMOTIONS,
+                'feature_layout': FEATURE_LAYOUT,
+                'pooling': POOLING,
+                'weights_dtype': weights_dtype,
+                'hidden_units': int(tensors['W1'].shape[1]),
+                'created': datetime.datetime.utcnow().isoformat(),
+            })
             self.model_path = model_path
-            logger.info(f"Model saved to {model_path} (simulated)")
+            self.fingerprint = checksum
+            logger.info(f"Model saved to {model_path}")
             return True
         except Exception as e:
             logger.error(f"Error saving model: {str(e)}")
@@ -143,7 +643,10 @@ class EmotionModel:
     
     def load_model(self, model_path):
         """
-        Load model from file (simulated for demonstration)
+        Load model from file
+        
+        The file is memory-mapped read-only, so processes loading the same
+        file share one copy of the weights and loading takes milliseconds.
         
         Args:
             model_path: Path to load model from
@@ -152,10 +655,25 @@ class EmotionModel:
             success: Whether loading was successful
         """
         try:
-            # In a real application, this would load the model from a file
-            # For demonstration, we'll just log a message
+            start = time.perf_counter()
+            weights, metadata = load_tensors(model_path, mmap=True)
+            if metadata.get('format_version') != MODEL_FORMAT_VERSION:
+                raise ValueError(f"Unsupported model format version {metadata.get('format_version')}")
+            if metadata.get('emotions') != EMOTIONS:
+                raise ValueError(f"Model labels {metadata.get('emotions')} do not match {EMOTIONS}")
+            if metadata.get('feature_layout') != FEATURE_LAYOUT or metadata.get('pooling') != POOLING:
+                raise ValueError("Model feature layout does not match the feature extractor")
+            weights_dtype = metadata.get('weights_dtype', 'float32')
+            if weights_dtype not in WEIGHT_DTYPES:
+                raise ValueError(f"Unknown weights dtype {weights_dtype}")
+            
+            self._set_weights(weights, weights_dtype)
+            self._session = None
+            self.backend = 'numpy'
+            self.metadata = metadata
+            self.fingerprint = metadata['checksum']
             self.model_path = model_path
-            logger.info(f"Model loaded from {model_path} (simulated)")
+            logger.info(f"Model loaded from {model_path} in {(time.perf_counter() - start) * 1000:.1f} ms")
             return True
         except Exception as e:
             logger.error(f"Error loading model: {str(e)}")
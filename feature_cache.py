@@ -0,0 +1,250 @@
+"""
+Content-addressed cache for Speech Emotion Recognition
+Stores features and predictions keyed on a hash of the raw audio bytes and
+the processing parameters, with an in-memory LRU tier and an on-disk tier
+"""
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def make_cache_key(data, **params):
+    """
+    Build a cache key from raw audio bytes and processing parameters
+
+    Args:
+        data: Raw bytes of the audio file
+        **params: Parameters that affect the cached result (e.g. sr, duration,
+            n_mfcc, n_fft, hop_length)
+
+    Returns:
+        key: Hex digest identifying the audio content and parameters
+    """
+    digest = hashlib.sha256(data)
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+class FeatureCache:
+    """Two-tier (memory LRU + on-disk) cache of analysis results"""
+
+    def __init__(self, max_entries=128, cache_dir=None, max_disk_bytes=256 * 1024 * 1024, resync_every=32):
+        """
+        Initialize feature cache
+
+        Args:
+            max_entries: Maximum entries kept in memory (0 disables the memory tier)
+            cache_dir: Directory for the on-disk tier (None disables it)
+            max_disk_bytes: Maximum total size of the on-disk tier in bytes
+            resync_every: Writes after which the on-disk tier's size is
+                measured again, picking up what other processes sharing
+                cache_dir wrote
+        """
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.resync_every = max(1, int(resync_every))
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        # This process' estimate of the on-disk tier's size: its own writes are
+        # added to the last scan. Other processes (web workers, pool workers)
+        # write to the same directory, so it is rescanned every resync_every
+        # writes as well as whenever the estimate is over budget
+        self._disk_bytes = 0
+        self._writes_since_scan = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._disk_bytes = sum(size for size, _ in self._scan_disk().values())
+
+    def _scan_disk(self):
+        """Total size and latest modification time of each on-disk entry, by key"""
+        entries = {}
+        for name in os.listdir(self.cache_dir):
+            key, ext = os.path.splitext(name)
+            if ext not in ('.npy', '.json'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            size, mtime = entries.get(key, (0, 0))
+            entries[key] = (size + stat.st_size, max(mtime, stat.st_mtime))
+        return entries
+
+    @staticmethod
+    def _file_size(path):
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    def _paths(self, key):
+        """Paths of the features array and metadata files for a key"""
+        return os.path.join(self.cache_dir, f"{key}.npy"), os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """
+        Look up a cached entry
+
+        Args:
+            key: Cache key from make_cache_key
+
+        Returns:
+            entry: Dictionary with 'features' and the cached metadata, or None on a miss
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._memory_hits += 1
+                return self._memory[key]
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+            self._put_memory(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        """
+        Store an entry in both tiers
+
+        Args:
+            key: Cache key from make_cache_key
+            entry: Dictionary with a 'features' array plus JSON-serializable values
+        """
+        with self._lock:
+            self._put_memory(key, entry)
+        self._write_disk(key, entry)
+
+    def _put_memory(self, key, entry):
+        """Insert into the memory tier and evict least recently used entries (lock held)"""
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._evictions += 1
+
+    def _read_disk(self, key):
+        """Load an entry from the on-disk tier, or None if absent or unreadable"""
+        if not self.cache_dir:
+            return None
+        features_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, 'r') as f:
+                entry = json.load(f)
+            entry['features'] = np.load(features_path)
+            # Refresh modification times so disk eviction is least-recently-used
+            os.utime(features_path)
+            os.utime(meta_path)
+            return entry
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Error reading cache entry {key}: {str(e)}")
+            return None
+
+    def _write_disk(self, key, entry):
+        """Write an entry to the on-disk tier atomically, then enforce the size bound"""
+        if not self.cache_dir:
+            return
+        features_path, meta_path = self._paths(key)
+        meta = {k: v for k, v in entry.items() if k != 'features'}
+        try:
+            tmp_features = f"{features_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            tmp_meta = f"{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_features, 'wb') as f:
+                np.save(f, entry['features'])
+            with open(tmp_meta, 'w') as f:
+                json.dump(meta, f)
+            added = os.path.getsize(tmp_features) + os.path.getsize(tmp_meta)
+            replaced = self._file_size(features_path) + self._file_size(meta_path)
+            os.replace(tmp_features, features_path)
+            os.replace(tmp_meta, meta_path)
+        except Exception as e:
+            logger.warning(f"Error writing cache entry {key}: {str(e)}")
+            return
+        with self._lock:
+            self._disk_bytes += added - replaced
+            self._writes_since_scan += 1
+            rescan = self._disk_bytes > self.max_disk_bytes or self._writes_since_scan >= self.resync_every
+        if rescan:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """
+        Measure the on-disk tier and, if it is over max_disk_bytes, delete
+        least recently used entries until it is back under with some headroom
+        """
+        try:
+            entries = self._scan_disk()
+            total = sum(size for size, _ in entries.values())
+            # Evict down to 90% of the budget, so a full cache is not scanned on every write
+            target = self.max_disk_bytes * 0.9 if total > self.max_disk_bytes else self.max_disk_bytes
+            for key, (size, _) in sorted(entries.items(), key=lambda item: item[1][1]):
+                if total <= target:
+                    break
+                for path in self._paths(key):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+                with self._lock:
+                    self._evictions += 1
+            with self._lock:
+                self._disk_bytes = total
+                self._writes_since_scan = 0
+        except Exception as e:
+            logger.warning(f"Error evicting cache entries: {str(e)}")
+
+    def clear(self):
+        """Drop all entries from both tiers"""
+        with self._lock:
+            self._memory.clear()
+        if self.cache_dir:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(('.npy', '.json')):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except FileNotFoundError:
+                        pass
+            with self._lock:
+                self._disk_bytes = 0
+
+    def stats(self):
+        """
+        Get cache metrics
+
+        Returns:
+            stats: Dictionary with hit/miss/eviction counters and tier sizes
+        """
+        with self._lock:
+            lookups = self._memory_hits + self._disk_hits + self._misses
+            return {
+                'memory_hits': self._memory_hits,
+                'disk_hits': self._disk_hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_rate': (self._memory_hits + self._disk_hits) / lookups if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'max_entries': self.max_entries,
+                'disk_bytes': self._disk_bytes,
+            }
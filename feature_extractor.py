@@ -3,12 +3,16 @@ Feature extraction module for Speech Emotion Recognition
 Extracts acoustic features from audio files
 """
 import logging
+from functools import lru_cache
 import numpy as np
+import scipy.fft
 import librosa
 
+from spectral import compute_spectrum, _mel_basis, N_MELS
+
 logger = logging.getLogger(__name__)
 
-def extract_mfcc(audio, sr, n_mfcc=13, n_fft=2048, hop_length=512):
+def extract_mfcc(audio, sr, n_mfcc=13, n_fft=2048, hop_length=512, spectrum=None):
     """
     Extract Mel-Frequency Cepstral Coefficients (MFCCs)
     
@@ -18,17 +22,18 @@ def extract_mfcc(audio, sr, n_mfcc=13, n_fft=2048, hop_length=512):
         n_mfcc: Number of MFCCs to extract
         n_fft: FFT window size
         hop_length: Number of samples between successive frames
+        spectrum: Precomputed SpectralAnalysis of the audio (computed if None)
         
     Returns:
         mfccs: MFCCs features
     """
     try:
+        if spectrum is None:
+            spectrum = compute_spectrum(audio, sr, n_fft, hop_length)
         mfccs = librosa.feature.mfcc(
-            y=audio, 
+            S=librosa.power_to_db(spectrum.mel_power()),
             sr=sr, 
-            n_mfcc=n_mfcc,
-            n_fft=n_fft,
-            hop_length=hop_length
+            n_mfcc=n_mfcc
         )
         # Normalize MFCCs
         mfccs = (mfccs - np.mean(mfccs, axis=1, keepdims=True)) / (np.std(mfccs, axis=1, keepdims=True) + 1e-8)
@@ -37,7 +42,7 @@ def extract_mfcc(audio, sr, n_mfcc=13, n_fft=2048, hop_length=512):
         logger.error(f"Error extracting MFCCs: {str(e)}")
         raise
 
-def extract_spectral_features(audio, sr, n_fft=2048, hop_length=512):
+def extract_spectral_features(audio, sr, n_fft=2048, hop_length=512, spectrum=None):
     """
     Extract spectral features (spectral centroid, bandwidth, roll-off)
     
@@ -46,16 +51,19 @@ def extract_spectral_features(audio, sr, n_fft=2048, hop_length=512):
         sr: Sampling rate
         n_fft: FFT window size
         hop_length: Number of samples between successive frames
+        spectrum: Precomputed SpectralAnalysis of the audio (computed if None)
         
     Returns:
         spectral_features: Dictionary of spectral features
     """
     try:
         spectral_features = {}
+        if spectrum is None:
+            spectrum = compute_spectrum(audio, sr, n_fft, hop_length)
         
         # Spectral centroid
         spectral_centroids = librosa.feature.spectral_centroid(
-            y=audio, 
+            S=spectrum.magnitude, 
             sr=sr, 
             n_fft=n_fft, 
             hop_length=hop_length
@@ -63,7 +71,7 @@ def extract_spectral_features(audio, sr, n_fft=2048, hop_length=512):
         
         # Spectral bandwidth
         spectral_bandwidth = librosa.feature.spectral_bandwidth(
-            y=audio, 
+            S=spectrum.magnitude, 
             sr=sr, 
             n_fft=n_fft, 
             hop_length=hop_length
@@ -71,7 +79,7 @@ def extract_spectral_features(audio, sr, n_fft=2048, hop_length=512):
         
         # Spectral roll-off
         spectral_rolloff = librosa.feature.spectral_rolloff(
-            y=audio, 
+            S=spectrum.magnitude, 
             sr=sr, 
             n_fft=n_fft, 
             hop_length=hop_length
@@ -109,7 +117,7 @@ def extract_zero_crossing_rate(audio, hop_length=512):
         logger.error(f"Error extracting zero crossing rate: {str(e)}")
         raise
 
-def extract_chroma_features(audio, sr, n_fft=2048, hop_length=512, n_chroma=12):
+def extract_chroma_features(audio, sr, n_fft=2048, hop_length=512, n_chroma=12, spectrum=None):
     """
     Extract chroma features
     
@@ -119,13 +127,16 @@ def extract_chroma_features(audio, sr, n_fft=2048, hop_length=512, n_chroma=12):
         n_fft: FFT window size
         hop_length: Number of samples between successive frames
         n_chroma: Number of chroma bins
+        spectrum: Precomputed SpectralAnalysis of the audio (computed if None)
         
     Returns:
         chroma: Chroma features
     """
     try:
+        if spectrum is None:
+            spectrum = compute_spectrum(audio, sr, n_fft, hop_length)
         chroma = librosa.feature.chroma_stft(
-            y=audio, 
+            S=spectrum.power, 
             sr=sr, 
             n_fft=n_fft, 
             hop_length=hop_length, 
@@ -136,7 +147,7 @@ def extract_chroma_features(audio, sr, n_fft=2048, hop_length=512, n_chroma=12):
         logger.error(f"Error extracting chroma features: {str(e)}")
         raise
 
-def extract_features(audio_data, sr=22050, n_mfcc=13, n_fft=2048, hop_length=512):
+def extract_features(audio_data, sr=22050, n_mfcc=13, n_fft=2048, hop_length=512, spectrum=None):
     """
     Extract combined features from audio data
     
@@ -146,6 +157,8 @@ def extract_features(audio_data, sr=22050, n_mfcc=13, n_fft=2048, hop_length=512
         n_mfcc: Number of MFCCs to extract
         n_fft: FFT window size
         hop_length: Number of samples between successive frames
+        spectrum: Precomputed SpectralAnalysis of the audio (computed if None);
+            shared by MFCC, spectral and chroma extraction
         
     Returns:
         features: Dictionary of features or padded features ready for model
@@ -157,11 +170,15 @@ def extract_features(audio_data, sr=22050, n_mfcc=13, n_fft=2048, hop_length=512
         else:
             audio = audio_data
         
+        # Compute the STFT once and share it across all spectral features
+        if spectrum is None or spectrum.n_fft != n_fft or spectrum.hop_length != hop_length:
+            spectrum = compute_spectrum(audio, sr, n_fft, hop_length)
+        
         # Extract features
-        mfccs = extract_mfcc(audio, sr, n_mfcc, n_fft, hop_length)
-        spectral = extract_spectral_features(audio, sr, n_fft, hop_length)
+        mfccs = extract_mfcc(audio, sr, n_mfcc, n_fft, hop_length, spectrum=spectrum)
+        spectral = extract_spectral_features(audio, sr, n_fft, hop_length, spectrum=spectrum)
         zcr = extract_zero_crossing_rate(audio, hop_length)
-        chroma = extract_chroma_features(audio, sr, n_fft, hop_length)
+        chroma = extract_chroma_features(audio, sr, n_fft, hop_length, spectrum=spectrum)
         
         # Transpose to get time as first dimension
         mfccs = mfccs.T  # Shape: (time_steps, n_mfcc)
@@ -198,3 +215,116 @@ def extract_features(audio_data, sr=22050, n_mfcc=13, n_fft=2048, hop_length=512
     except Exception as e:
         logger.error(f"Error extracting combined features: {str(e)}")
         raise
+
+def _standardize(x):
+    """Zero-mean, unit-variance normalization along the last (time) axis"""
+    return (x - np.mean(x, axis=-1, keepdims=True)) / (np.std(x, axis=-1, keepdims=True) + 1e-8)
+
+@lru_cache(maxsize=64)
+def _chroma_basis(sr, n_fft, tuning, n_chroma):
+    """Chroma filterbank, cached per tuning estimate across batches"""
+    return librosa.filters.chroma(sr=sr, n_fft=n_fft, tuning=tuning, n_chroma=n_chroma)
+
+def _extract_stacked_features(batch, sr, n_mfcc, n_fft, hop_length, n_chroma):
+    """
+    Extract combined features from a stack of equal-length clips
+    
+    Mirrors extract_features step by step, with every reduction taken per
+    clip so that each row matches the single-clip result.
+    
+    Args:
+        batch: Audio array of shape (n_clips, n_samples)
+        sr: Sampling rate
+        n_mfcc: Number of MFCCs to extract
+        n_fft: FFT window size
+        hop_length: Number of samples between successive frames
+        n_chroma: Number of chroma bins
+        
+    Returns:
+        features: Array of shape (n_clips, time_steps, n_features)
+    """
+    # Framing and FFT for the whole stack: (n_clips, 1 + n_fft // 2, frames)
+    stft = librosa.stft(batch, n_fft=n_fft, hop_length=hop_length)
+    magnitude = np.abs(stft)
+    power = magnitude ** 2
+    
+    # MFCCs: mel projection, dB conversion with a per-clip 80 dB floor, DCT
+    mel_power = np.matmul(_mel_basis(sr, n_fft, N_MELS), power)
+    log_mel = 10.0 * np.log10(np.maximum(1e-10, mel_power))
+    log_mel = np.maximum(log_mel, log_mel.max(axis=(-2, -1), keepdims=True) - 80.0)
+    mfccs = scipy.fft.dct(log_mel, axis=-2, type=2, norm='ortho')[:, :n_mfcc, :]
+    mfccs = _standardize(mfccs)
+    
+    # Spectral statistics, one row per clip
+    centroid = librosa.feature.spectral_centroid(S=magnitude, sr=sr, n_fft=n_fft, hop_length=hop_length)[:, 0, :]
+    bandwidth = librosa.feature.spectral_bandwidth(S=magnitude, sr=sr, n_fft=n_fft, hop_length=hop_length)[:, 0, :]
+    rolloff = librosa.feature.spectral_rolloff(S=magnitude, sr=sr, n_fft=n_fft, hop_length=hop_length)[:, 0, :]
+    spectral = _standardize(np.stack([centroid, bandwidth, rolloff], axis=1))
+    
+    # Zero crossing rate
+    zcr = librosa.feature.zero_crossing_rate(batch, hop_length=hop_length)
+    
+    # Chroma: pitch tracking runs on the whole stack, tuning is estimated per clip
+    pitch, mag = librosa.piptrack(S=power, sr=sr, n_fft=n_fft)
+    chroma_bases = []
+    for clip_pitch, clip_mag in zip(pitch, mag):
+        pitch_mask = clip_pitch > 0
+        threshold = np.median(clip_mag[pitch_mask]) if pitch_mask.any() else 0.0
+        tuning = librosa.pitch_tuning(clip_pitch[(clip_mag >= threshold) & pitch_mask], bins_per_octave=n_chroma)
+        chroma_bases.append(_chroma_basis(sr, n_fft, float(tuning), n_chroma))
+    raw_chroma = np.einsum("ncf,nft->nct", np.stack(chroma_bases), power, optimize=True)
+    chroma = librosa.util.normalize(raw_chroma, norm=np.inf, axis=-2)
+    
+    # Combine along the feature axis and put time second: (n_clips, time_steps, n_features)
+    combined_features = np.concatenate([mfccs, spectral, zcr, chroma], axis=1)
+    return np.transpose(combined_features, (0, 2, 1))
+
+def extract_features_batch(audio_list, sr=22050, n_mfcc=13, n_fft=2048, hop_length=512, n_chroma=12):
+    """
+    Extract combined features from many audio clips at once
+    
+    Clips of equal length (preprocess_audio pads to a fixed duration) are
+    stacked into one 2-D array and featurized together. Clips of differing
+    lengths are processed in one stack per length and zero-padded along
+    time to the longest clip.
+    
+    Args:
+        audio_list: List of audio time series
+        sr: Sampling rate shared by all clips
+        n_mfcc: Number of MFCCs to extract
+        n_fft: FFT window size
+        hop_length: Number of samples between successive frames
+        n_chroma: Number of chroma bins
+        
+    Returns:
+        features: Features ready for model, shape (n_clips, time_steps, n_features)
+    """
+    try:
+        if len(audio_list) == 0:
+            raise ValueError("No audio clips to extract features from")
+        
+        # Group clips by length so each group stacks into one 2-D array
+        groups = {}
+        for i, audio in enumerate(audio_list):
+            groups.setdefault(len(audio), []).append(i)
+        
+        clip_features = [None] * len(audio_list)
+        for indices in groups.values():
+            batch = np.stack([audio_list[i] for i in indices])
+            stacked = _extract_stacked_features(batch, sr, n_mfcc, n_fft, hop_length, n_chroma)
+            for i, features in zip(indices, stacked):
+                clip_features[i] = features
+        
+        # Pad along time so clips from different groups share one tensor
+        target_length = max(features.shape[0] for features in clip_features)
+        model_input = np.stack([
+            np.pad(features, ((0, target_length - features.shape[0]), (0, 0)), 'constant')
+            for features in clip_features
+        ])
+        
+        logger.info(f"Extracted features for {len(audio_list)} clips in {len(groups)} batch(es)")
+        return model_input
+    
+    except Exception as e:
+        logger.error(f"Error extracting batch features: {str(e)}")
+        raise
@@ -0,0 +1,485 @@
+"""
+On-disk feature store for training Speech Emotion Recognition models
+Featurizes a labelled audio directory tree in parallel and keeps the
+per-frame features of every clip in one contiguous memory-mapped float32
+array, with a JSON index of labels and offsets
+
+Layout of a store directory:
+    index.json          parameters, clip index (label, offset, length,
+                        mtime, size, sha256) and the current frames file
+    frames-<n>.f32      all clips' frames, shape (total_frames, N_FEATURES)
+
+Usage:
+    python feature_store.py DATA_DIR [--store DIR] [--workers N]
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+
+from emotion_model import EMOTIONS, N_FEATURES
+
+logger = logging.getLogger(__name__)
+
+STORE_FORMAT_VERSION = 1
+
+# Audio file extensions picked up when walking a dataset directory
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.ogg', '.flac')
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def featurize_clip(path, params):
+    """
+    Decode, preprocess and featurize one training clip
+
+    Runs in the store's worker processes. Undecodable or silent files raise
+    instead of being replaced by a synthetic tone.
+
+    Args:
+        path: Path of the audio file
+        params: Keyword arguments of preprocess_audio/extract_features
+            (sr, duration, n_mfcc, n_fft, hop_length, res_type, limit_decode,
+            denoise_method)
+
+    Returns:
+        features: float32 array of shape (time_steps, N_FEATURES)
+        sha256: Hex digest of the file's bytes
+    """
+    from audio_processor import preprocess_audio
+    from feature_extractor import extract_features
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    audio, sr, spectrum = preprocess_audio(
+        data,
+        sr=params['sr'],
+        duration=params['duration'],
+        return_spectrum=True,
+        filename=os.path.basename(path),
+        res_type=params['res_type'],
+        limit_decode=params['limit_decode'],
+        denoise_method=params['denoise_method'],
+        strict=True
+    )
+    features = extract_features(
+        (audio, sr),
+        n_mfcc=params['n_mfcc'],
+        n_fft=params['n_fft'],
+        hop_length=params['hop_length'],
+        spectrum=spectrum if (spectrum.n_fft, spectrum.hop_length) == (params['n_fft'], params['hop_length']) else None
+    )
+    # extract_features adds a batch axis for the model; the store keeps (time_steps, N_FEATURES)
+    return np.ascontiguousarray(features[0], dtype=np.float32), hashlib.sha256(data).hexdigest()
+
+def scan_dataset(data_dir):
+    """
+    Find the labelled clips of a dataset directory
+
+    Clips are labelled by their top-level directory, e.g. data_dir/happy/**/x.wav;
+    directories that are not one of EMOTIONS are skipped.
+
+    Args:
+        data_dir: Root of the dataset
+
+    Returns:
+        clips: Dictionary mapping each clip's path relative to data_dir to its label
+    """
+    clips = {}
+    for label in sorted(os.listdir(data_dir)):
+        label_dir = os.path.join(data_dir, label)
+        if not os.path.isdir(label_dir):
+            continue
+        if label.lower() not in EMOTIONS:
+            logger.warning(f"Skipping {label_dir}: not one of {EMOTIONS}")
+            continue
+        for dirpath, dirnames, filenames in os.walk(label_dir):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.lower().endswith(AUDIO_EXTENSIONS):
+                    relpath = os.path.relpath(os.path.join(dirpath, filename), data_dir)
+                    clips[relpath.replace(os.sep, '/')] = label.lower()
+    return clips
+
+class FeatureStore:
+    """Memory-mapped per-frame features of a labelled dataset"""
+
+    def __init__(self, store_dir, params):
+        """
+        Open (or create) a feature store
+
+        Args:
+            store_dir: Directory of the store
+            params: Featurization parameters (see featurize_clip); a store
+                built with other parameters is discarded and rebuilt
+        """
+        self.store_dir = store_dir
+        self.params = dict(params)
+        os.makedirs(store_dir, exist_ok=True)
+        self._index = self._read_index()
+        self._frames = None
+        self._repair()
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.store_dir, 'index.json')
+
+    def _frames_path(self, index=None):
+        return os.path.join(self.store_dir, (index or self._index)['frames_file'])
+
+    def _empty_index(self, generation=0):
+        return {
+            'format_version': STORE_FORMAT_VERSION,
+            'params': self.params,
+            'n_features': N_FEATURES,
+            'frames_file': f'frames-{generation}.f32',
+            'generation': generation,
+            'total_frames': 0,
+            'clips': {},
+            'failed': {},
+        }
+
+    def _read_index(self):
+        """Load index.json, starting a new store if it is missing or was built differently"""
+        try:
+            with open(self._index_path) as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return self._empty_index()
+        except ValueError as e:
+            logger.warning(f"Unreadable feature store index, rebuilding: {str(e)}")
+            return self._empty_index()
+        if (index.get('format_version') != STORE_FORMAT_VERSION or index.get('n_features') != N_FEATURES
+                or index.get('params') != json.loads(json.dumps(self.params))):
+            logger.info(f"Feature store {self.store_dir} was built with other parameters, rebuilding")
+            return self._empty_index(index.get('generation', 0) + 1)
+        return index
+
+    def _write_index(self):
+        """Atomically replace index.json"""
+        tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._index, f, separators=(',', ':'))
+        os.replace(tmp_path, self._index_path)
+
+    def _repair(self):
+        """
+        Make the frames file match the index after an interrupted build
+
+        Frames appended after the last index checkpoint are truncated, so
+        their clips are simply featurized again; frames files of other
+        generations are deleted.
+        """
+        path = self._frames_path()
+        expected = self._index['total_frames'] * N_FEATURES * 4
+        if not os.path.exists(path):
+            if expected:
+                logger.warning(f"Feature store frames file {path} is missing, rebuilding")
+                self._index = self._empty_index(self._index['generation'] + 1)
+            open(self._frames_path(), 'ab').close()
+        elif os.path.getsize(path) > expected:
+            with open(path, 'r+b') as f:
+                f.truncate(expected)
+        elif os.path.getsize(path) < expected:
+            logger.warning(f"Feature store frames file {path} is truncated, rebuilding")
+            self._index = self._empty_index(self._index['generation'] + 1)
+            open(self._frames_path(), 'ab').close()
+        for name in os.listdir(self.store_dir):
+            if name.startswith('frames-') and name != self._index['frames_file']:
+                os.remove(os.path.join(self.store_dir, name))
+        self._write_index()
+
+    def _plan(self, data_dir, clips):
+        """Split the dataset into clips to featurize and clips already up to date"""
+        stored = self._index['clips']
+        failed = self._index['failed']
+        todo = []
+        for relpath, label in clips.items():
+            path = os.path.join(data_dir, relpath)
+            stat = os.stat(path)
+            known = stored.get(relpath) or failed.get(relpath)
+            if known is not None and (known['mtime_ns'], known['size']) == (stat.st_mtime_ns, stat.st_size):
+                continue
+            if known is not None and known['size'] == stat.st_size and file_sha256(path) == known['sha256']:
+                # Touched but unchanged
+                known['mtime_ns'] = stat.st_mtime_ns
+                continue
+            todo.append((relpath, label, stat))
+        return todo
+
+    def build(self, data_dir, workers=None, checkpoint_every=256, progress=None):
+        """
+        Featurize new and changed clips of a dataset directory into the store
+
+        Unchanged clips (same mtime and size, or same content) are skipped;
+        clips removed from the directory are dropped from the index. The
+        index is checkpointed every `checkpoint_every` clips, so an
+        interrupted build resumes where it stopped.
+
+        Args:
+            data_dir: Root of the labelled dataset (see scan_dataset)
+            workers: Featurization processes (None for one per CPU, 0 to run inline)
+            checkpoint_every: Clips featurized between index checkpoints
+            progress: Optional callable(done, total) called as clips finish
+
+        Returns:
+            stats: Dictionary with counts of featurized, skipped, failed and removed clips
+
+        Raises:
+            BrokenProcessPool: If a featurization process died; the clips
+                featurized so far are checkpointed and the others are
+                featurized by the next build
+        """
+        start = time.perf_counter()
+        clips = scan_dataset(data_dir)
+        removed = [relpath for relpath in self._index['clips'] if relpath not in clips]
+        for relpath in removed:
+            del self._index['clips'][relpath]
+        for relpath in [relpath for relpath in self._index['failed'] if relpath not in clips]:
+            del self._index['failed'][relpath]
+        todo = self._plan(data_dir, clips)
+        logger.info(f"Feature store: {len(todo)} of {len(clips)} clips to featurize in {data_dir}")
+
+        workers = (os.cpu_count() or 1) if workers is None else int(workers)
+        featurized = failed = 0
+        self._close()
+        with open(self._frames_path(), 'ab') as frames_file:
+            def record(relpath, label, stat, result, error):
+                nonlocal featurized, failed
+                if error is not None:
+                    logger.warning(f"Could not featurize {relpath}: {error}")
+                    self._index['clips'].pop(relpath, None)
+                    self._index['failed'][relpath] = {
+                        'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                        'sha256': file_sha256(os.path.join(data_dir, relpath)), 'error': str(error),
+                    }
+                    failed += 1
+                else:
+                    features, sha256 = result
+                    frames_file.write(features.tobytes())
+                    self._index['failed'].pop(relpath, None)
+                    self._index['clips'][relpath] = {
+                        'label': label, 'offset': self._index['total_frames'], 'length': len(features),
+                        'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': sha256,
+                    }
+                    self._index['total_frames'] += len(features)
+                    featurized += 1
+                done = featurized + failed
+                if done % checkpoint_every == 0:
+                    frames_file.flush()
+                    os.fsync(frames_file.fileno())
+                    self._write_index()
+                if progress is not None:
+                    progress(done, len(todo))
+
+            if workers == 0:
+                for relpath, label, stat in todo:
+                    try:
+                        result, error = featurize_clip(os.path.join(data_dir, relpath), self.params), None
+                    except Exception as e:
+                        result, error = None, e
+                    record(relpath, label, stat, result, error)
+            elif todo:
+                from processing_pool import warmup
+                try:
+                    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=warmup) as executor:
+                        # Keep a bounded window of clips in flight so memory stays flat
+                        pending = {}
+
+                        def collect(futures):
+                            broken = None
+                            for future in futures:
+                                item = pending.pop(future)
+                                error = future.exception()
+                                if isinstance(error, BrokenProcessPool):
+                                    # A worker died; not the clip's fault, so it is retried next build
+                                    broken = error
+                                    continue
+                                record(*item, None if error else future.result(), error)
+                            if broken is not None:
+                                raise broken
+
+                        for item in todo:
+                            pending[executor.submit(featurize_clip, os.path.join(data_dir, item[0]), self.params)] = item
+                            if len(pending) < 4 * workers:
+                                continue
+                            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                            collect(done)
+                        collect(list(pending))
+                except BrokenProcessPool:
+                    # Keep the clips featurized so far for the next build
+                    frames_file.flush()
+                    os.fsync(frames_file.fileno())
+                    self._write_index()
+                    raise
+            frames_file.flush()
+            os.fsync(frames_file.fileno())
+        self._write_index()
+
+        if self.orphaned_frames > self._index['total_frames'] // 2:
+            self.compact()
+        stats = {
+            'clips': len(self._index['clips']),
+            'featurized': featurized,
+            'skipped': len(clips) - len(todo),
+            'failed': failed,
+            'removed': len(removed),
+            'seconds': round(time.perf_counter() - start, 2),
+        }
+        logger.info(f"Feature store built: {stats}")
+        return stats
+
+    @property
+    def orphaned_frames(self):
+        """Frames of clips that were re-featurized or removed since the last compaction"""
+        return self._index['total_frames'] - sum(clip['length'] for clip in self._index['clips'].values())
+
+    def compact(self):
+        """Rewrite the frames file without orphaned frames, as a new generation"""
+        generation = self._index['generation'] + 1
+        index = dict(self._index, generation=generation, frames_file=f'frames-{generation}.f32', clips={})
+        frames = self.frames
+        offset = 0
+        with open(self._frames_path(index), 'wb') as f:
+            for relpath, clip in sorted(self._index['clips'].items(), key=lambda item: item[1]['offset']):
+                f.write(frames[clip['offset']:clip['offset'] + clip['length']].tobytes())
+                index['clips'][relpath] = dict(clip, offset=offset)
+                offset += clip['length']
+            f.flush()
+            os.fsync(f.fileno())
+        index['total_frames'] = offset
+        old_path = self._frames_path()
+        self._close()
+        self._index = index
+        self._write_index()
+        os.remove(old_path)
+        logger.info(f"Compacted feature store to {offset} frames")
+
+    def _close(self):
+        self._frames = None
+
+    @property
+    def frames(self):
+        """Read-only memory map of all frames, shape (total_frames, N_FEATURES)"""
+        if self._frames is None:
+            total = self._index['total_frames']
+            if total == 0:
+                self._frames = np.zeros((0, N_FEATURES), dtype=np.float32)
+            else:
+                self._frames = np.memmap(self._frames_path(), dtype=np.float32, mode='r', shape=(total, N_FEATURES))
+        return self._frames
+
+    def __len__(self):
+        return len(self._index['clips'])
+
+    def clips(self):
+        """
+        Get the stored clips in a stable order
+
+        Returns:
+            names: Clip paths relative to the dataset root
+            labels: int64 array of indices into EMOTIONS
+        """
+        names = sorted(self._index['clips'])
+        labels = np.array([EMOTIONS.index(self._index['clips'][name]['label']) for name in names], dtype=np.int64)
+        return names, labels
+
+    def split(self, test_size=0.2, seed=42):
+        """
+        Stratified split of the clips() order; emotions with a single clip
+        only go to the training side
+
+        Args:
+            test_size: Fraction of each emotion's clips held out
+            seed: Seed of the shuffle
+
+        Returns:
+            train_indices: int64 positions into the clips() order
+            test_indices: int64 positions into the clips() order
+        """
+        _, labels = self.clips()
+        rng = np.random.RandomState(seed)
+        train, test = [], []
+        for label in range(len(EMOTIONS)):
+            indices = np.flatnonzero(labels == label)
+            rng.shuffle(indices)
+            n_test = int(round(len(indices) * test_size)) if len(indices) > 1 else 0
+            test.extend(indices[:n_test])
+            train.extend(indices[n_test:])
+        return np.array(sorted(train), dtype=np.int64), np.array(sorted(test), dtype=np.int64)
+
+    def iter_batches(self, indices, batch_size=256):
+        """
+        Stream clips from the memory map in zero-padded mini-batches
+
+        Args:
+            indices: Positions into the clips() order to read
+            batch_size: Clips per batch
+
+        Yields:
+            features: float32 array (batch, max_time_steps, N_FEATURES)
+            lengths: int64 array of each clip's number of frames
+            labels: int64 array of indices into EMOTIONS
+        """
+        names, labels = self.clips()
+        frames = self.frames
+        for start in range(0, len(indices), batch_size):
+            batch = indices[start:start + batch_size]
+            entries = [self._index['clips'][names[i]] for i in batch]
+            lengths = np.array([entry['length'] for entry in entries], dtype=np.int64)
+            features = np.zeros((len(entries), max(1, lengths.max(initial=0)), N_FEATURES), dtype=np.float32)
+            for row, entry in enumerate(entries):
+                features[row, :entry['length']] = frames[entry['offset']:entry['offset'] + entry['length']]
+            yield features, lengths, labels[batch]
+
+    def stats(self):
+        """
+        Get store metrics
+
+        Returns:
+            stats: Dictionary with clip counts per label, frame counts and file size
+        """
+        per_label = {emotion: 0 for emotion in EMOTIONS}
+        for clip in self._index['clips'].values():
+            per_label[clip['label']] += 1
+        return {
+            'clips': len(self._index['clips']),
+            'failed': len(self._index['failed']),
+            'per_label': per_label,
+            'frames': self._index['total_frames'],
+            'orphaned_frames': self.orphaned_frames,
+            'bytes': self._index['total_frames'] * N_FEATURES * 4,
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('data_dir', help='Dataset root with one directory per emotion')
+    parser.add_argument('--store', default=os.environ.get('FEATURE_STORE_DIR', 'instance/feature_store'),
+                        help='Feature store directory (default: $FEATURE_STORE_DIR or instance/feature_store)')
+    parser.add_argument('--workers', type=int, default=None, help='Featurization processes (default: one per CPU)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    # Featurize with the web app's audio parameters; it only needs a database URL to import
+    os.environ.setdefault('DATABASE_URL', 'sqlite://')
+    from app import AUDIO_PARAMS
+    store = FeatureStore(args.store, AUDIO_PARAMS)
+    store.build(args.data_dir, workers=args.workers)
+    print(json.dumps(store.stats(), indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Prediction history queries for Speech Emotion Recognition
+Pages through predictions newest first with keyset pagination on
+(timestamp, id): each page is an index range scan that starts after the
+last row of the previous page, so deep pages cost the same as the first
+"""
+import base64
+import datetime
+
+import sqlalchemy as sa
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(timestamp, record_id):
+    """Opaque cursor pointing after the row with this (timestamp, id)"""
+    raw = f"{timestamp.isoformat()}|{record_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor made by encode_cursor
+
+    Returns:
+        position: (timestamp, id) tuple
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        timestamp, record_id = raw.rsplit('|', 1)
+        return datetime.datetime.fromisoformat(timestamp), int(record_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def parse_time(value, end=False):
+    """
+    Parse an ISO date or datetime (UTC); a bare date used as the end of a
+    range covers that whole day
+    """
+    try:
+        if len(value) == 10:
+            day = datetime.datetime.combine(datetime.date.fromisoformat(value), datetime.time())
+            return day + datetime.timedelta(days=1) if end else day
+        parsed = datetime.datetime.fromisoformat(value)
+    except ValueError as e:
+        raise ValueError(f"Invalid date: {value}") from e
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def parse_filters(args, emotions):
+    """
+    Read history filters from request arguments
+
+    Args:
+        args: Mapping of request arguments: 'emotion', 'since' and 'until'
+            (ISO dates or datetimes, UTC), 'recorded' ('true' or 'false'),
+            'before' (cursor of the next page) and 'limit'
+        emotions: Valid emotion names
+
+    Returns:
+        filters: Keyword arguments for history_page
+
+    Raises:
+        ValueError: If an argument is invalid
+    """
+    filters = {}
+    emotion = args.get('emotion')
+    if emotion:
+        if emotion not in emotions:
+            raise ValueError(f"Unknown emotion: {emotion}")
+        filters['emotion'] = emotion
+    if args.get('since'):
+        filters['since'] = parse_time(args['since'])
+    if args.get('until'):
+        filters['until'] = parse_time(args['until'], end=True)
+    recorded = args.get('recorded')
+    if recorded:
+        if recorded.lower() not in ('true', 'false', '1', '0'):
+            raise ValueError(f"Invalid recorded filter: {recorded}")
+        filters['is_recorded'] = recorded.lower() in ('true', '1')
+    if args.get('before'):
+        filters['before'] = decode_cursor(args['before'])
+    if args.get('limit'):
+        try:
+            limit = int(args['limit'])
+        except ValueError:
+            raise ValueError(f"Invalid limit: {args['limit']}")
+        filters['limit'] = max(1, min(limit, MAX_PAGE_SIZE))
+    return filters
+
+def history_page(session, model, emotion=None, since=None, until=None, is_recorded=None,
+                 before=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Fetch one page of predictions, newest first
+
+    Args:
+        session: SQLAlchemy session
+        model: EmotionPrediction model class
+        emotion: Only predictions of this emotion
+        since: Only predictions at or after this time
+        until: Only predictions before this time
+        is_recorded: Only recorded (True) or uploaded (False) predictions
+        before: (timestamp, id) position to continue after (see decode_cursor)
+        limit: Page size
+
+    Returns:
+        predictions: Up to `limit` predictions
+        next_cursor: Cursor of the next page, or None on the last page
+    """
+    conditions = []
+    if emotion is not None:
+        conditions.append(model.emotion == emotion)
+    if since is not None:
+        conditions.append(model.timestamp >= since)
+    if until is not None:
+        conditions.append(model.timestamp < until)
+    if is_recorded is not None:
+        conditions.append(model.is_recorded.is_(is_recorded))
+    if before is not None:
+        conditions.append(sa.tuple_(model.timestamp, model.id) < sa.tuple_(*before))
+
+    statement = (
+        sa.select(model)
+        .where(*conditions)
+        .order_by(model.timestamp.desc(), model.id.desc())
+        .limit(limit + 1)
+    )
+    predictions = session.execute(statement).scalars().all()
+    next_cursor = None
+    if len(predictions) > limit:
+        predictions = predictions[:limit]
+        next_cursor = encode_cursor(predictions[-1].timestamp, predictions[-1].id)
+    return predictions, next_cursor
@@ -0,0 +1,264 @@
+"""
+Bulk export of the prediction history for Speech Emotion Recognition
+Streams every prediction matching the history filters as CSV, NDJSON or
+Parquet, optionally gzipped. Rows are read in batches through a server-side
+cursor as plain column tuples (no ORM objects, so no identity map grows)
+and encoded batch by batch, so memory stays flat however large the table is.
+
+Usage:
+    python history_export.py --output FILE [--format csv|ndjson|parquet]
+                             [--no-waveform] [--gzip] [--emotion E]
+                             [--since DATE] [--until DATE] [--recorded true|false]
+
+The waveform column holds the packed waveform (see utils.pack_waveform),
+base64-encoded in CSV and NDJSON. FILE '-' writes to standard output.
+"""
+import os
+import io
+import sys
+import csv
+import json
+import zlib
+import base64
+import logging
+import argparse
+
+import sqlalchemy as sa
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('csv', 'ndjson', 'parquet')
+MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+DEFAULT_BATCH_SIZE = 2000
+
+def export_columns(emotions, include_waveform=True):
+    """Names of the exported columns, in order"""
+    columns = ['id', 'filename', 'emotion', 'confidence'] + [f'confidence_{e}' for e in emotions] + ['timestamp', 'is_recorded']
+    if include_waveform:
+        columns.append('waveform')
+    return columns
+
+def check_format(export_format, compress=False):
+    """
+    Validate an export format before any output is produced
+
+    Raises:
+        ValueError: If the format is unknown or cannot be gzipped
+        RuntimeError: If Parquet is requested without pyarrow installed
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Invalid format: {export_format}")
+    if export_format == 'parquet':
+        if compress:
+            raise ValueError("Parquet output is compressed already; gzip applies to csv and ndjson")
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise RuntimeError("Parquet output needs pyarrow: pip install pyarrow")
+
+def export_batches(session, model, emotions, emotion=None, since=None, until=None, is_recorded=None,
+                   include_waveform=True, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Read the matching predictions in id order, one batch at a time
+
+    Args:
+        session: SQLAlchemy session
+        model: EmotionPrediction model class
+        emotions: Emotion names (order of the confidence columns)
+        emotion, since, until, is_recorded: Filters, as for history.history_page
+        include_waveform: Read the packed waveform column too
+        batch_size: Rows per batch (and per server-side cursor fetch)
+
+    Yields:
+        rows: List of row tuples in the order of export_columns
+    """
+    columns = [getattr(model, name) for name in export_columns(emotions, include_waveform)]
+    conditions = []
+    if emotion is not None:
+        conditions.append(model.emotion == emotion)
+    if since is not None:
+        conditions.append(model.timestamp >= since)
+    if until is not None:
+        conditions.append(model.timestamp < until)
+    if is_recorded is not None:
+        conditions.append(model.is_recorded.is_(is_recorded))
+
+    statement = (
+        sa.select(*columns)
+        .where(*conditions)
+        .order_by(model.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for partition in session.execute(statement).partitions():
+        yield partition
+
+def _text_value(value):
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode('ascii')
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+def csv_chunks(batches, columns):
+    """Encode row batches as CSV, one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows([_text_value(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def ndjson_chunks(batches, columns):
+    """Encode row batches as JSON lines, one chunk per batch"""
+    for rows in batches:
+        yield ''.join(
+            json.dumps({name: _text_value(value) for name, value in zip(columns, row)}) + '\n'
+            for row in rows
+        ).encode('utf-8')
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file collecting what the Parquet writer emits until it is drained"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def parquet_chunks(batches, columns):
+    """Encode row batches as one Parquet file, one row group per batch"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {'id': pa.int64(), 'filename': pa.string(), 'emotion': pa.string(), 'confidence': pa.float64(),
+             'timestamp': pa.timestamp('us'), 'is_recorded': pa.bool_(), 'waveform': pa.binary()}
+    schema = pa.schema([(name, types.get(name, pa.float32())) for name in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for rows in batches:
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)],
+                schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+ENCODERS = {
+    'csv': csv_chunks,
+    'ndjson': ndjson_chunks,
+    'parquet': parquet_chunks,
+}
+
+def gzip_chunks(chunks, level=6):
+    """Gzip a stream of byte chunks on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_chunks(session, model, emotions, export_format='csv', filters=None, include_waveform=True,
+                  compress=False, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Stream the prediction history as encoded bytes
+
+    Args:
+        session: SQLAlchemy session
+        model: EmotionPrediction model class
+        emotions: Emotion names
+        export_format: 'csv', 'ndjson' or 'parquet' (see check_format)
+        filters: Keyword arguments for export_batches ('emotion', 'since',
+            'until', 'is_recorded')
+        include_waveform: Export the packed waveform column
+        compress: Gzip the output
+        batch_size: Rows read and encoded at a time
+
+    Yields:
+        chunk: Bytes of the export
+    """
+    columns = export_columns(emotions, include_waveform)
+    batches = export_batches(session, model, emotions, include_waveform=include_waveform,
+                             batch_size=batch_size, **(filters or {}))
+    chunks = (chunk for chunk in ENCODERS[export_format](batches, columns) if chunk)
+    if compress:
+        chunks = gzip_chunks(chunks)
+    return chunks
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', required=True, help="Output file ('-' for standard output)")
+    parser.add_argument('--format', choices=EXPORT_FORMATS,
+                        help='Output format (default: from the output extension, else csv)')
+    parser.add_argument('--no-waveform', action='store_true', help='Leave out the waveform column')
+    parser.add_argument('--gzip', action='store_true', help='Gzip the output (default for a .gz output)')
+    parser.add_argument('--emotion', help='Only predictions of this emotion')
+    parser.add_argument('--since', help='Only predictions at or after this ISO date or datetime (UTC)')
+    parser.add_argument('--until', help='Only predictions before this ISO date or datetime (UTC)')
+    parser.add_argument('--recorded', help="Only recorded ('true') or uploaded ('false') predictions")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Rows read per round trip')
+    args = parser.parse_args()
+    if not os.environ.get('DATABASE_URL'):
+        parser.error("Set DATABASE_URL to the app's database")
+
+    name = args.output.lower()
+    compress = args.gzip or name.endswith('.gz')
+    if name.endswith('.gz'):
+        name = name[:-3]
+    export_format = args.format or {'.jsonl': 'ndjson'}.get(os.path.splitext(name)[1], os.path.splitext(name)[1].lstrip('.'))
+    if export_format not in EXPORT_FORMATS:
+        export_format = 'csv'
+
+    from app import app, db, EmotionPrediction
+    from emotion_model import EMOTIONS
+    from history import parse_filters
+    logging.getLogger().setLevel(logging.INFO)
+    try:
+        check_format(export_format, compress)
+        filters = parse_filters({'emotion': args.emotion, 'since': args.since, 'until': args.until,
+                                 'recorded': args.recorded}, EMOTIONS)
+    except (ValueError, RuntimeError) as e:
+        parser.error(str(e))
+
+    out = sys.stdout.buffer if args.output == '-' else open(args.output + '.tmp', 'wb')
+    written = 0
+    try:
+        with app.app_context():
+            for chunk in export_chunks(db.session, EmotionPrediction, EMOTIONS, export_format, filters,
+                                       include_waveform=not args.no_waveform, compress=compress,
+                                       batch_size=args.batch_size):
+                out.write(chunk)
+                written += len(chunk)
+    except BaseException:
+        if out is not sys.stdout.buffer:
+            out.close()
+            os.remove(args.output + '.tmp')
+        raise
+    if out is not sys.stdout.buffer:
+        out.close()
+        os.replace(args.output + '.tmp', args.output)
+    logger.info(f"Wrote {written} bytes to {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Micro-batching inference scheduler for Speech Emotion Recognition
+Collects feature tensors from concurrent requests and scores them in one
+batched EmotionModel forward pass
+"""
+import os
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class InferenceScheduler:
+    """In-process queue that micro-batches EmotionModel predictions"""
+
+    def __init__(self, model, max_batch_size=16, max_wait_ms=5.0):
+        """
+        Initialize inference scheduler
+
+        Args:
+            model: EmotionModel used for batched prediction
+            max_batch_size: Maximum number of clips scored in one forward pass
+            max_wait_ms: Maximum time to wait for a batch to fill, in milliseconds
+        """
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._worker = None
+        self._worker_pid = None
+
+        # Metrics
+        self._max_queue_depth = 0
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+
+    def _ensure_worker(self):
+        """Start the worker thread lazily, and again in a forked child process"""
+        if self._worker is not None and self._worker.is_alive() and self._worker_pid == os.getpid():
+            return
+        self._worker = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+        self._worker_pid = os.getpid()
+        self._worker.start()
+
+    def submit(self, features):
+        """
+        Queue a feature tensor for prediction
+
+        Args:
+            features: Audio features, shape (1, time_steps, n_features)
+
+        Returns:
+            future: Future resolving to the clip's row of probabilities
+                (see EmotionModel.predict_proba)
+        """
+        future = Future()
+        with self._condition:
+            self._ensure_worker()
+            self._queue.append((np.asarray(features), future))
+            self._max_queue_depth = max(self._max_queue_depth, len(self._queue))
+            self._condition.notify()
+        return future
+
+    def predict(self, features, timeout=None):
+        """
+        Predict emotion from features through the batching queue
+
+        Args:
+            features: Audio features, shape (1, time_steps, n_features)
+            timeout: Maximum time to wait for the result in seconds (None waits forever)
+
+        Returns:
+            emotion: Predicted emotion
+            confidence: Dictionary of confidence values for each emotion
+        """
+        # The confidence dictionary is built here, in the caller's thread
+        return self.model.to_result(self.submit(features).result(timeout=timeout))
+
+    def _next_batch(self):
+        """Block until work arrives, then collect up to max_batch_size items or until max_wait elapses"""
+        with self._condition:
+            while not self._queue:
+                self._condition.wait()
+            deadline = time.monotonic() + self.max_wait
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            count = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _run(self):
+        """Worker loop: run one batched forward pass per collected batch and fan results out"""
+        while True:
+            batch = self._next_batch()
+            features = [item[0] for item in batch]
+            futures = [item[1] for item in batch]
+            try:
+                # Pad along time so clips of different lengths stack into one tensor;
+                # the lengths let the model ignore the padding
+                lengths = [f.shape[1] for f in features]
+                target_length = max(lengths)
+                stacked = np.concatenate([
+                    np.pad(f, ((0, 0), (0, target_length - f.shape[1]), (0, 0)), 'constant')
+                    for f in features
+                ])
+                predictions = self.model.predict_proba(stacked, lengths=np.asarray(lengths))
+                for future, prediction in zip(futures, predictions):
+                    future.set_result(prediction)
+                with self._condition:
+                    self._batches += 1
+                    self._items += len(batch)
+            except Exception as e:
+                logger.error(f"Error running batched inference: {str(e)}")
+                with self._condition:
+                    self._errors += 1
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def stats(self):
+        """
+        Get queue metrics
+
+        Returns:
+            stats: Dictionary with current and peak queue depth, batch counts and batching knobs
+        """
+        with self._condition:
+            return {
+                'queue_depth': len(self._queue),
+                'max_queue_depth': self._max_queue_depth,
+                'batches': self._batches,
+                'items': self._items,
+                'errors': self._errors,
+                'mean_batch_size': self._items / self._batches if self._batches else 0.0,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+            }
@@ -0,0 +1,278 @@
+"""
+Live recording sessions for Speech Emotion Recognition
+Accepts raw PCM frames as they are recorded, keeps the most recent window
+in a ring buffer and runs emotion recognition on every completed window
+"""
+import time
+import uuid
+import logging
+import threading
+from collections import deque
+import numpy as np
+
+from emotion_model import EMOTIONS
+from processing_pool import PoolSaturatedError, ProcessingPool, window_features
+
+logger = logging.getLogger(__name__)
+
+class LiveSession:
+    """One live recording: streaming resampler, ring buffer and window results"""
+
+    def __init__(self, model, sample_rate, sr=22050, window=3, hop=1, pool=None, max_results=600, max_backlog=32):
+        """
+        Initialize live session
+
+        Args:
+            model: Object with a predict(features) method (EmotionModel or InferenceScheduler)
+            sample_rate: Sampling rate of the incoming PCM frames
+            sr: Sampling rate used for analysis
+            window: Window length in seconds
+            hop: Hop between window starts in seconds
+            pool: ProcessingPool extracting the windows' features (None to
+                extract them in the calling thread)
+            max_results: Most recent window results kept for the timeline
+            max_backlog: Completed windows kept waiting while the pool is
+                saturated; older ones are dropped
+        """
+        self.id = uuid.uuid4().hex
+        self.model = model
+        self.pool = pool if pool is not None else ProcessingPool(max_workers=0)
+        self.sample_rate = int(sample_rate)
+        self.sr = sr
+        self.window = window
+        self.hop = hop
+        self.window_length = int(sr * window)
+        self.hop_length = int(sr * hop)
+        if self.sample_rate <= 0 or self.window_length <= 0 or self.hop_length <= 0:
+            raise ValueError("Sample rate, window and hop must be positive")
+
+        # Audio libraries are imported with the first session, not with the app
+        import soxr
+        from audio_processor import HighPassFilter
+
+        self._resampler = None
+        if self.sample_rate != sr:
+            self._resampler = soxr.ResampleStream(self.sample_rate, sr, 1, dtype='float32', quality='HQ')
+        # Noise reduction runs on the incoming stream with carried filter state
+        self._highpass = HighPassFilter(sr)
+
+        # Ring buffer holding the most recent window_length samples
+        self._ring = np.zeros(self.window_length, dtype=np.float32)
+        self._total = 0  # Samples written so far
+        self._next_window_end = self.window_length
+        self._lock = threading.Lock()
+
+        # Completed windows waiting for analysis, as (start sample, audio)
+        self._backlog = deque()
+        self.max_backlog = max_backlog
+        self.dropped_windows = 0
+
+        # Recent results for the timeline; the summary uses running sums
+        self.results = deque(maxlen=max_results)
+        self._confidence_sums = dict.fromkeys(EMOTIONS, 0.0)
+        self._analyzed = 0
+        self.last_active = time.monotonic()
+
+    def _window(self):
+        """Return the ring buffer contents in chronological order"""
+        position = self._total % self.window_length
+        return np.concatenate([self._ring[position:], self._ring[:position]])
+
+    def _write(self, samples):
+        """Append samples to the ring buffer, queueing each window for analysis as it completes"""
+        samples = self._highpass.process(samples)
+        while len(samples) > 0:
+            take = min(len(samples), self._next_window_end - self._total)
+            if take > self.window_length:
+                # Hop longer than the window: samples between windows are never analyzed
+                skipped = take - self.window_length
+                self._total += skipped
+                samples = samples[skipped:]
+                take = self.window_length
+            position = self._total % self.window_length
+            first = min(take, self.window_length - position)
+            self._ring[position:position + first] = samples[:first]
+            self._ring[:take - first] = samples[first:take]
+            self._total += take
+            samples = samples[take:]
+
+            if self._total == self._next_window_end:
+                if len(self._backlog) >= self.max_backlog:
+                    self._backlog.popleft()
+                    self.dropped_windows += 1
+                self._backlog.append((self._total - self.window_length, self._window()))
+                self._next_window_end += self.hop_length
+
+    def _analyze_backlog(self, wait):
+        """
+        Extract the features of queued windows in the pool and predict them
+
+        Args:
+            wait: Analyze every queued window, in this thread if the pool is
+                saturated; otherwise windows the pool has no room for stay
+                queued for the next push
+
+        Returns:
+            new_results: Timeline entries of the analyzed windows
+        """
+        submitted = []
+        while self._backlog:
+            start, window_audio = self._backlog[0]
+            try:
+                future = self.pool.submit(window_features, window_audio, self.sr)
+            except PoolSaturatedError:
+                if not wait:
+                    break
+                future = ProcessingPool(max_workers=0).submit(window_features, window_audio, self.sr)
+            self._backlog.popleft()
+            submitted.append((start, future))
+        return [self._record(start, self.pool.result(future)) for start, future in submitted]
+
+    def _record(self, start, features):
+        """Predict one window from its features and record the result"""
+        emotion, confidence = self.model.predict(features)
+        for e in EMOTIONS:
+            self._confidence_sums[e] += float(confidence[e])
+        self._analyzed += 1
+        entry = {
+            'start': round(start / self.sr, 3),
+            'end': round(start / self.sr + self.window, 3),
+            'emotion': emotion,
+            'confidence': float(confidence[emotion]),
+            'all_confidences': {e: float(c) for e, c in confidence.items()},
+        }
+        self.results.append(entry)
+        return entry
+
+    def push(self, frames):
+        """
+        Add PCM frames to the session
+
+        Args:
+            frames: Mono float32 samples at the session's sample rate
+
+        Returns:
+            new_results: Timeline entries for windows completed by these
+                frames (or by earlier ones, if the pool was saturated then)
+        """
+        with self._lock:
+            self.last_active = time.monotonic()
+            samples = np.asarray(frames, dtype=np.float32)
+            if self._resampler is not None:
+                samples = self._resampler.resample_chunk(samples)
+            self._write(samples)
+            return self._analyze_backlog(wait=False)
+
+    def finish(self):
+        """
+        Flush buffered audio and summarize the session
+
+        A recording shorter than one window is zero-padded and analyzed once.
+
+        Returns:
+            summary: Dictionary with the overall 'emotion', mean 'all_confidences'
+                over all windows, the 'timeline' (the most recent
+                max_results windows) and the most recent window's 'audio'
+        """
+        with self._lock:
+            if self._resampler is not None:
+                self._write(self._resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True))
+                self._resampler = None
+            self._analyze_backlog(wait=True)
+
+            if not self._analyzed:
+                if self._total == 0:
+                    raise ValueError("No audio received")
+                audio = np.pad(self._ring[:self._total], (0, self.window_length - self._total), 'constant')
+                self._backlog.append((0, audio))
+                self._analyze_backlog(wait=True)
+                last_audio = self._ring[:self._total].copy()
+            else:
+                last_audio = self._window()
+
+            # Average the per-window confidences for the overall prediction
+            mean_confidences = {e: self._confidence_sums[e] / self._analyzed for e in EMOTIONS}
+            emotion = max(mean_confidences, key=mean_confidences.get)
+            return {
+                'emotion': emotion,
+                'all_confidences': mean_confidences,
+                'timeline': list(self.results),
+                'audio': last_audio,
+                'sr': self.sr,
+            }
+
+class LiveSessionManager:
+    """
+    Registry of live sessions for one web worker process
+
+    Sessions live in process memory, so all requests of a session must be
+    routed to the same worker (e.g. with sticky sessions).
+    """
+
+    def __init__(self, model, max_sessions=64, idle_timeout=60, window=3, hop=1, pool=None):
+        """
+        Initialize live session manager
+
+        Args:
+            model: Object with a predict(features) method (EmotionModel or InferenceScheduler)
+            max_sessions: Maximum number of concurrent sessions
+            idle_timeout: Seconds of inactivity after which a session is dropped
+            window: Window length in seconds
+            hop: Hop between window starts in seconds
+            pool: ProcessingPool extracting the sessions' window features
+                (None to extract them in the request thread)
+        """
+        self.model = model
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.window = window
+        self.hop = hop
+        self.pool = pool
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        """Drop idle sessions (lock held)"""
+        now = time.monotonic()
+        for session_id in [s.id for s in self._sessions.values() if now - s.last_active > self.idle_timeout]:
+            logger.info(f"Dropping idle live session {session_id}")
+            del self._sessions[session_id]
+
+    def create(self, sample_rate):
+        """
+        Start a new live session
+
+        Args:
+            sample_rate: Sampling rate of the incoming PCM frames
+
+        Returns:
+            session: New LiveSession
+        """
+        with self._lock:
+            self._expire()
+            if len(self._sessions) >= self.max_sessions:
+                raise RuntimeError("Too many live sessions")
+            session = LiveSession(self.model, sample_rate, window=self.window, hop=self.hop, pool=self.pool)
+            self._sessions[session.id] = session
+            return session
+
+    def get(self, session_id):
+        """Look up a live session, or None if unknown or expired"""
+        with self._lock:
+            self._expire()
+            return self._sessions.get(session_id)
+
+    def close(self, session_id):
+        """Remove a live session"""
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def stats(self):
+        """
+        Get session metrics
+
+        Returns:
+            stats: Dictionary with the number of active sessions and the limit
+        """
+        with self._lock:
+            return {'sessions': len(self._sessions), 'max_sessions': self.max_sessions}
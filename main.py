@@ -1,5 +1,10 @@
-from app import app  # noqa: F401
+import os
+
+from app import app, warmup  # noqa: F401
 
 # This file is set up to make the Flask application run properly
 if __name__ == "__main__":
+    # The debug reloader imports the app twice; only warm up the serving process
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warmup()
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,188 @@
+"""
+Prediction storage migration for Speech Emotion Recognition
+Moves EmotionPrediction rows from the JSON text columns (all_confidences,
+waveform_data) to the compact format: one float32 column per emotion and
+the packed binary waveform (see utils.pack_waveform). Rows are converted in
+batches and committed as they go, so an interrupted run resumes where it
+stopped; the JSON columns are dropped once every row is converted. Indexes
+the model declares but the database lacks (e.g. the history indexes) are
+created too.
+
+Usage:
+    python migrate_predictions.py [--batch-size N] [--vacuum]
+
+Run it with the web app stopped, against the app's DATABASE_URL, and back up
+the database first: dropping the JSON columns cannot be undone.
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+
+logger = logging.getLogger(__name__)
+
+LEGACY_COLUMNS = ('all_confidences', 'waveform_data')
+
+def convert_confidences(all_confidences, emotion, confidence):
+    """
+    Per-emotion confidence values of a legacy row
+
+    Args:
+        all_confidences: JSON text of the confidence values
+        emotion: Predicted emotion of the row
+        confidence: Confidence of the predicted emotion
+
+    Returns:
+        values: Dictionary of confidence values for each emotion (unreadable
+            JSON keeps only the predicted emotion's confidence)
+    """
+    from emotion_model import EMOTIONS
+
+    try:
+        values = json.loads(all_confidences) if all_confidences else {}
+    except ValueError:
+        logger.warning(f"Unreadable confidences for a '{emotion}' prediction; keeping the top confidence only")
+        values = {}
+    values = {e: float(values.get(e, 0.0)) for e in EMOTIONS}
+    if emotion in values and not values[emotion]:
+        values[emotion] = float(confidence)
+    return values
+
+def convert_waveform(waveform_data, sr):
+    """
+    Pack the legacy waveform JSON of a row
+
+    Args:
+        waveform_data: JSON text with 'audio' and 'times' lists and optional
+            'min'/'max' envelope and 'spectrogram'
+        sr: Sampling rate assumed for rows without a spectrogram (the JSON
+            only kept the duration)
+
+    Returns:
+        waveform: Packed waveform (see utils.pack_waveform), or None for
+            rows without usable waveform data
+    """
+    from utils import pack_waveform, waveform_envelope
+
+    try:
+        data = json.loads(waveform_data) if waveform_data else {}
+    except ValueError:
+        return None
+    if not data.get('audio'):
+        return None
+    spectrogram = data.get('spectrogram')
+    if spectrogram:
+        sr = spectrogram['sr']
+    duration = (data.get('times') or [0.0])[-1]
+    envelope = data if 'min' in data and 'max' in data else waveform_envelope(data['audio'])
+    return pack_waveform(data['audio'], sr, round(duration * sr), envelope, spectrogram or None)
+
+def migrate(db, model, sr=22050, batch_size=500, vacuum=False):
+    """
+    Migrate the predictions table in place
+
+    Args:
+        db: Flask-SQLAlchemy database (inside an app context)
+        model: EmotionPrediction model class
+        sr: Sampling rate assumed for legacy waveforms without a spectrogram
+        batch_size: Rows converted per transaction
+        vacuum: Reclaim the space of the dropped columns afterwards
+
+    Returns:
+        converted: Number of rows converted
+    """
+    import sqlalchemy as sa
+    from emotion_model import EMOTIONS
+
+    table = model.__table__
+    engine = db.engine
+    inspector = sa.inspect(engine)
+    if not inspector.has_table(table.name):
+        table.create(engine)
+        logger.info(f"Created table {table.name}")
+        return 0
+
+    existing = {column['name'] for column in inspector.get_columns(table.name)}
+    new_columns = [f'confidence_{e}' for e in EMOTIONS] + ['waveform']
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as conn:
+        for name in new_columns:
+            if name not in existing:
+                # Added as nullable: the existing rows are filled in below
+                column_type = table.c[name].type.compile(dialect=engine.dialect)
+                conn.execute(sa.text(f"ALTER TABLE {preparer.quote(table.name)} ADD COLUMN {preparer.quote(name)} {column_type}"))
+                logger.info(f"Added column {name}")
+
+    existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name not in existing_indexes:
+            index.create(engine)
+            logger.info(f"Created index {index.name}")
+
+    legacy = [name for name in LEGACY_COLUMNS if name in existing]
+    if not legacy:
+        logger.info("Predictions already use the compact storage format")
+        return 0
+
+    legacy_table = sa.Table(table.name, sa.MetaData(), autoload_with=engine)
+    columns = legacy_table.c
+    pending = columns.confidence_angry.is_(None)
+    total = db.session.execute(sa.select(sa.func.count()).select_from(legacy_table).where(pending)).scalar()
+    logger.info(f"Converting {total} rows")
+
+    update = legacy_table.update().where(columns.id == sa.bindparam('row_id')).values(
+        {f'confidence_{e}': sa.bindparam(f'value_{e}') for e in EMOTIONS} | {'waveform': sa.bindparam('packed')}
+    )
+    converted = 0
+    last_id = 0
+    while True:
+        select = sa.select(columns.id, columns.emotion, columns.confidence,
+                           *(columns[name] for name in legacy)).where(pending, columns.id > last_id)
+        rows = db.session.execute(select.order_by(columns.id).limit(batch_size)).mappings().all()
+        if not rows:
+            break
+        params = []
+        for row in rows:
+            confidences = convert_confidences(row.get('all_confidences'), row['emotion'], row['confidence'])
+            params.append({
+                'row_id': row['id'],
+                'packed': convert_waveform(row.get('waveform_data'), sr),
+                **{f'value_{e}': confidences[e] for e in EMOTIONS},
+            })
+        db.session.execute(update, params)
+        db.session.commit()
+        converted += len(rows)
+        last_id = rows[-1]['id']
+        logger.info(f"Converted {converted}/{total} rows")
+
+    with engine.begin() as conn:
+        for name in legacy:
+            conn.execute(sa.text(f"ALTER TABLE {preparer.quote(table.name)} DROP COLUMN {preparer.quote(name)}"))
+            logger.info(f"Dropped column {name}")
+
+    if vacuum:
+        statement = 'VACUUM' if engine.dialect.name == 'sqlite' else f'VACUUM FULL {preparer.quote(table.name)}'
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(sa.text(statement))
+        logger.info("Reclaimed the space of the dropped columns")
+    return converted
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=500, help='Rows converted per transaction')
+    parser.add_argument('--vacuum', action='store_true',
+                        help='Reclaim the freed space afterwards (VACUUM; VACUUM FULL on PostgreSQL, which locks the table)')
+    args = parser.parse_args()
+    if not os.environ.get('DATABASE_URL'):
+        parser.error("Set DATABASE_URL to the database to migrate")
+
+    from app import app, db, EmotionPrediction, AUDIO_PARAMS
+    logging.getLogger().setLevel(logging.INFO)
+    with app.app_context():
+        converted = migrate(db, EmotionPrediction, sr=AUDIO_PARAMS['sr'], batch_size=args.batch_size, vacuum=args.vacuum)
+    print(f"Migrated {converted} predictions")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
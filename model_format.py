@@ -0,0 +1,130 @@
+"""
+Model file format for Speech Emotion Recognition
+Reads and writes weights in the safetensors layout: an 8-byte little-endian
+header length, a JSON header describing each tensor, then the raw tensor
+bytes. Loading memory-maps the file, so every process that loads the same
+model shares one copy of the weights in the page cache.
+"""
+import os
+import json
+import hashlib
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# safetensors dtype names
+_DTYPES = {
+    'F64': np.dtype('<f8'),
+    'F32': np.dtype('<f4'),
+    'F16': np.dtype('<f2'),
+    'I64': np.dtype('<i8'),
+    'I32': np.dtype('<i4'),
+    'I16': np.dtype('<i2'),
+    'I8': np.dtype('i1'),
+    'U8': np.dtype('u1'),
+}
+_DTYPE_NAMES = {dtype: name for name, dtype in _DTYPES.items()}
+
+# Tensor data is aligned to this many bytes so every tensor view is aligned
+ALIGNMENT = 64
+
+def save_tensors(path, tensors, metadata=None):
+    """
+    Write tensors and metadata to a safetensors file atomically
+
+    Args:
+        path: Destination file
+        tensors: Dictionary mapping names to NumPy arrays
+        metadata: Dictionary of JSON-serializable values stored in the header
+
+    Returns:
+        checksum: SHA-256 hex digest of the tensor data, also stored in the metadata
+    """
+    header = {}
+    chunks = []
+    offset = 0
+    for name in sorted(tensors):
+        array = np.ascontiguousarray(tensors[name])
+        dtype = array.dtype.newbyteorder('<') if array.dtype.byteorder == '>' else array.dtype
+        if dtype not in _DTYPE_NAMES:
+            raise ValueError(f"Unsupported dtype {array.dtype} for tensor {name}")
+        data = array.astype(dtype, copy=False).tobytes()
+        padding = -offset % ALIGNMENT
+        if padding:
+            chunks.append(b'\0' * padding)
+            offset += padding
+        header[name] = {
+            'dtype': _DTYPE_NAMES[dtype],
+            'shape': list(array.shape),
+            'data_offsets': [offset, offset + len(data)],
+        }
+        chunks.append(data)
+        offset += len(data)
+
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    checksum = digest.hexdigest()
+
+    # safetensors metadata values are strings, so every value is JSON-encoded
+    header['__metadata__'] = {key: json.dumps(value) for key, value in (metadata or {}).items()}
+    header['__metadata__']['checksum'] = json.dumps(checksum)
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    # Pad the header with spaces so the tensor data starts aligned
+    header_bytes += b' ' * (-(8 + len(header_bytes)) % ALIGNMENT)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(len(header_bytes).to_bytes(8, 'little'))
+        f.write(header_bytes)
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp_path, path)
+    return checksum
+
+def load_tensors(path, mmap=True, verify=True):
+    """
+    Load tensors and metadata from a safetensors file
+
+    Args:
+        path: File to load
+        mmap: Memory-map the file (read-only views sharing the page cache)
+            instead of reading it into private memory
+        verify: Check the tensor data against the SHA-256 checksum stored
+            by save_tensors (files without one are not checked)
+
+    Returns:
+        tensors: Dictionary mapping names to NumPy arrays
+        metadata: Dictionary of the decoded header metadata
+
+    Raises:
+        ValueError: If the file is truncated, inconsistent or fails its checksum
+    """
+    with open(path, 'rb') as f:
+        header_length = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(header_length))
+        if not mmap:
+            data = np.frombuffer(f.read(), dtype=np.uint8)
+    if mmap:
+        data = np.memmap(path, dtype=np.uint8, mode='r', offset=8 + header_length)
+
+    metadata = {key: json.loads(value) for key, value in header.pop('__metadata__', {}).items()}
+    data_end = max((info['data_offsets'][1] for info in header.values()), default=0)
+    if data_end > len(data):
+        raise ValueError(f"{path} is truncated: {len(data)} of {data_end} data bytes")
+    if verify and 'checksum' in metadata:
+        # The checksum covers the tensor data including the alignment padding
+        if hashlib.sha256(data[:data_end]).hexdigest() != metadata['checksum']:
+            raise ValueError(f"{path} does not match its checksum")
+    tensors = {}
+    for name, info in header.items():
+        start, end = info['data_offsets']
+        dtype = _DTYPES[info['dtype']]
+        shape = tuple(info['shape'])
+        if end - start != dtype.itemsize * int(np.prod(shape, dtype=np.int64)):
+            raise ValueError(f"Tensor {name} in {path} has inconsistent size")
+        tensors[name] = np.ndarray(shape, dtype=dtype, buffer=data, offset=start)
+    return tensors, metadata
@@ -3,9 +3,12 @@ Models for the Speech Emotion Recognition system
 """
 import os
 import datetime
+import logging
 import numpy as np
 import json
 
+logger = logging.getLogger(__name__)
+
 # Database Models class definitions - db will be provided by app.py
 class Dataset:
     """Simple dataset class for emotion detection"""
@@ -20,35 +23,53 @@ class Dataset:
 
 # Model Classes for Audio Processing and Emotion Recognition
 class EmotionDataset:
-    """Emotion dataset handling class"""
+    """Emotion dataset handling class backed by an on-disk FeatureStore"""
     
-    def __init__(self):
-        # This would be replaced with actual data loading in production
-        # Initialize empty arrays that would be loaded with actual data
-        self.X_train = np.empty((100, 128, 13))  # (n_samples, timesteps, features)
-        self.y_train = np.zeros((100, 7))  # One-hot encoded labels
-        self.X_test = np.empty((20, 128, 13))
-        self.y_test = np.zeros((20, 7))
+    def __init__(self, store_dir, params):
+        """
+        Initialize dataset
         
-    def load_dataset(self, dataset_path=None):
+        Args:
+            store_dir: Directory of the feature store
+            params: Featurization parameters (app.AUDIO_PARAMS)
+        """
+        from feature_store import FeatureStore
+        self.store = FeatureStore(store_dir, params)
+        self.train_indices = np.empty(0, dtype=np.int64)
+        self.test_indices = np.empty(0, dtype=np.int64)
+        
+    def load_dataset(self, dataset_path=None, workers=None):
         """
         Load dataset from specified path
         
-        In a real application, this would load actual audio files,
-        preprocess them, and prepare training/testing data
+        Featurizes new and changed audio files under dataset_path (one
+        directory per emotion) into the feature store and splits the clips.
+        
+        Args:
+            dataset_path: Root of the labelled dataset (None uses the store as is)
+            workers: Featurization processes (None for one per CPU)
+            
+        Returns:
+            success: Whether the dataset has any clips
         """
-        # This is a placeholder. In a real app, we'd load actual data here
-        return True
+        try:
+            if dataset_path:
+                self.store.build(dataset_path, workers=workers)
+            self.split_data()
+            return len(self.store) > 0
+        except Exception as e:
+            logger.error(f"Error loading dataset: {str(e)}")
+            return False
     
-    def get_train_data(self):
-        """Get training data"""
-        return self.X_train, self.y_train
+    def get_train_data(self, batch_size=256):
+        """Stream the training clips as (features, lengths, labels) mini-batches"""
+        return self.store.iter_batches(self.train_indices, batch_size)
     
-    def get_test_data(self):
-        """Get testing data"""
-        return self.X_test, self.y_test
+    def get_test_data(self, batch_size=256):
+        """Stream the test clips as (features, lengths, labels) mini-batches"""
+        return self.store.iter_batches(self.test_indices, batch_size)
     
-    def split_data(self, features, labels, test_size=0.2):
-        """Split data into training and testing sets"""
-        # In a real implementation, we'd use sklearn's train_test_split
-        pass
+    def split_data(self, test_size=0.2, seed=42):
+        """Split the stored clips into stratified training and test sets"""
+        self.train_indices, self.test_indices = self.store.split(test_size, seed=seed)
+        return self.train_indices, self.test_indices
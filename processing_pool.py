@@ -0,0 +1,289 @@
+"""
+Process pool for CPU-bound audio work in Speech Emotion Recognition
+Runs decoding, preprocessing, feature extraction and chart rendering in
+warm worker processes so the web worker only waits on results
+"""
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class PoolSaturatedError(RuntimeError):
+    """Raised when the processing pool already has its maximum amount of pending work"""
+
+    def __init__(self, retry_after):
+        super().__init__("Audio processing pool is saturated")
+        self.retry_after = retry_after
+
+def warmup():
+    """
+    Import the audio libraries and run a tiny clip through the pipeline so
+    the first real request pays no import or numba compilation cost
+
+    Used as the initializer of the pool's workers and by app.warmup.
+
+    Returns:
+        features: Features of the dummy clip
+    """
+    import io
+    import soundfile as sf
+    from audio_processor import preprocess_audio, remove_noise
+    from feature_extractor import extract_features
+    from spectral import compute_spectrum
+    from utils import downsample_waveform
+
+    sr = 22050
+    t = np.linspace(0, 0.5, sr // 2, endpoint=False)
+    buf = io.BytesIO()
+    sf.write(buf, (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32), 16000, format='WAV')
+
+    # Decode + resample, trim (librosa's numba kernels), high-pass, normalize
+    audio, sr = preprocess_audio(buf.getvalue(), sr=sr, duration=0.5, filename='warmup.wav')
+    remove_noise(audio, sr, method='spectral_gate')
+    features = extract_features((audio, sr))
+    downsample_waveform(audio, sr, spectrum=compute_spectrum(audio, sr))
+    logger.info(f"Audio pipeline warmed up in process {os.getpid()}")
+    return features
+
+def _render(name, fn, *args, **kwargs):
+    """Render a chart, returning empty bytes (chart unavailable) if rendering fails"""
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        logger.error(f"Error creating {name} plot: {str(e)}")
+        return b""
+
+def analyze_audio_file(file_path, filename=None, sr=22050, duration=3, n_mfcc=13, n_fft=2048, hop_length=512,
+                       res_type='soxr_hq', limit_decode=False, denoise_method='highpass'):
+    """
+    Preprocess an audio file, extract its features and the data its charts
+    are drawn from
+
+    Args:
+        file_path: Path to audio file or its raw bytes
+        filename: Original file name, used as a format hint for raw bytes
+        sr: Target sampling rate
+        duration: Target duration in seconds (None for no duration limit)
+        n_mfcc: Number of MFCCs to extract
+        n_fft: FFT window size
+        hop_length: Number of samples between successive frames
+        res_type: Resampling backend (see audio_options.RESAMPLE_BACKENDS)
+        limit_decode: Decode only the first `duration` seconds
+        denoise_method: Noise reduction method (see audio_processor.remove_noise)
+
+    Returns:
+        analysis: Dictionary with 'features', 'sr' and 'waveform' (the packed
+            downsampled waveform, its envelope and a quantized spectrogram)
+    """
+    from audio_processor import preprocess_audio
+    from feature_extractor import extract_features
+    from spectral import compute_spectrum
+    from utils import downsample_waveform
+
+    audio, sr, spectrum = preprocess_audio(
+        file_path,
+        sr=sr,
+        duration=duration,
+        return_spectrum=True,
+        filename=filename,
+        res_type=res_type,
+        limit_decode=limit_decode,
+        denoise_method=denoise_method
+    )
+    if spectrum.n_fft != n_fft or spectrum.hop_length != hop_length:
+        spectrum = compute_spectrum(audio, sr, n_fft=n_fft, hop_length=hop_length)
+    features = extract_features((audio, sr), n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length, spectrum=spectrum)
+    return {
+        'features': features,
+        'sr': sr,
+        'waveform': downsample_waveform(audio, sr, spectrum=spectrum),
+    }
+
+def window_features(window_audio, sr, denoise=False):
+    """
+    Preprocess one window of a stream and extract its features
+
+    Args:
+        window_audio: Audio of the window
+        sr: Sampling rate
+        denoise: Whether to apply noise reduction (False if the stream was already filtered)
+
+    Returns:
+        features: Feature tensor of the window
+    """
+    from audio_processor import preprocess_signal
+    from feature_extractor import extract_features
+
+    audio = preprocess_signal(window_audio, sr, denoise=denoise)
+    return extract_features((audio, sr))
+
+def render_prediction_chart(emotion, confidences):
+    """Render the prediction confidence chart as PNG bytes"""
+    from chart_renderer import get_renderer
+    return _render('prediction', get_renderer().render_prediction, emotion, confidences)
+
+def render_waveform_chart(times, audio):
+    """Render a waveform chart from stored (downsampled) samples as PNG bytes"""
+    from chart_renderer import get_renderer
+    return _render('waveform', get_renderer().render_waveform, times, audio)
+
+class ProcessingPool:
+    """Bounded ProcessPoolExecutor stage for CPU-bound audio work"""
+
+    def __init__(self, max_workers=None, max_pending=None, retry_after=2, start_method='spawn'):
+        """
+        Initialize processing pool
+
+        Args:
+            max_workers: Number of worker processes (None for one per CPU, 0 to run inline)
+            max_pending: Maximum tasks queued or running before new work is
+                rejected (None for twice the number of workers)
+            retry_after: Seconds clients are asked to wait when the pool is saturated
+            start_method: multiprocessing start method for the workers
+        """
+        self.max_workers = (os.cpu_count() or 1) if max_workers is None else int(max_workers)
+        self.max_pending = max(1, 2 * self.max_workers) if max_pending is None else int(max_pending)
+        self.retry_after = retry_after
+        self.start_method = start_method
+
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._rejected = 0
+        self._executor = None
+        self._executor_pid = None
+
+    def _get_executor(self):
+        """Create the executor lazily so each forked web worker gets its own pool"""
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=warmup
+            )
+            self._executor_pid = os.getpid()
+            logger.info(f"Started processing pool with {self.max_workers} workers")
+        return self._executor
+
+    def _discard_executor(self, executor):
+        """
+        Drop a broken executor (a worker died, e.g. a decoder segfault or an
+        OOM kill) so the next task starts a new pool
+        """
+        with self._lock:
+            if self._executor is not executor:
+                # Already replaced by another request thread
+                return
+            self._executor = None
+        logger.error("A processing pool worker died; starting a new pool for the next task")
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def start(self):
+        """Start (and so warm up) the worker processes now instead of with the first tasks"""
+        if self.max_workers > 0:
+            with self._lock:
+                executor = self._get_executor()
+            # Workers are spawned on demand, one per task submitted while none is idle
+            for _ in range(self.max_workers):
+                executor.submit(os.getpid)
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Submit a task to the pool, rejecting it if the pool is saturated
+
+        Args:
+            fn: Module-level function to run in a worker
+            *args: Arguments for fn
+            **kwargs: Keyword arguments for fn
+
+        Returns:
+            future: Future resolving to fn's return value
+
+        Raises:
+            PoolSaturatedError: If max_pending tasks are already queued or running
+        """
+        if self.max_workers == 0:
+            future = Future()
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PoolSaturatedError(self.retry_after)
+            self._pending += 1
+            executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            self._release(None)
+            self._discard_executor(executor)
+            raise
+        except Exception:
+            self._release(None)
+            raise
+        future.executor = executor
+        future.add_done_callback(self._release)
+        return future
+
+    def result(self, future, timeout=None):
+        """
+        Wait for the result of a submitted task
+
+        Raises:
+            BrokenProcessPool: If a worker died while the task was queued or
+                running; only this task fails, the next one gets a new pool
+        """
+        try:
+            return future.result(timeout=timeout)
+        except BrokenProcessPool:
+            self._discard_executor(getattr(future, 'executor', None))
+            raise
+
+    def run(self, fn, *args, timeout=None, **kwargs):
+        """Submit a task and wait for its result (see result)"""
+        return self.result(self.submit(fn, *args, **kwargs), timeout=timeout)
+
+    def analyze(self, file_path, params=None, filename=None, timeout=None):
+        """Run analyze_audio_file in the pool and wait for its result"""
+        return self.run(analyze_audio_file, file_path, filename, timeout=timeout, **(params or {}))
+
+    def render_prediction_chart(self, emotion, confidences, timeout=None):
+        """Run render_prediction_chart in the pool and wait for its result"""
+        return self.run(render_prediction_chart, emotion, confidences, timeout=timeout)
+
+    def render_waveform_chart(self, times, audio, timeout=None):
+        """Run render_waveform_chart in the pool and wait for its result"""
+        return self.run(render_waveform_chart, times, audio, timeout=timeout)
+
+    def stats(self):
+        """
+        Get pool metrics
+
+        Returns:
+            stats: Dictionary with pending and rejected task counts and pool limits
+        """
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'rejected': self._rejected,
+            }
+
+    def shutdown(self):
+        """Shut down the worker processes"""
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.shutdown(wait=True)
+        self._executor = None
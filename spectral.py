@@ -0,0 +1,127 @@
+"""
+Spectral analysis module for Speech Emotion Recognition
+Computes the short-time Fourier transform of a clip once so that
+preprocessing, feature extraction and visualization can share it
+"""
+import logging
+from functools import lru_cache
+import numpy as np
+import scipy.ndimage
+import librosa
+
+logger = logging.getLogger(__name__)
+
+# Default analysis parameters shared by preprocessing, features and plots
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+
+@lru_cache(maxsize=32)
+def _mel_basis(sr, n_fft, n_mels):
+    """Mel filterbank, cached per (sr, n_fft, n_mels) across requests"""
+    return librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+
+@lru_cache(maxsize=32)
+def _fft_frequencies(sr, n_fft):
+    """FFT bin center frequencies, cached per (sr, n_fft) across requests"""
+    return librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+
+class SpectralAnalysis:
+    """
+    STFT of an audio clip plus the quantities derived from it
+
+    The complex STFT is computed once on construction; magnitude, power
+    and mel spectrograms are derived lazily and cached on first access.
+    """
+
+    def __init__(self, audio, sr, n_fft=N_FFT, hop_length=HOP_LENGTH, stft=None):
+        """
+        Initialize spectral analysis
+
+        Args:
+            audio: Audio time series
+            sr: Sampling rate
+            n_fft: FFT window size
+            hop_length: Number of samples between successive frames
+            stft: Precomputed complex STFT of `audio` (computed if None)
+        """
+        self.audio = audio
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        if stft is None:
+            stft = librosa.stft(audio, n_fft=n_fft, hop_length=hop_length)
+        self.stft = stft
+        self._magnitude = None
+        self._power = None
+        self._mel_power = {}
+
+    @property
+    def magnitude(self):
+        """Magnitude spectrogram, shape (1 + n_fft // 2, frames)"""
+        if self._magnitude is None:
+            self._magnitude = np.abs(self.stft)
+        return self._magnitude
+
+    @property
+    def power(self):
+        """Power spectrogram, shape (1 + n_fft // 2, frames)"""
+        if self._power is None:
+            self._power = self.magnitude ** 2
+        return self._power
+
+    @property
+    def frequencies(self):
+        """Center frequency of each FFT bin in Hz"""
+        return _fft_frequencies(self.sr, self.n_fft)
+
+    def mel_basis(self, n_mels=N_MELS):
+        """Mel filterbank matching this analysis' sampling rate and FFT size"""
+        return _mel_basis(self.sr, self.n_fft, n_mels)
+
+    def mel_power(self, n_mels=N_MELS):
+        """Mel power spectrogram, shape (n_mels, frames)"""
+        if n_mels not in self._mel_power:
+            self._mel_power[n_mels] = self.mel_basis(n_mels).dot(self.power)
+        return self._mel_power[n_mels]
+
+    def spectral_gate(self, threshold_db=6.0, noise_percentile=10, smoothing_frames=3):
+        """
+        Attenuate bins that stay near the noise floor and resynthesize
+
+        The noise floor of each frequency bin is estimated as a low
+        percentile of its magnitude over time; bins less than threshold_db
+        above it are gated, with the gate smoothed over a few frames.
+
+        Args:
+            threshold_db: Margin above the noise floor that passes the gate
+            noise_percentile: Percentile of each bin's magnitude used as its noise floor
+            smoothing_frames: Number of frames the gate is averaged over
+
+        Returns:
+            gated_audio: Denoised audio, same length as the input
+        """
+        noise_floor = np.percentile(self.magnitude, noise_percentile, axis=1, keepdims=True)
+        gate = (self.magnitude > noise_floor * 10 ** (threshold_db / 20)).astype(np.float32)
+        if smoothing_frames > 1:
+            gate = scipy.ndimage.uniform_filter1d(gate, smoothing_frames, axis=1)
+        return librosa.istft(self.stft * gate, hop_length=self.hop_length, n_fft=self.n_fft, length=len(self.audio))
+
+def compute_spectrum(audio, sr, n_fft=N_FFT, hop_length=HOP_LENGTH):
+    """
+    Compute the spectral analysis of an audio clip
+
+    Args:
+        audio: Audio time series
+        sr: Sampling rate
+        n_fft: FFT window size
+        hop_length: Number of samples between successive frames
+
+    Returns:
+        spectrum: SpectralAnalysis of the clip
+    """
+    try:
+        return SpectralAnalysis(audio, sr, n_fft=n_fft, hop_length=hop_length)
+    except Exception as e:
+        logger.error(f"Error computing spectrum: {str(e)}")
+        raise
@@ -452,6 +452,212 @@ document.addEventListener('DOMContentLoaded', function() {
     // Setup tab animations
     setupTabAnimations();
     
+    // Result charts, drawn in the browser from the record's /charts/<id>.json data
+    const chartColors = {
+        primary: '#3498db',
+        highlight: '#e74c3c',
+        text: '#adb5bd',
+        grid: 'rgba(255, 255, 255, 0.1)',
+        zero: 'rgba(231, 76, 60, 0.3)'
+    };
+    
+    // Colour stops of the spectrogram colour map (dark -> bright, magma-like)
+    const spectrogramStops = [
+        [0, [0, 0, 4]], [0.25, [81, 18, 124]], [0.5, [183, 55, 121]],
+        [0.75, [252, 137, 97]], [1, [252, 253, 191]]
+    ];
+    
+    function spectrogramColorMap() {
+        const lut = new Uint8ClampedArray(256 * 3);
+        for (let i = 0; i < 256; i++) {
+            const t = i / 255;
+            let k = 1;
+            while (k < spectrogramStops.length - 1 && spectrogramStops[k][0] < t) k++;
+            const [t0, c0] = spectrogramStops[k - 1];
+            const [t1, c1] = spectrogramStops[k];
+            const f = (t - t0) / (t1 - t0);
+            for (let c = 0; c < 3; c++) {
+                lut[i * 3 + c] = c0[c] + (c1[c] - c0[c]) * f;
+            }
+        }
+        return lut;
+    }
+    
+    // Plot area inside the axis labels
+    function chartArea(canvas) {
+        return { left: 70, top: 40, right: canvas.width - 20, bottom: canvas.height - 60 };
+    }
+    
+    function drawAxes(ctx, area, title, xLabel, yLabel) {
+        ctx.fillStyle = chartColors.text;
+        ctx.font = '20px sans-serif';
+        ctx.textAlign = 'center';
+        ctx.fillText(title, (area.left + area.right) / 2, 26);
+        ctx.font = '16px sans-serif';
+        ctx.fillText(xLabel, (area.left + area.right) / 2, area.bottom + 52);
+        ctx.save();
+        ctx.translate(18, (area.top + area.bottom) / 2);
+        ctx.rotate(-Math.PI / 2);
+        ctx.fillText(yLabel, 0, 0);
+        ctx.restore();
+    }
+    
+    function drawConfidenceChart(canvas, data) {
+        const ctx = canvas.getContext('2d');
+        const area = chartArea(canvas);
+        const emotions = Object.keys(data.confidences);
+        const slot = (area.right - area.left) / emotions.length;
+        const scale = (area.bottom - area.top) / 100;
+        
+        ctx.clearRect(0, 0, canvas.width, canvas.height);
+        drawAxes(ctx, area, 'Emotion Prediction Confidence', 'Emotion', 'Confidence (%)');
+        
+        ctx.font = '14px sans-serif';
+        for (let v = 0; v <= 100; v += 20) {
+            const y = area.bottom - v * scale;
+            ctx.strokeStyle = chartColors.grid;
+            ctx.beginPath();
+            ctx.moveTo(area.left, y);
+            ctx.lineTo(area.right, y);
+            ctx.stroke();
+            ctx.textAlign = 'right';
+            ctx.fillText(v, area.left - 8, y + 5);
+        }
+        
+        emotions.forEach((emotion, i) => {
+            const value = data.confidences[emotion];
+            const x = area.left + i * slot + slot * 0.1;
+            const height = Math.min(value, 100) * scale;
+            ctx.fillStyle = emotion === data.emotion ? chartColors.highlight : chartColors.primary;
+            ctx.fillRect(x, area.bottom - height, slot * 0.8, height);
+            ctx.fillStyle = chartColors.text;
+            ctx.textAlign = 'center';
+            ctx.fillText(`${value.toFixed(1)}%`, x + slot * 0.4, area.bottom - height - 6);
+            ctx.fillText(emotion, x + slot * 0.4, area.bottom + 22);
+        });
+    }
+    
+    function drawWaveform(canvas, data) {
+        const waveform = data.waveform;
+        const ctx = canvas.getContext('2d');
+        const area = chartArea(canvas);
+        const mid = (area.top + area.bottom) / 2;
+        const scale = (area.bottom - area.top) / 2.2;
+        const n = waveform.min.length;
+        const step = (area.right - area.left) / Math.max(n - 1, 1);
+        
+        ctx.clearRect(0, 0, canvas.width, canvas.height);
+        drawAxes(ctx, area, 'Audio Waveform', 'Time (s)', 'Amplitude');
+        
+        ctx.strokeStyle = chartColors.zero;
+        ctx.beginPath();
+        ctx.moveTo(area.left, mid);
+        ctx.lineTo(area.right, mid);
+        ctx.stroke();
+        
+        // Fill between the per-bucket minimum and maximum
+        ctx.fillStyle = chartColors.primary;
+        ctx.strokeStyle = chartColors.primary;
+        ctx.beginPath();
+        for (let i = 0; i < n; i++) {
+            ctx.lineTo(area.left + i * step, mid - waveform.max[i] * scale);
+        }
+        for (let i = n - 1; i >= 0; i--) {
+            ctx.lineTo(area.left + i * step, mid - waveform.min[i] * scale);
+        }
+        ctx.closePath();
+        ctx.fill();
+        ctx.stroke();
+        
+        ctx.fillStyle = chartColors.text;
+        ctx.font = '14px sans-serif';
+        ctx.textAlign = 'center';
+        const ticks = 5;
+        for (let i = 0; i <= ticks; i++) {
+            const t = waveform.duration * i / ticks;
+            ctx.fillText(t.toFixed(1), area.left + (area.right - area.left) * i / ticks, area.bottom + 22);
+        }
+    }
+    
+    function drawSpectrogram(canvas, data) {
+        const spec = data.spectrogram;
+        const ctx = canvas.getContext('2d');
+        const area = chartArea(canvas);
+        const values = Uint8Array.from(atob(spec.data), c => c.charCodeAt(0));
+        const lut = spectrogramColorMap();
+        
+        // One pixel per (frame, mel band), lowest band at the bottom
+        const image = new ImageData(spec.frames, spec.n_mels);
+        for (let m = 0; m < spec.n_mels; m++) {
+            const row = (spec.n_mels - 1 - m) * spec.frames;
+            for (let f = 0; f < spec.frames; f++) {
+                const v = values[m * spec.frames + f] * 3;
+                const p = (row + f) * 4;
+                image.data[p] = lut[v];
+                image.data[p + 1] = lut[v + 1];
+                image.data[p + 2] = lut[v + 2];
+                image.data[p + 3] = 255;
+            }
+        }
+        const bitmap = document.createElement('canvas');
+        bitmap.width = spec.frames;
+        bitmap.height = spec.n_mels;
+        bitmap.getContext('2d').putImageData(image, 0, 0);
+        
+        ctx.clearRect(0, 0, canvas.width, canvas.height);
+        drawAxes(ctx, area, 'Mel Spectrogram', 'Time (s)', 'Mel band');
+        ctx.imageSmoothingEnabled = false;
+        ctx.drawImage(bitmap, area.left, area.top, area.right - area.left, area.bottom - area.top);
+        
+        const duration = spec.frames * spec.hop_length / spec.sr;
+        ctx.fillStyle = chartColors.text;
+        ctx.font = '14px sans-serif';
+        ctx.textAlign = 'center';
+        const ticks = 5;
+        for (let i = 0; i <= ticks; i++) {
+            ctx.fillText((duration * i / ticks).toFixed(1), area.left + (area.right - area.left) * i / ticks, area.bottom + 22);
+        }
+    }
+    
+    const chartDrawers = {
+        confidences: drawConfidenceChart,
+        waveform: drawWaveform,
+        spectrogram: drawSpectrogram
+    };
+    
+    function showChartMissing(canvas) {
+        const message = document.createElement('div');
+        message.className = 'alert alert-warning';
+        message.innerHTML = `<i class="fas fa-exclamation-triangle me-2"></i>${canvas.dataset.chartMissing || 'Chart data unavailable'}`;
+        canvas.replaceWith(message);
+    }
+    
+    // Fetch each data URL once and draw every canvas that uses it
+    const chartCanvases = document.querySelectorAll('canvas[data-chart-src]');
+    const chartRequests = {};
+    chartCanvases.forEach(canvas => {
+        const src = canvas.dataset.chartSrc;
+        if (!chartRequests[src]) {
+            chartRequests[src] = fetch(src).then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                return response.json();
+            });
+        }
+        chartRequests[src].then(data => {
+            const kind = canvas.dataset.chartKind;
+            if (!data[kind]) {
+                showChartMissing(canvas);
+                return;
+            }
+            chartDrawers[kind](canvas, data);
+        }).catch(error => {
+            console.error('Error loading chart data:', error);
+            showChartMissing(canvas);
+        });
+    });
+    
     // Automatically close alert messages after 5 seconds
     const alerts = document.querySelectorAll('.alert');
     alerts.forEach(function(alert) {
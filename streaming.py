@@ -0,0 +1,61 @@
+"""
+Streaming emotion recognition for Speech Emotion Recognition
+Produces a per-window emotion timeline for recordings of any length
+"""
+import logging
+import numpy as np
+
+from audio_processor import stream_audio_windows, preprocess_signal
+from feature_extractor import extract_features
+
+logger = logging.getLogger(__name__)
+
+def analyze_window(window_audio, sr, model, denoise=True):
+    """
+    Preprocess one window, extract its features and predict its emotion
+
+    Args:
+        window_audio: Audio of the window
+        sr: Sampling rate
+        model: Object with a predict(features) method (EmotionModel or InferenceScheduler)
+        denoise: Whether to apply noise reduction (False if the stream was already filtered)
+
+    Returns:
+        emotion: Predicted emotion
+        confidence: Dictionary of confidence values for each emotion
+    """
+    audio = preprocess_signal(window_audio, sr, denoise=denoise)
+    features = extract_features((audio, sr))
+    return model.predict(features)
+
+def stream_emotion_timeline(file_path, model, sr=22050, window=3, hop=1, block_duration=1.0):
+    """
+    Yield the emotion of each sliding window of an audio file as soon as
+    the window has been decoded
+
+    Args:
+        file_path: Path to audio file
+        model: Object with a predict(features) method (EmotionModel or InferenceScheduler)
+        sr: Target sampling rate
+        window: Window length in seconds
+        hop: Hop between window starts in seconds
+        block_duration: Length of each decoded block in seconds
+
+    Yields:
+        entry: Dictionary with 'start', 'end', 'emotion', 'confidence' and 'all_confidences'
+    """
+    count = 0
+    # The stream is high-pass filtered once with carried state, not per window
+    windows = stream_audio_windows(file_path, sr=sr, window=window, hop=hop, block_duration=block_duration, denoise=True)
+    for start, window_audio in windows:
+        emotion, confidence = analyze_window(window_audio, sr, model, denoise=False)
+        count += 1
+        yield {
+            'start': round(start, 3),
+            'end': round(start + window, 3),
+            'emotion': emotion,
+            'confidence': float(confidence[emotion]),
+            'all_confidences': {e: float(c) for e, c in confidence.items()},
+            'silent': bool(np.max(np.abs(window_audio)) == 0),
+        }
+    logger.info(f"Streamed emotion timeline for {file_path}: {count} windows")
@@ -0,0 +1,304 @@
+"""
+Background training jobs for Speech Emotion Recognition
+Runs featurization and training for each job in its own process, reports
+progress and per-epoch metrics back to the web worker that started it and
+supports cancellation
+"""
+import os
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+
+# Statuses after which a job's process is gone
+FINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+class TrainingCancelled(Exception):
+    """Raised inside a job process when its job has been cancelled"""
+
+class JobBusyError(RuntimeError):
+    """Raised when this worker already runs its maximum number of training jobs"""
+
+def _lock_store(store_dir):
+    """
+    Take an exclusive lock on a feature store so concurrent jobs (from any
+    web worker) never build the same store at once
+
+    Returns:
+        lock_file: Open file holding the lock, or None where locking is unavailable
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return None
+    os.makedirs(store_dir, exist_ok=True)
+    lock_file = open(os.path.join(store_dir, '.lock'), 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        raise JobBusyError("Another training job is using the feature store")
+    return lock_file
+
+def run_training_job(job_id, config, events, cancel_event):
+    """
+    Featurize the dataset and train a model; the entry point of a job process
+
+    Progress is reported as (job_id, fields) tuples on the events queue.
+    The trained model is only written to config['output_path'] if the job
+    finishes, so a cancelled or failed job never replaces the serving model.
+
+    Args:
+        job_id: Id of the job
+        config: Dictionary with 'data_dir', 'store_dir', 'audio_params',
+            'output_path', 'workers', 'epochs', 'batch_size', 'learning_rate',
+            'dropout', 'weights_dtype' and 'blas_threads'
+        events: multiprocessing queue the progress is reported on
+        cancel_event: multiprocessing Event set when the job is cancelled
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    def emit(**fields):
+        events.put((job_id, fields))
+
+    def check_cancelled():
+        if cancel_event.is_set():
+            raise TrainingCancelled()
+
+    lock_file = None
+    try:
+        from feature_store import FeatureStore
+        from emotion_model import EmotionModel, set_blas_threads
+
+        lock_file = _lock_store(config['store_dir'])
+        set_blas_threads(config.get('blas_threads'))
+        emit(status='running', phase='featurizing', progress=0.0, started_at=time.time())
+
+        last_report = [0.0]
+
+        def featurize_progress(done, total):
+            check_cancelled()
+            # At most one report per second, so large corpora do not flood the database
+            now = time.monotonic()
+            if done == total or now - last_report[0] >= 1.0:
+                last_report[0] = now
+                emit(progress=done / total if total else 1.0)
+
+        store = FeatureStore(config['store_dir'], config['audio_params'])
+        store.build(config['data_dir'], workers=config.get('workers'), progress=featurize_progress)
+        check_cancelled()
+        if len(store) == 0:
+            raise ValueError("No usable audio clips found in the training data")
+
+        history = {'loss': [], 'accuracy': [], 'val_loss': [], 'val_accuracy': []}
+        emit(phase='training', progress=0.0)
+
+        def epoch_done(epoch, metrics):
+            check_cancelled()
+            for name, value in metrics.items():
+                history[name].append(value)
+            emit(epoch=epoch, progress=epoch / config['epochs'], history=history)
+
+        model = EmotionModel(None)
+        history, accuracy, confusion_mat = model.train(
+            store,
+            epochs=config['epochs'],
+            batch_size=config['batch_size'],
+            learning_rate=config['learning_rate'],
+            dropout=config['dropout'],
+            callback=epoch_done
+        )
+        check_cancelled()
+        if not model.save_model(config['output_path'], weights_dtype=config.get('weights_dtype')):
+            raise RuntimeError(f"Could not save the trained model to {config['output_path']}")
+        emit(
+            status='completed',
+            progress=1.0,
+            history=history,
+            accuracy=accuracy,
+            confusion_matrix=confusion_mat.tolist(),
+            model_path=config['output_path'],
+            finished_at=time.time()
+        )
+    except TrainingCancelled:
+        logger.info(f"Training job {job_id} cancelled")
+        emit(status='cancelled', finished_at=time.time())
+    except Exception as e:
+        logger.error(f"Training job {job_id} failed: {str(e)}")
+        emit(status='failed', error=str(e), finished_at=time.time())
+    finally:
+        if lock_file is not None:
+            lock_file.close()
+
+class TrainingJobManager:
+    """Starts training job processes and relays their progress from a monitor thread"""
+
+    def __init__(self, on_update, on_complete=None, cancel_requested=None, heartbeat=None, max_jobs=1,
+                 poll_interval=1.0, start_method='spawn'):
+        """
+        Initialize job manager
+
+        Args:
+            on_update: Callable(job_id, fields) persisting each progress report
+            on_complete: Callable(job_id, fields) run after a job completes
+                (e.g. to hot-swap the trained model)
+            cancel_requested: Callable(job_id) returning whether the job was
+                cancelled elsewhere (e.g. by another web worker), polled every
+                poll_interval seconds
+            heartbeat: Callable(job_id) recording that the job's process is
+                still alive, called every poll_interval seconds (so jobs
+                whose web worker died can be expired)
+            max_jobs: Maximum concurrent jobs started by this process
+            poll_interval: Seconds between checks of job processes
+            start_method: multiprocessing start method of the job processes
+        """
+        self.on_update = on_update
+        self.on_complete = on_complete
+        self.cancel_requested = cancel_requested
+        self.heartbeat = heartbeat
+        self.max_jobs = max_jobs
+        self.poll_interval = poll_interval
+        self._context = multiprocessing.get_context(start_method)
+
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._events = None
+        self._monitor = None
+        self._pid = None
+
+    def _ensure_monitor(self):
+        """Create the event queue and monitor thread lazily, and again in a forked child"""
+        if self._monitor is not None and self._monitor.is_alive() and self._pid == os.getpid():
+            return
+        self._events = self._context.Queue()
+        self._jobs = {}
+        self._monitor = threading.Thread(target=self._run, name="training-jobs", daemon=True)
+        self._pid = os.getpid()
+        self._monitor.start()
+
+    def submit(self, job_id, config):
+        """
+        Start a training job process
+
+        Args:
+            job_id: Id of the job (see run_training_job for the config)
+            config: Job configuration
+
+        Raises:
+            JobBusyError: If max_jobs jobs are already running in this process
+        """
+        with self._lock:
+            self._ensure_monitor()
+            if len(self._jobs) >= self.max_jobs:
+                raise JobBusyError("A training job is already running")
+            cancel_event = self._context.Event()
+            # Not a daemon: the job's featurization starts its own process pool
+            process = self._context.Process(
+                target=run_training_job,
+                args=(job_id, config, self._events, cancel_event),
+                name=f"training-{job_id}"
+            )
+            process.start()
+            self._jobs[job_id] = {'process': process, 'cancel': cancel_event}
+        logger.info(f"Started training job {job_id} in process {process.pid}")
+
+    def cancel(self, job_id):
+        """
+        Ask a job started by this process to stop at its next progress report
+
+        Returns:
+            found: Whether the job is running in this process
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        job['cancel'].set()
+        return True
+
+    def running(self):
+        """Ids of the jobs running in this process"""
+        with self._lock:
+            return list(self._jobs)
+
+    def _dispatch(self, job_id, fields):
+        try:
+            self.on_update(job_id, fields)
+        except Exception as e:
+            logger.error(f"Error recording progress of training job {job_id}: {str(e)}")
+        if fields.get('status') in FINAL_STATUSES:
+            with self._lock:
+                job = self._jobs.pop(job_id, None)
+            if job is not None:
+                job['process'].join(timeout=5)
+            if fields['status'] == 'completed' and self.on_complete is not None:
+                try:
+                    self.on_complete(job_id, fields)
+                except Exception as e:
+                    logger.error(f"Error activating the model of training job {job_id}: {str(e)}")
+
+    def _drain(self):
+        """Dispatch every queued progress report without waiting"""
+        while True:
+            try:
+                self._dispatch(*self._events.get_nowait())
+            except queue.Empty:
+                return
+
+    def _check_jobs(self):
+        """Fail jobs whose process exited without a final report, and relay cancellations and heartbeats"""
+        with self._lock:
+            jobs = list(self._jobs.items())
+        for job_id, job in jobs:
+            if not job['process'].is_alive():
+                # Reports sent just before exiting may still be queued
+                self._drain()
+                with self._lock:
+                    orphaned = self._jobs.pop(job_id, None) is not None
+                if orphaned:
+                    self._dispatch(job_id, {
+                        'status': 'failed',
+                        'error': f"Training process exited with code {job['process'].exitcode}",
+                        'finished_at': time.time(),
+                    })
+                continue
+            if self.heartbeat is not None:
+                try:
+                    self.heartbeat(job_id)
+                except Exception as e:
+                    logger.error(f"Error recording heartbeat of training job {job_id}: {str(e)}")
+            if self.cancel_requested is not None and not job['cancel'].is_set():
+                try:
+                    if self.cancel_requested(job_id):
+                        job['cancel'].set()
+                except Exception as e:
+                    logger.error(f"Error checking cancellation of training job {job_id}: {str(e)}")
+
+    def _run(self):
+        # The checks run on their own clock, so a steady stream of progress
+        # reports cannot starve cancellations or liveness checks
+        next_check = time.monotonic() + self.poll_interval
+        while True:
+            try:
+                self._dispatch(*self._events.get(timeout=max(0.0, next_check - time.monotonic())))
+            except queue.Empty:
+                pass
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + self.poll_interval
+                self._check_jobs()
+
+    def shutdown(self, timeout=10):
+        """Cancel the running jobs and wait for their processes to exit"""
+        if self._pid != os.getpid():
+            return
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job['cancel'].set()
+        for job in jobs:
+            job['process'].join(timeout=timeout)
+            if job['process'].is_alive():
+                job['process'].terminate()
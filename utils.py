@@ -5,21 +5,23 @@ import os
 import base64
 import logging
 import io
-import json
+import struct
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
-import seaborn as sns
-import librosa
-import librosa.display
-from sklearn.metrics import confusion_matrix
+
+from chart_renderer import get_renderer
 
 logger = logging.getLogger(__name__)
 
 # Define allowed audio file extensions
 ALLOWED_EXTENSIONS = {'wav', 'mp3', 'ogg'}
 
+# Header of the packed waveform stored in EmotionPrediction.waveform: magic,
+# sampling rate and length of the original audio, downsampled points,
+# envelope buckets, then the spectrogram's mel bands, frames, sampling rate,
+# hop length and dB range (n_mels is 0 without a spectrogram)
+WAVEFORM_MAGIC = b'SEW1'
+WAVEFORM_HEADER = struct.Struct('<4sIIIIHIIIff')
+
 def allowed_file(filename):
     """
     Check if a file has an allowed extension
@@ -44,48 +46,8 @@ def plot_prediction(emotion, confidences):
         image_base64: Base64-encoded image
     """
     try:
-        plt.figure(figsize=(10, 6))
-        
-        # Sort emotions by confidence
-        emotions = list(confidences.keys())
-        values = [confidences[e] for e in emotions]
-        
-        # Create bar chart
-        colors = ['#3498db'] * len(emotions)
-        
-        # Highlight the predicted emotion
-        pred_idx = emotions.index(emotion)
-        colors[pred_idx] = '#e74c3c'
-        
-        # Create the bar chart
-        ax = sns.barplot(x=emotions, y=values, palette=colors)
-        
-        # Customize the chart
-        plt.title('Emotion Prediction Confidence', fontsize=16)
-        plt.xlabel('Emotion', fontsize=14)
-        plt.ylabel('Confidence (%)', fontsize=14)
-        plt.ylim(0, 100)
-        
-        # Add value labels on top of each bar
-        for i, v in enumerate(values):
-            ax.text(i, v + 2, f"{v:.1f}%", ha='center', fontsize=12)
-        
-        # Rotate x-axis labels for better readability
-        plt.xticks(rotation=45)
-        
-        # Make plot look better
-        plt.tight_layout()
-        
-        # Save plot to a bytes buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        buf.seek(0)
-        
-        # Convert plot to base64 string
-        image_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-        plt.close()
-        
-        return image_base64
+        png = get_renderer().render_prediction(emotion, confidences)
+        return base64.b64encode(png).decode('utf-8')
         
     except Exception as e:
         logger.error(f"Error creating prediction plot: {str(e)}")
@@ -103,6 +65,12 @@ def plot_confusion_matrix(cm, class_names):
         image_base64: Base64-encoded image
     """
     try:
+        # Imported here so web workers that never train do not load pyplot and seaborn
+        import matplotlib
+        matplotlib.use('Agg')  # Use non-interactive backend
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        
         plt.figure(figsize=(10, 8))
         
         # Normalize confusion matrix
@@ -151,95 +119,178 @@ def plot_audio_waveform(audio, sr):
         
     Returns:
         image_base64: Base64-encoded image
-        waveform_data: Downsampled waveform data for storing in database
+        waveform: Downsampled waveform data for storing in database (see pack_waveform)
     """
     try:
-        plt.figure(figsize=(10, 3))
+        png = get_renderer().render_waveform(np.linspace(0, len(audio) / sr, len(audio)), audio)
+        return base64.b64encode(png).decode('utf-8'), downsample_waveform(audio, sr)
         
-        # Plot waveform
-        plt.plot(np.linspace(0, len(audio) / sr, len(audio)), audio, color='#3498db')
-        
-        # Add labels and title
-        plt.title('Audio Waveform')
-        plt.xlabel('Time (s)')
-        plt.ylabel('Amplitude')
-        
-        # Add a horizontal line at y=0
-        plt.axhline(y=0, color='r', linestyle='-', alpha=0.3)
-        
-        # Set y-axis limits
-        plt.ylim(-1.1, 1.1)
-        
-        # Make plot look better
-        plt.tight_layout()
-        
-        # Save plot to a bytes buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        buf.seek(0)
+    except Exception as e:
+        logger.error(f"Error creating waveform plot: {str(e)}")
+        return "", None
+
+def downsample_waveform(audio, sr, samples_to_keep=1000, spectrum=None):
+    """
+    Downsample audio for storage in database
+    
+    Args:
+        audio: Audio time series
+        sr: Sampling rate
+        samples_to_keep: Approximate number of points to keep for visualization
+        spectrum: SpectralAnalysis of the audio; if given, a quantized log-mel
+            spectrogram is stored too (see quantize_spectrogram)
         
-        # Convert plot to base64 string
-        image_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-        plt.close()
+    Returns:
+        waveform: Packed downsampled audio, 'min'/'max' envelope
+            (samples_to_keep points in total) and optional spectrogram (see
+            pack_waveform)
+    """
+    if len(audio) > samples_to_keep:
+        downsample_factor = len(audio) // samples_to_keep
+        downsampled_audio = audio[::downsample_factor][:samples_to_keep]
+    else:
+        downsampled_audio = audio
+    
+    spectrogram = quantize_spectrogram(spectrum) if spectrum is not None else None
+    return pack_waveform(downsampled_audio, sr, len(audio), waveform_envelope(audio, samples_to_keep // 2), spectrogram)
+
+def pack_waveform(audio, sr, num_samples, envelope, spectrogram=None):
+    """
+    Encode waveform chart data compactly for the database
+    
+    Args:
+        audio: Downsampled audio time series
+        sr: Sampling rate of the original audio
+        num_samples: Length of the original audio; the times of the
+            downsampled points are derived from it and sr
+        envelope: Dictionary with equally long 'min' and 'max' lists
+        spectrogram: Quantized spectrogram (see quantize_spectrogram) or None
         
-        # Downsample audio for storage in database
-        # We'll keep ~1000 points for visualization
-        samples_to_keep = 1000
-        if len(audio) > samples_to_keep:
-            downsample_factor = len(audio) // samples_to_keep
-            downsampled_audio = audio[::downsample_factor][:samples_to_keep].tolist()
-        else:
-            downsampled_audio = audio.tolist()
+    Returns:
+        waveform: Header (see WAVEFORM_HEADER), then the float16 audio, min
+            and max and the uint8 spectrogram
+    """
+    audio = np.asarray(audio, dtype='<f2')
+    lows = np.asarray(envelope['min'], dtype='<f2')
+    highs = np.asarray(envelope['max'], dtype='<f2')
+    if spectrogram is not None:
+        values = base64.b64decode(spectrogram['data'])
+        spec_header = (spectrogram['n_mels'], spectrogram['frames'], spectrogram['sr'], spectrogram['hop_length'],
+                       spectrogram['db_min'], spectrogram['db_max'])
+    else:
+        values = b''
+        spec_header = (0, 0, 0, 0, 0.0, 0.0)
+    header = WAVEFORM_HEADER.pack(WAVEFORM_MAGIC, int(sr), int(num_samples), len(audio), len(lows), *spec_header)
+    return b''.join([header, audio.tobytes(), lows.tobytes(), highs.tobytes(), values])
+
+def unpack_waveform(waveform):
+    """
+    Decode waveform chart data packed by pack_waveform
+    
+    Args:
+        waveform: Packed bytes
         
-        # Create waveform data object
-        waveform_data = {
-            'audio': downsampled_audio,
-            'times': np.linspace(0, len(audio) / sr, len(downsampled_audio)).tolist()
+    Returns:
+        waveform_data: Dictionary with the 'audio' and 'times' lists, the
+            'duration' in seconds, the 'min' and 'max' envelope rounded to 3
+            decimals and the 'spectrogram' (as from quantize_spectrogram, or None)
+    """
+    (magic, sr, num_samples, n_audio, n_envelope,
+     n_mels, frames, spec_sr, hop_length, db_min, db_max) = WAVEFORM_HEADER.unpack_from(waveform)
+    if magic != WAVEFORM_MAGIC:
+        raise ValueError("Not a packed waveform")
+    offset = WAVEFORM_HEADER.size
+    arrays = []
+    for count in (n_audio, n_envelope, n_envelope):
+        arrays.append(np.frombuffer(waveform, dtype='<f2', count=count, offset=offset).astype(np.float64))
+        offset += 2 * count
+    audio, lows, highs = arrays
+    duration = num_samples / sr if sr else 0.0
+    
+    spectrogram = None
+    if n_mels:
+        spectrogram = {
+            'n_mels': n_mels,
+            'frames': frames,
+            'sr': spec_sr,
+            'hop_length': hop_length,
+            'db_min': db_min,
+            'db_max': db_max,
+            'data': base64.b64encode(waveform[offset:offset + n_mels * frames]).decode('ascii'),
         }
+    return {
+        'audio': audio.tolist(),
+        'times': np.linspace(0, duration, n_audio).tolist(),
+        'duration': duration,
+        'min': np.round(lows, 3).tolist(),
+        'max': np.round(highs, 3).tolist(),
+        'spectrogram': spectrogram,
+    }
+
+def waveform_envelope(audio, buckets=500):
+    """
+    Min/max-decimate audio so peaks survive downsampling
+    
+    Args:
+        audio: Audio time series
+        buckets: Number of (min, max) pairs to keep
         
-        return image_base64, json.dumps(waveform_data)
+    Returns:
+        envelope: Dictionary with 'min' and 'max' lists, rounded to 3 decimals
+    """
+    audio = np.asarray(audio, dtype=np.float64)
+    if len(audio) == 0:
+        return {'min': [], 'max': []}
+    buckets = min(buckets, len(audio))
+    edges = np.linspace(0, len(audio), buckets + 1).astype(int)
+    return {
+        'min': np.round(np.minimum.reduceat(audio, edges[:-1]), 3).tolist(),
+        'max': np.round(np.maximum.reduceat(audio, edges[:-1]), 3).tolist(),
+    }
+
+def quantize_spectrogram(spectrum, n_mels=64, top_db=80.0):
+    """
+    Encode a log-mel spectrogram compactly for client-side rendering
+    
+    Args:
+        spectrum: SpectralAnalysis of the audio
+        n_mels: Number of mel bands
+        top_db: Dynamic range below the peak mapped onto 0-255
         
-    except Exception as e:
-        logger.error(f"Error creating waveform plot: {str(e)}")
-        return "", json.dumps({})
+    Returns:
+        spectrogram: Dictionary with the shape, the dB range and 'data', the
+            base64 of the uint8 values in row-major (n_mels, frames) order,
+            lowest band first
+    """
+    mel = spectrum.mel_power(n_mels)
+    db = 10.0 * np.log10(np.maximum(mel, 1e-10))
+    db = np.clip(db - db.max(), -top_db, 0.0)
+    quantized = np.round((db + top_db) * (255.0 / top_db)).astype(np.uint8)
+    return {
+        'n_mels': int(quantized.shape[0]),
+        'frames': int(quantized.shape[1]),
+        'sr': int(spectrum.sr),
+        'hop_length': int(spectrum.hop_length),
+        'db_min': -top_db,
+        'db_max': 0.0,
+        'data': base64.b64encode(np.ascontiguousarray(quantized).tobytes()).decode('ascii'),
+    }
 
-def plot_spectrogram(audio, sr):
+def plot_spectrogram(audio, sr, spectrum=None):
     """
     Create a spectrogram visualization of the audio
     
     Args:
         audio: Audio time series
         sr: Sampling rate
+        spectrum: Precomputed SpectralAnalysis of the audio (computed if None)
         
     Returns:
         image_base64: Base64-encoded image
     """
     try:
-        plt.figure(figsize=(10, 5))
-        
-        # Compute spectrogram
-        D = librosa.amplitude_to_db(np.abs(librosa.stft(audio)), ref=np.max)
-        
-        # Plot spectrogram
-        librosa.display.specshow(D, sr=sr, x_axis='time', y_axis='log')
-        plt.colorbar(format='%+2.0f dB')
-        
-        # Add title
-        plt.title('Spectrogram')
-        
-        # Make plot look better
-        plt.tight_layout()
-        
-        # Save plot to a bytes buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        buf.seek(0)
-        
-        # Convert plot to base64 string
-        image_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-        plt.close()
-        
-        return image_base64
+        png = get_renderer().render_spectrogram(audio, sr, spectrum=spectrum)
+        return base64.b64encode(png).decode('utf-8')
         
     except Exception as e:
         logger.error(f"Error creating spectrogram plot: {str(e)}")
@@ -0,0 +1,256 @@
+"""
+Write-behind persistence for Speech Emotion Recognition
+Queues database rows and inserts them from a background thread in batched
+multi-row inserts, one transaction per batch, so requests respond without
+waiting for a commit
+"""
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+class WriteBehindQueue:
+    """Bounded queue of rows flushed in batches by a background thread"""
+
+    def __init__(self, insert_rows, allocate_ids, max_queue=1000, max_batch=100, flush_interval_ms=50,
+                 id_block=100, put_timeout=0.5, is_transient=None):
+        """
+        Initialize write-behind queue
+
+        Args:
+            insert_rows: Callable(rows) inserting a list of row dictionaries
+                in one transaction
+            allocate_ids: Callable(count) reserving `count` unused primary
+                keys and returning them as a list
+            max_queue: Maximum rows waiting to be written; when full, submit
+                waits up to put_timeout seconds and then inserts the row itself
+            max_batch: Maximum rows per insert
+            flush_interval_ms: Maximum time a row waits for its batch to fill,
+                in milliseconds
+            id_block: Primary keys reserved per allocate_ids call
+            put_timeout: Seconds submit waits for room in a full queue
+            is_transient: Callable(error) telling whether a failed insert is
+                worth retrying as is (e.g. a lost connection); other errors
+                make the writer retry the batch's rows one at a time and
+                drop the rows that still fail (default: every error is
+                transient)
+        """
+        self.insert_rows = insert_rows
+        self.allocate_ids = allocate_ids
+        self.max_queue = max(1, int(max_queue))
+        self.max_batch = max(1, int(max_batch))
+        self.flush_interval = max(0.0, float(flush_interval_ms)) / 1000.0
+        self.id_block = max(1, int(id_block))
+        self.put_timeout = put_timeout
+        self.is_transient = is_transient or (lambda error: True)
+
+        self._queue = deque()
+        self._pending = {}
+        self._ids = deque()
+        self._ids_pid = None
+        self._condition = threading.Condition()
+        self._id_lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+        self._stopping = False
+
+        # Metrics
+        self._max_queue_depth = 0
+        self._batches = 0
+        self._rows = 0
+        self._errors = 0
+        self._direct_writes = 0
+        self._dropped = 0
+
+    def _ensure_worker(self):
+        """
+        Start the writer thread lazily, and again in a forked child process,
+        which must not write the parent's rows
+        """
+        if self._worker is not None and self._worker.is_alive() and self._pid == os.getpid():
+            return
+        if self._pid != os.getpid():
+            self._queue.clear()
+            self._pending.clear()
+        self._stopping = False
+        self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._pid = os.getpid()
+        self._worker.start()
+
+    def reserve_id(self):
+        """
+        Primary key for a row that will be submitted
+
+        Returns:
+            record_id: Id from this process' reserved block (a new block is
+                allocated when it runs out, or in a forked child)
+        """
+        with self._id_lock:
+            if self._ids_pid != os.getpid():
+                self._ids.clear()
+                self._ids_pid = os.getpid()
+            if not self._ids:
+                self._ids.extend(self.allocate_ids(self.id_block))
+            return self._ids.popleft()
+
+    def submit(self, row):
+        """
+        Queue a row for insertion
+
+        Args:
+            row: Dictionary of column values including its reserved 'id'
+        """
+        with self._condition:
+            self._ensure_worker()
+            deadline = time.monotonic() + self.put_timeout
+            while len(self._pending) >= self.max_queue:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            if len(self._pending) < self.max_queue:
+                self._pending[row['id']] = row
+                self._queue.append(row)
+                self._max_queue_depth = max(self._max_queue_depth, len(self._pending))
+                self._condition.notify_all()
+                return
+            self._direct_writes += 1
+        # The queue stays full (e.g. the database is down): write in the
+        # caller, so back-pressure reaches the requests instead of memory
+        self.insert_rows([row])
+
+    def pending(self, record_id):
+        """
+        Row that was submitted but is not in the database yet (read-your-writes)
+
+        Returns:
+            row: Dictionary of column values, or None
+        """
+        with self._condition:
+            row = self._pending.get(record_id)
+            return dict(row) if row is not None else None
+
+    def _next_batch(self):
+        """Block until rows arrive, then collect up to max_batch rows or until flush_interval elapses"""
+        with self._condition:
+            while not self._queue:
+                if self._stopping:
+                    return None
+                self._condition.wait()
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._queue) < self.max_batch and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            count = min(len(self._queue), self.max_batch)
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _insert_rows_singly(self, batch):
+        """
+        Insert a failed batch row by row, so one bad row cannot block the rest
+
+        Rows failing with a non-transient error are logged (without their
+        binary values) and dropped.
+
+        Returns:
+            written: Rows now in the database
+            retry: Rows that failed with a transient error
+        """
+        written, retry = [], []
+        for row in batch:
+            try:
+                self.insert_rows([row])
+            except Exception as e:
+                if self.is_transient(e):
+                    retry.append(row)
+                    continue
+                values = {k: v for k, v in row.items() if not isinstance(v, (bytes, bytearray, memoryview))}
+                logger.error(f"Dropping queued row {row.get('id')} that cannot be written: {str(e)}; values: {values}")
+                with self._condition:
+                    self._dropped += 1
+                    self._pending.pop(row['id'], None)
+                    self._condition.notify_all()
+                continue
+            written.append(row)
+        return written, retry
+
+    def _run(self):
+        """
+        Writer loop: one insert per batch. A transient failure retries the
+        batch with backoff; any other splits it into single-row inserts
+        """
+        backoff = 0.1
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self.insert_rows(batch)
+                written, retry = batch, []
+            except Exception as e:
+                if self.is_transient(e):
+                    logger.error(f"Error writing {len(batch)} queued rows, retrying: {str(e)}")
+                    written, retry = [], batch
+                else:
+                    logger.error(f"Error writing {len(batch)} queued rows, writing them one at a time: {str(e)}")
+                    written, retry = self._insert_rows_singly(batch)
+            with self._condition:
+                for row in written:
+                    self._pending.pop(row['id'], None)
+                if written:
+                    self._batches += 1
+                    self._rows += len(written)
+                    self._condition.notify_all()
+                if retry:
+                    self._errors += 1
+                    self._queue.extendleft(reversed(retry))
+                    if self._stopping and backoff >= 5.0:
+                        # Give up at shutdown once the database stayed unreachable
+                        return
+            if retry:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 5.0)
+            else:
+                backoff = 0.1
+
+    def flush(self, timeout=None):
+        """
+        Wait until every submitted row is in the database
+
+        Returns:
+            flushed: Whether the queue drained within the timeout
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending, timeout)
+
+    def shutdown(self, timeout=10):
+        """Write the queued rows and stop the writer thread"""
+        if self._pid != os.getpid():
+            return
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self._worker.join(timeout=timeout)
+        with self._condition:
+            if self._pending:
+                logger.error(f"{len(self._pending)} queued rows could not be written before shutdown")
+
+    def stats(self):
+        """Queue depth and batching metrics"""
+        with self._condition:
+            return {
+                'queue_depth': len(self._pending),
+                'max_queue': self.max_queue,
+                'max_queue_depth': self._max_queue_depth,
+                'max_batch': self.max_batch,
+                'batches': self._batches,
+                'rows': self._rows,
+                'mean_batch_size': self._rows / self._batches if self._batches else 0.0,
+                'errors': self._errors,
+                'direct_writes': self._direct_writes,
+                'dropped_rows': self._dropped,
+            }